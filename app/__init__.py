@@ -1,5 +1,13 @@
 from .api import start_server
-from .vision import track
 from .utils import list_cameras, PersonCounter
 
 __all__ = ["track", "start_server", "list_cameras", "PersonCounter"]
+
+
+def __getattr__(name):
+    # track pulls in torch and ultralytics, so it is only imported when first used
+    if name == "track":
+        from .vision import track
+
+        return track
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
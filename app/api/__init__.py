@@ -1,3 +1,3 @@
-from .request_handler import start_server
+from .request_handler import start_server, start_shared_server
 
-__all__ = ["start_server"]
+__all__ = ["start_server", "start_shared_server"]
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlparse, urlsplit, parse_qs, urlencode
+
+import yaml
+
+from app.api.http_pool import ConnectionPool, UpstreamError
+from app.api.request_handler import RequestHandler, TrackerHTTPServer
+from app.utils.logger import get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+GATEWAY_SETTINGS = config.get("gateway", {})
+
+
+class Camera:
+    __slots__ = ("name", "pool", "prefix")
+
+    def __init__(self, name, pool, prefix=""):
+        self.name = name
+        self.pool = pool
+        # Path of the instance's routes on its host: "" on its own port, /instances/<name> on a shared listener
+        self.prefix = prefix
+
+
+class Gateway:
+    """Answers site-wide queries by fanning them out to many tracker instances at once.
+
+    Each endpoint is a tracker instance's own port (``name`` and ``url``) or a
+    shared listener (``url`` and ``shared: true``) whose instances are listed by
+    its ``/instances`` route. Requests to a host go through one pool of
+    keep-alive connections, all cameras are queried concurrently on an asyncio
+    loop running on its own thread, and merged results are cached for
+    ``cache_ms``. Concurrent identical queries share a single fan-out.
+    """
+
+    def __init__(self, endpoints, cache_ms=500, timeout=2.0, max_connections=8):
+        self.cache_seconds = cache_ms / 1000
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="gateway-loop", daemon=True)
+        self.thread.start()
+        self.pools = {}
+        self.cameras = {}
+        # Shared listeners whose instances are not known yet, and the task listing them
+        self.pending_shared = []
+        self.discovery = None
+        self.lock = threading.Lock()
+        # query key -> (expiry, result) and query key -> Future of the fan-out in progress
+        self.cache = {}
+        self.inflight = {}
+        for endpoint in endpoints:
+            self.add_endpoint(endpoint)
+
+    def pool(self, host, port):
+        if (host, port) not in self.pools:
+            self.pools[(host, port)] = ConnectionPool(host, port, self.max_connections, self.timeout)
+        return self.pools[(host, port)]
+
+    def add_endpoint(self, endpoint):
+        url = urlsplit(endpoint["url"])
+        pool = self.pool(url.hostname, url.port or 80)
+        prefix = url.path.rstrip("/")
+        if endpoint.get("shared"):
+            self.pending_shared.append((pool, prefix))
+        else:
+            self.add_camera(endpoint["name"], pool, prefix)
+
+    def add_camera(self, name, pool, prefix):
+        # Names are unique across the site; a repeated name is told apart by its host
+        if name in self.cameras:
+            name = f"{name}@{pool.host}:{pool.port}"
+        self.cameras[name] = Camera(name, pool, prefix)
+
+    async def ensure_discovered(self):
+        # Queries arriving while shared listeners are being listed wait for the same listing
+        if self.discovery is None or self.discovery.done():
+            if not self.pending_shared:
+                return
+            self.discovery = asyncio.ensure_future(self.discover())
+        await self.discovery
+
+    async def discover(self):
+        # Lists the instances of shared listeners; those that cannot be reached are retried by the next query
+        pending, self.pending_shared = self.pending_shared, []
+        listings = await asyncio.gather(*(pool.get(f"{prefix}/instances") for pool, prefix in pending), return_exceptions=True)
+        for (pool, prefix), listing in zip(pending, listings):
+            if isinstance(listing, Exception) or listing[0] != 200:
+                logger.warning(create_log_message(event="gateway_discovery_failed", host=pool.host, port=pool.port, error=str(listing)))
+                self.pending_shared.append((pool, prefix))
+                continue
+            for name in json.loads(listing[1]):
+                self.add_camera(name, pool, f"{prefix}/instances/{name}")
+
+    async def fetch(self, camera, route):
+        # (name, parsed body) or (name, UpstreamError)
+        try:
+            status, body = await camera.pool.get(camera.prefix + route)
+        except UpstreamError as e:
+            return camera.name, e
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return camera.name, UpstreamError(f"HTTP {status}: invalid JSON body")
+        if status != 200:
+            return camera.name, UpstreamError(f"HTTP {status}: {(data or {}).get('error')}")
+        return camera.name, data
+
+    async def fan_out(self, route, names):
+        await self.ensure_discovered()
+        selected = [self.cameras[name] for name in names if name in self.cameras] if names else list(self.cameras.values())
+        results, errors = {}, {}
+        if names:
+            errors.update({name: "unknown camera" for name in names if name not in self.cameras})
+        for name, result in await asyncio.gather(*(self.fetch(camera, route) for camera in selected)):
+            if isinstance(result, UpstreamError):
+                errors[name] = str(result)
+            else:
+                results[name] = result
+        if errors:
+            logger.warning(create_log_message(event="gateway_upstream_errors", route=route, errors=errors))
+        return results, errors
+
+    def query(self, route, names=None):
+        # Blocking entry point for request handler threads: cached, or shared with an identical query in flight
+        key = (route, tuple(names) if names else None)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = asyncio.run_coroutine_threadsafe(self.fan_out(route, names), self.loop).result()
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+                if future.exception() is None:
+                    self.cache[key] = (time.monotonic() + self.cache_seconds, future.result())
+                    # Expired entries go when the cache grows, so arbitrary from/to ranges cannot accumulate
+                    if len(self.cache) > 1024:
+                        now = time.monotonic()
+                        self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+        return result
+
+    def collect(self, from_ms, to_ms, names=None):
+        counts, errors = self.query(f"/cam/collect?{urlencode({'from': from_ms, 'to': to_ms})}", names)
+        counts = {name: data["count"] for name, data in counts.items()}
+        return {"count": sum(counts.values()), "cameras": counts, "errors": errors}
+
+    def detections_from(self, from_seconds, names=None):
+        counts, errors = self.query(f"/detections?from={from_seconds}", names)
+        merged = {}
+        for camera_counts in counts.values():
+            for label, count in camera_counts.items():
+                merged[label] = merged.get(label, 0) + count
+        return {"counts": merged, "cameras": counts, "errors": errors}
+
+    def health(self, names=None):
+        statuses, errors = self.query("/health", names)
+        healthy = not errors and all(status.get("status") == "healthy" for status in statuses.values())
+        return {"status": "healthy" if healthy else "degraded", "timestamp": int(time.time()), "cameras": statuses, "errors": errors}
+
+    def camera_list(self):
+        asyncio.run_coroutine_threadsafe(self.ensure_discovered(), self.loop).result()
+        return {name: f"http://{camera.pool.host}:{camera.pool.port}{camera.prefix}" for name, camera in sorted(self.cameras.items())}
+
+    def close(self):
+        for pool in self.pools.values():
+            self.loop.call_soon_threadsafe(pool.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1.0)
+
+
+class GatewayRequestHandler(RequestHandler):
+    """Serves the site-wide routes of a Gateway: /cam/collect, /detections?from=N, /health and /cameras.
+
+    Every route takes an optional ``cameras=a,b`` parameter restricting the query
+    to some cameras. Cameras that fail are listed under ``errors`` and left out
+    of the merged result.
+    """
+
+    def __init__(self, gateway, *args, **kwargs):
+        self.gateway = gateway
+        super().__init__(None, *args, **kwargs)
+
+    def route_get(self):
+        parsed_path = urlparse(self.path)
+        query_params = parse_qs(parsed_path.query)
+        names = [name for value in query_params.get("cameras", []) for name in value.split(",") if name] or None
+
+        logger.info(create_log_message(event="http_request", method="GET", path=self.path, client_address=self.client_address[0], instance="gateway"))
+
+        try:
+            if parsed_path.path == "/cam/collect":
+                self.handle_gateway_collect(query_params, names)
+            elif parsed_path.path == "/detections":
+                self.handle_gateway_detections(query_params, names)
+            elif parsed_path.path == "/health":
+                self.send_json_response(self.gateway.health(names))
+            elif parsed_path.path == "/cameras":
+                self.send_json_response(self.gateway.camera_list())
+            else:
+                self.send_error(404)
+        except Exception as e:
+            logger.error(create_log_message(event="gateway_error", path=self.path, error=str(e)))
+            self.send_error(500, f"Internal server error: {str(e)}")
+
+    def handle_gateway_collect(self, query_params, names):
+        from_ms = query_params.get("from", [None])[0]
+        to_ms = query_params.get("to", [None])[0]
+        if None in (from_ms, to_ms):
+            self.send_error(400, "Missing required parameters: 'from' and 'to'")
+            return
+        try:
+            from_ms, to_ms = int(float(from_ms)), int(float(to_ms))
+        except ValueError:
+            self.send_error(400, "Invalid parameters")
+            return
+        if from_ms >= to_ms:
+            self.send_error(400, "Invalid time range")
+            return
+        self.send_merged_response(self.gateway.collect(from_ms, to_ms, names))
+
+    def handle_gateway_detections(self, query_params, names):
+        from_seconds = query_params.get("from", [None])[0]
+        try:
+            from_seconds = int(from_seconds)
+        except (TypeError, ValueError):
+            self.send_error(400, "Invalid 'from' parameter. Must be an integer.")
+            return
+        if not 1 <= from_seconds <= 30:
+            self.send_error(400, "Invalid 'from' parameter. Must be between 1 and 30.")
+            return
+        self.send_merged_response(self.gateway.detections_from(from_seconds, names))
+
+    def send_merged_response(self, result):
+        # Partial results are still answered; only a query that no camera answered is an error
+        self.send_json_response(result, 502 if result["errors"] and not result["cameras"] else 200)
+
+
+def local_endpoints(instance_configs):
+    # The instances of this host's config.yaml, on their own ports
+    return [{"name": instance_config["name"], "url": f"http://localhost:{instance_config['api_port']}"} for instance_config in instance_configs]
+
+
+def create_gateway(settings=None, instance_configs=()):
+    settings = GATEWAY_SETTINGS if settings is None else settings
+    return Gateway(
+        settings.get("endpoints") or local_endpoints(instance_configs),
+        settings.get("cache_ms", 500),
+        settings.get("timeout_seconds", 2.0),
+        settings.get("max_connections", 8),
+    )
+
+
+def start_gateway(gateway, port_number):
+    class BoundGatewayRequestHandler(GatewayRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(gateway, *args, **kwargs)
+
+    httpd = TrackerHTTPServer(("", port_number), BoundGatewayRequestHandler)
+    logger.info(create_log_message(event="gateway_start", port=port_number, cameras=sorted(gateway.cameras), shared_listeners=len(gateway.pending_shared)))
+    httpd.serve_forever()
@@ -0,0 +1,91 @@
+import asyncio
+import gzip
+
+from app.utils.logger import get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one tracker host, on asyncio streams.
+
+    At most ``max_connections`` requests are in flight to the host; finished
+    connections are kept open and reused by the next request. The tracker's
+    server always sends a Content-Length, so responses are read without
+    chunked decoding.
+    """
+
+    def __init__(self, host, port, max_connections=8, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = []
+        self.slots = asyncio.Semaphore(max_connections)
+        self.connections_opened = 0
+        self.requests = 0
+
+    async def get(self, path):
+        # Returns (status, body); raises UpstreamError when the host cannot be reached or does not answer in time
+        async with self.slots:
+            while True:
+                reused = bool(self.idle)
+                reader, writer = self.idle.pop() if reused else await self._open()
+                try:
+                    status, body, keep_alive = await asyncio.wait_for(self._request(reader, writer, path), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                    writer.close()
+                    # The server closes idle connections after a while: retry on a fresh one
+                    if reused:
+                        continue
+                    raise UpstreamError(f"{self.host}:{self.port}: {e or type(e).__name__}") from e
+                except asyncio.TimeoutError as e:
+                    writer.close()
+                    raise UpstreamError(f"{self.host}:{self.port}: no response within {self.timeout}s") from e
+                self.requests += 1
+                if keep_alive:
+                    self.idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, body
+
+    async def _open(self):
+        try:
+            connection = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise UpstreamError(f"{self.host}:{self.port}: {e or 'connection timed out'}") from e
+        self.connections_opened += 1
+        logger.debug(create_log_message(event="upstream_connection_opened", host=self.host, port=self.port, connections=self.connections_opened))
+        return connection
+
+    async def _request(self, reader, writer, path):
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept-Encoding: gzip\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        else:
+            body = await reader.read()
+            keep_alive = False
+        if headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        return int(status), body, keep_alive
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
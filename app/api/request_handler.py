@@ -1,10 +1,25 @@
 import json
 import yaml
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import urlparse, parse_qs
 import time
 
-from app.utils.shared_state import latest_detections, get_unique_object_counts, camera_info, get_input_source
+from app.utils.shared_state import (
+    get_latest_detections,
+    get_unique_object_counts,
+    camera_info,
+    get_input_source,
+    get_capture_stats,
+    get_scheduler_stats,
+    get_zone_stats,
+    get_line_crossings,
+    get_motion_stats,
+    get_instance_status,
+    get_detection_version,
+)
+from app.utils.detection_stream import broadcasters, get_broadcaster
+from app.utils.metrics import HTTP_DURATION, HTTP_REQUESTS, render_metrics
+from app.api.response_cache import ResponseCache, encode_json
 from app.utils.person_counter import PersonCounter
 from app.utils.logger import get_logger, create_log_message
 
@@ -20,18 +35,94 @@ ALLOWED_ORIGINS = CORS_SETTINGS.get("allowed_origins", [])
 ALLOWED_METHODS = CORS_SETTINGS.get("allowed_methods", [])
 ALLOWED_HEADERS = CORS_SETTINGS.get("allowed_headers", [])
 
+# Response encoding settings
+API_SETTINGS = config.get("api", {})
+GZIP_ENABLED = API_SETTINGS.get("gzip", True)
+GZIP_MIN_BYTES = API_SETTINGS.get("gzip_min_bytes", 1024)
+# A comment line is sent on idle streams so proxies and clients keep the connection open
+STREAM_KEEPALIVE_SECONDS = API_SETTINGS.get("stream", {}).get("keepalive_seconds", 15)
+
+# Route label of request metrics; other paths are counted as "other" to bound the number of series
+METRIC_ROUTES = ("/detections", "/detections/stream", "/cam/collect", "/zones", "/lines", "/health", "/metrics")
+
+# Encoded bodies of /detections, /detections?from=N and /health, per instance and data version
+response_cache = ResponseCache()
+
+
+class TrackerHTTPServer(ThreadingHTTPServer):
+    # Each connection is served on its own thread, so a slow client never blocks the other pollers
+    daemon_threads = True
+    request_queue_size = 128
+
 
 class RequestHandler(BaseHTTPRequestHandler):
-    def __init__(self, instance_config, *args, **kwargs):
+    # HTTP/1.1 keeps connections alive between polls; every response carries a Content-Length
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = 30
+    # Instances served by the shared listener, by name
+    instances = {}
+
+    def __init__(self, instance_config, *args, instances=None, **kwargs):
         self.instance_config = instance_config
+        self.instances = instances or {}
         super().__init__(*args, **kwargs)
 
+    @property
+    def instance_name(self):
+        return self.instance_config["name"] if self.instance_config else None
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_cors_headers()
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
+    def route_instance(self):
+        # On the shared listener, /instances/<name>/<route> is served as <route> of that instance
+        parsed_path = urlparse(self.path)
+        if parsed_path.path.rstrip("/") == "/instances":
+            self.send_json_response(sorted(self.instances))
+            return False
+        parts = parsed_path.path.split("/", 3)
+        if len(parts) < 3 or parts[1] != "instances" or parts[2] not in self.instances:
+            self.send_error(404, "Unknown instance")
+            logger.warning(create_log_message(event="http_unknown_instance", path=self.path))
+            return False
+        self.instance_config = self.instances[parts[2]]
+        self.path = "/" + (parts[3] if len(parts) > 3 else "") + (f"?{parsed_path.query}" if parsed_path.query else "")
+        return True
+
+    def send_response(self, code, message=None):
+        # Remembered for the request counter
+        self.response_code = code
+        super().send_response(code, message)
+
     def do_GET(self):
+        start = time.perf_counter()
+        self.response_code = None
+        try:
+            self.route_get()
+        finally:
+            self.record_request_metrics(time.perf_counter() - start)
+
+    def record_request_metrics(self, duration):
+        route = urlparse(self.path).path
+        route = route if route in METRIC_ROUTES else "other"
+        instance_name = self.instance_name or ""
+        # A stream lasts as long as its client stays connected, which says nothing about request handling
+        if route != "/detections/stream":
+            HTTP_DURATION.observe(duration, instance_name, route)
+        HTTP_REQUESTS.inc(instance_name, route, str(self.response_code))
+
+    def route_get(self):
+        if self.instances and urlparse(self.path).path == "/metrics":
+            # The shared listener exposes the metrics of all its instances
+            self.handle_metrics(list(self.instances))
+            return
+        if self.instances and not self.route_instance():
+            return
+
         parsed_path = urlparse(self.path)
 
         logger.info(
@@ -42,10 +133,18 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         if parsed_path.path == "/detections":
             self.handle_detections()
+        elif parsed_path.path == "/detections/stream":
+            self.handle_detection_stream()
         elif parsed_path.path == "/cam/collect":
             self.handle_cam_collect()
+        elif parsed_path.path == "/zones":
+            self.handle_zones()
+        elif parsed_path.path == "/lines":
+            self.handle_lines()
         elif parsed_path.path == "/health":
             self.handle_health()
+        elif parsed_path.path == "/metrics":
+            self.handle_metrics([self.instance_config["name"]])
         else:
             self.send_error(404)
             logger.warning(create_log_message(event="http_not_found", path=self.path, instance=self.instance_config["name"]))
@@ -58,14 +157,41 @@ class RequestHandler(BaseHTTPRequestHandler):
             try:
                 from_seconds = int(from_seconds)
                 if 1 <= from_seconds <= 30:
-                    object_counts = get_unique_object_counts(from_seconds, self.instance_config["name"])
-                    self.send_json_response(object_counts)
+                    instance_name = self.instance_config["name"]
+                    # Windows also age without new frames, so cached counts are reused for at most 100 ms
+                    self.send_cached_json_response(
+                        ("detections_from", from_seconds), int(time.time() * 10), lambda: get_unique_object_counts(from_seconds, instance_name)
+                    )
                 else:
                     self.send_error(400, "Invalid 'from' parameter. Must be between 1 and 30.")
             except ValueError:
                 self.send_error(400, "Invalid 'from' parameter. Must be an integer.")
         else:
-            self.send_json_response(latest_detections.get(self.instance_config["name"], []))
+            instance_name = self.instance_config["name"]
+            self.send_cached_json_response(("detections",), None, lambda: get_latest_detections(instance_name))
+
+    def handle_detection_stream(self):
+        # Server-Sent Events: one event per published detection, until the client or the instance goes away
+        instance_name = self.instance_config["name"]
+        broadcaster = get_broadcaster(instance_name)
+        subscriber = broadcaster.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            # The stream has no Content-Length, so it ends with the connection
+            self.send_header("Connection", "close")
+            self.send_cors_headers()
+            self.end_headers()
+            self.close_connection = True
+            while not subscriber.closed:
+                messages = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                self.wfile.write(b"".join(messages) if messages else b": keepalive\n\n")
+                self.wfile.flush()
+        except OSError:
+            logger.info(create_log_message(event="stream_client_disconnected", client_address=self.client_address[0], instance=instance_name))
+        finally:
+            broadcaster.unsubscribe(subscriber)
 
     def handle_cam_collect(self):
         query_params = parse_qs(urlparse(self.path).query)
@@ -124,6 +250,14 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return
 
             count = person_counter.get_count(from_seconds, to_seconds)
+            if count is None:
+                # The range reaches back to tracks no longer kept: dropped from memory and not covered by the rollups
+                # or the track store, or overwritten in a worker's published intervals (--processes)
+                logger.warning(
+                    create_log_message(event="cam_collect_unavailable", from_seconds=from_seconds, to_seconds=to_seconds, instance=self.instance_config["name"])
+                )
+                self.send_error(404, "Person tracks are no longer kept for this time range")
+                return
 
             logger.info(
                 create_log_message(
@@ -147,13 +281,68 @@ class RequestHandler(BaseHTTPRequestHandler):
             )
             self.send_error(500, f"Internal server error: {str(e)}")
 
+    def handle_zones(self):
+        stats = get_zone_stats(self.instance_config["name"])
+        if stats is None:
+            self.send_error(404, "No zones or lines configured for this camera")
+            return
+        self.send_json_response({"timestamp": stats["timestamp"], "zones": stats["zones"]})
+
+    def handle_lines(self):
+        # Crossings since start, or between `from` and `to` (ms) like /cam/collect
+        instance_name = self.instance_config["name"]
+        stats = get_zone_stats(instance_name)
+        if stats is None:
+            self.send_error(404, "No zones or lines configured for this camera")
+            return
+        query_params = parse_qs(urlparse(self.path).query)
+        from_ms = query_params.get("from", [None])[0]
+        to_ms = query_params.get("to", [None])[0]
+        if from_ms is None and to_ms is None:
+            self.send_json_response({"timestamp": stats["timestamp"], "lines": stats["lines"]})
+            return
+        try:
+            from_ms, to_ms = int(float(from_ms)), int(float(to_ms))
+        except (TypeError, ValueError):
+            self.send_error(400, "Invalid parameters: 'from' and 'to' must both be given, in milliseconds")
+            return
+        if from_ms >= to_ms:
+            self.send_error(400, "Invalid time range")
+            return
+        crossings = get_line_crossings(instance_name, from_ms, to_ms)
+        if crossings is None:
+            logger.warning(create_log_message(event="line_crossings_unavailable", from_ms=from_ms, to_ms=to_ms, instance=instance_name))
+            self.send_error(404, "Crossings are not kept for this time range")
+            return
+        self.send_json_response({"from": from_ms, "to": to_ms, "lines": crossings})
+
+    def handle_metrics(self, instance_names):
+        body = render_metrics(instance_names, PersonCounter.counters, broadcasters).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(create_log_message(event="broken_pipe_error", instance=self.instance_name))
+
     def handle_health(self):
+        # The response carries a timestamp in seconds, so it changes at least once per second
+        self.send_cached_json_response(("health",), int(time.time()), self.build_health_status)
+
+    def build_health_status(self):
         instance_name = self.instance_config["name"]
         input_source = get_input_source(instance_name)
         person_counter = PersonCounter.get_counter(instance_name)
-        latest_detection = latest_detections.get(instance_name, [])
+        latest_detection = get_latest_detections(instance_name)
 
-        is_tracking = person_counter is not None and bool(latest_detection)
+        status = get_instance_status(instance_name)
+        # An instance is not healthy before its model is warmed up
+        is_starting = status.get("state") in ("starting", "warming_up")
+        capture = get_capture_stats(instance_name)
+        # A live source being reconnected serves stale detections
+        is_tracking = person_counter is not None and bool(latest_detection) and not is_starting and (capture or {}).get("connected", True)
 
         try:
             if latest_detection and isinstance(latest_detection, list):
@@ -166,19 +355,27 @@ class RequestHandler(BaseHTTPRequestHandler):
             last_detection_time = None
 
         health_status = {
-            "status": "healthy" if is_tracking else "degraded",
+            "status": "starting" if is_starting else "healthy" if is_tracking else "degraded",
+            "state": status.get("state"),
             "instance": instance_name,
             "timestamp": int(time.time()),
             "input_source": input_source,
             "tracking_status": "active" if is_tracking else "inactive",
             "person_counter_available": person_counter is not None,
             "last_detection_time": last_detection_time,
+            "capture": capture,
+            "frame_age_ms": (capture or {}).get("frame_age_ms"),
+            "reconnects": (capture or {}).get("reconnects"),
+            "motion": get_motion_stats(instance_name),
+            "scheduler": get_scheduler_stats(instance_name),
+            "time_to_ready": status.get("time_to_ready"),
+            "time_to_first_detection": status.get("time_to_first_detection"),
         }
 
         # Log the health status
         logger.info(create_log_message(event="health_check", health_status=health_status, instance=instance_name))
 
-        self.send_json_response(health_status)
+        return health_status
 
     def send_cors_headers(self):
         origin = self.headers.get("Origin")
@@ -187,30 +384,60 @@ class RequestHandler(BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Methods", ", ".join(ALLOWED_METHODS))
         self.send_header("Access-Control-Allow-Headers", ", ".join(ALLOWED_HEADERS))
 
-    def send_json_response(self, data, status_code=200):
+    def send_cached_json_response(self, route, time_bucket, build):
+        instance_name = self.instance_config["name"]
+        version = (get_detection_version(instance_name), time_bucket)
+        cached = response_cache.get((instance_name,) + route, version, build)
+
+        if cached.etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            try:
+                self.send_response(304)
+                self.send_header("ETag", cached.etag)
+                self.send_cors_headers()
+                self.end_headers()
+            except (BrokenPipeError, ConnectionResetError):
+                logger.warning(create_log_message(event="broken_pipe_error", instance=instance_name))
+            return
+
+        body, content_encoding = cached.body, None
+        if GZIP_ENABLED and len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body, content_encoding = cached.gzipped(), "gzip"
+        self.send_json_response(None, body=body, etag=cached.etag, content_encoding=content_encoding)
+
+    def send_json_response(self, data, status_code=200, body=None, etag=None, content_encoding=None):
         try:
+            if body is None:
+                body = encode_json(data)
             self.send_response(status_code)
             self.send_header("Content-type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if etag:
+                self.send_header("ETag", etag)
+            if GZIP_ENABLED:
+                self.send_header("Vary", "Accept-Encoding")
+            if content_encoding:
+                self.send_header("Content-Encoding", content_encoding)
             self.send_cors_headers()
             self.end_headers()
-            self.wfile.write(json.dumps(data, indent=2).encode())
-        except BrokenPipeError:
-            logger.warning(create_log_message(event="broken_pipe_error", instance=self.instance_config["name"]))
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(create_log_message(event="broken_pipe_error", instance=self.instance_name))
         except Exception as e:
-            logger.error(create_log_message(event="send_json_response_error", error=str(e), instance=self.instance_config["name"]))
+            logger.error(create_log_message(event="send_json_response_error", error=str(e), instance=self.instance_name))
 
-    def send_error(self, code, message=None):
+    def send_error(self, code, message=None, explain=None):
         try:
+            body = json.dumps({"error": message}).encode() if message else b""
             self.send_response(code)
             self.send_header("Content-type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
             self.send_cors_headers()
             self.end_headers()
-            if message:
-                self.wfile.write(json.dumps({"error": message}).encode())
-        except BrokenPipeError:
-            logger.warning(create_log_message(event="broken_pipe_error", instance=self.instance_config["name"]))
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(create_log_message(event="broken_pipe_error", instance=self.instance_name))
         except Exception as e:
-            logger.error(create_log_message(event="send_error_response_error", error=str(e), instance=self.instance_config["name"]))
+            logger.error(create_log_message(event="send_error_response_error", error=str(e), instance=self.instance_name))
 
 
 def start_server(instance_config):
@@ -221,6 +448,20 @@ def start_server(instance_config):
         def __init__(self, *args, **kwargs):
             super().__init__(instance_config, *args, **kwargs)
 
-    httpd = HTTPServer(server_address, InstanceRequestHandler)
+    httpd = TrackerHTTPServer(server_address, InstanceRequestHandler)
     logger.info(create_log_message(event="server_start", port=port_number, instance=instance_config["name"]))
     httpd.serve_forever()
+
+
+def start_shared_server(instance_configs, port_number):
+    # One listener for every instance, routed by /instances/<name>/...
+    server_address = ("", port_number)
+    instances = {instance_config["name"]: instance_config for instance_config in instance_configs}
+
+    class SharedRequestHandler(RequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(None, *args, instances=instances, **kwargs)
+
+    httpd = TrackerHTTPServer(server_address, SharedRequestHandler)
+    logger.info(create_log_message(event="shared_server_start", port=port_number, instances=sorted(instances)))
+    httpd.serve_forever()
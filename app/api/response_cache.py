@@ -0,0 +1,57 @@
+import gzip
+import hashlib
+import json
+import threading
+
+
+def encode_json(data):
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def make_etag(body):
+    # Weak validator: the gzip and identity encodings of a body share it
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+class CachedResponse:
+    __slots__ = ("version", "body", "etag", "gzipped_body")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = make_etag(body)
+        self.gzipped_body = None
+
+    def gzipped(self):
+        # Compressed on first use, then shared by every gzip-capable client of this version
+        if self.gzipped_body is None:
+            self.gzipped_body = gzip.compress(self.body, compresslevel=5, mtime=0)
+        return self.gzipped_body
+
+
+class ResponseCache:
+    """Encoded response bodies keyed by route, valid for one version of the instance's data.
+
+    The tracking loop bumps the version whenever it publishes detections, so a
+    body is serialized once per produced frame however many clients poll it.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, build):
+        entry = self.entries.get(key)
+        if entry is not None and entry.version == version:
+            self.hits += 1
+            return entry
+        entry = CachedResponse(version, encode_json(build()))
+        with self.lock:
+            self.entries[key] = entry
+            self.misses += 1
+        return entry
+
+    def get_stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
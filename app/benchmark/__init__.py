@@ -0,0 +1,4 @@
+from .runner import run_benchmark
+from .synthetic import generate_video
+
+__all__ = ["run_benchmark", "generate_video"]
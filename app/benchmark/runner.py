@@ -0,0 +1,142 @@
+import json
+import logging
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+from app.benchmark.synthetic import generate_video
+from app.utils.person_counter import PersonCounter
+from app.utils.shared_state import get_instance_status, get_motion_stats
+from app.utils.timing import StageTimer
+from app.utils.logger import get_logger, setup_logger, create_log_message
+
+logger = get_logger(__name__)
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+BENCHMARK_SETTINGS = config.get("benchmark", {})
+
+DEFAULT_SCENARIO = {"width": 1280, "height": 720, "fps": 30, "seconds": 10, "people": 5, "seed": 0}
+# Settings pinned for every scenario unless the scenario sets them, so reports do not depend on the live
+# defaults of config.yaml; the track store is always disabled so a benchmark never writes data/tracks
+PINNED_SETTINGS = {"motion": False, "shared_model": True}
+
+
+def scenario_settings(scenario):
+    return {**{key: scenario.get(key, value) for key, value in PINNED_SETTINGS.items()}, "track_store": False}
+
+
+def apply_settings(instance_name, settings):
+    # Only called in the scenario's own process, so changing the loaded config affects no other run
+    from app.vision import track as track_module
+
+    track_module.config.setdefault("instances", []).append({"name": instance_name, "motion": {"enabled": settings["motion"]}})
+    track_module.config["inference"] = {**track_module.config.get("inference", {}), "shared_model": settings["shared_model"]}
+    PersonCounter.counters[instance_name] = PersonCounter(instance_name, store=None)
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process so far (each scenario has its own process); None where the
+    # resource module is unavailable
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenario_video(scenario, video_dir):
+    # Videos are generated once per set of parameters and reused by later runs
+    name = "{name}-{width}x{height}-{fps}fps-{seconds}s-{people}p-seed{seed}.mp4".format(**scenario)
+    path = Path(video_dir) / name
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.time()
+        generate_video(path, scenario["width"], scenario["height"], scenario["fps"], scenario["seconds"], scenario["people"], scenario["seed"])
+        logger.info(create_log_message(event="benchmark_video_generated", path=str(path), duration=round(time.time() - start, 2)))
+    return path
+
+
+def run_scenario(scenario, model_name, video_dir, log_level=logging.INFO, file_only=False):
+    # Runs in a fresh spawned process, so that models, caches and peak RSS are the scenario's own
+    setup_logger(level=log_level, file_only=file_only)
+    # Imported here: loading torch is only needed once a benchmark actually runs
+    from app.vision.track import track
+
+    scenario = {**DEFAULT_SCENARIO, **scenario}
+    video = scenario_video(scenario, video_dir)
+    instance_name = f"benchmark-{scenario['name']}"
+    settings = scenario_settings(scenario)
+    apply_settings(instance_name, settings)
+    timer = StageTimer()
+
+    start = time.time()
+    track(str(video), model_name, track_all=scenario.get("track_all", False), loop_video=False, instance_name=instance_name, timer=timer)
+    end = time.time()
+
+    status = get_instance_status(instance_name)
+    ready = status.get("started_at", start) + (status.get("time_to_ready") or 0)
+    frames = timer.count("update_detections")
+    return {
+        "scenario": scenario,
+        "settings": settings,
+        "frames": frames,
+        "expected_frames": int(scenario["fps"] * scenario["seconds"]),
+        "time_to_ready": status.get("time_to_ready"),
+        "time_to_first_detection": status.get("time_to_first_detection"),
+        # Frames per second once the model is warmed up
+        "fps": round(frames / (end - ready), 2) if frames and end > ready else 0,
+        "stages_ms": timer.summary(),
+        "motion": get_motion_stats(instance_name),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_benchmark(model_name, scenarios=None, output=None, settings=None, log_level=logging.INFO, file_only=False):
+    """Runs every scenario through track(), each in its own process, and writes the results as JSON; returns them as a dict."""
+    settings = BENCHMARK_SETTINGS if settings is None else settings
+    scenarios = scenarios or settings.get("scenarios") or [{"name": "default"}]
+    output_dir = Path(settings.get("output_dir", "benchmarks"))
+
+    report = {
+        "timestamp": int(time.time()),
+        "commit": git_commit(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "model": model_name,
+        # Sections not pinned per scenario (see each scenario's `settings`)
+        "settings": {section: config.get(section) for section in ("inference", "motion", "capture", "decode")},
+        "scenarios": [],
+    }
+    context = multiprocessing.get_context("spawn")
+    for scenario in scenarios:
+        logger.info(create_log_message(event="benchmark_scenario_start", scenario=scenario))
+        with context.Pool(1) as pool:
+            result = pool.apply(run_scenario, (scenario, model_name, output_dir / "videos", log_level, file_only))
+        logger.info(create_log_message(event="benchmark_scenario_end", scenario=scenario.get("name"), frames=result["frames"], fps=result["fps"]))
+        report["scenarios"].append(result)
+    peaks = [result["peak_rss_mb"] for result in report["scenarios"] if result["peak_rss_mb"] is not None]
+    report["peak_rss_mb"] = max(peaks) if peaks else None
+
+    output = Path(output) if output else output_dir / f"benchmark-{report['timestamp']}-{report['commit'] or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    report["output"] = str(output)
+    return report
@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+
+
+def person_sprites(people, width, height, rng):
+    # Position, velocity (pixels per frame), size and color of each walking figure
+    sizes = rng.uniform(0.25, 0.45, people) * height
+    return {
+        "x": rng.uniform(0, width, people),
+        "y": rng.uniform(sizes / 2, height - sizes / 2, people),
+        "vx": rng.choice([-1, 1], people) * rng.uniform(0.002, 0.01, people) * width,
+        "vy": rng.uniform(-0.002, 0.002, people) * height,
+        "size": sizes,
+        "color": rng.integers(40, 220, (people, 3)),
+    }
+
+
+def draw_person(frame, x, y, size, color):
+    # Head, torso and legs: a rough upright silhouette
+    color = tuple(int(c) for c in color)
+    head = max(2, int(size * 0.09))
+    cv2.circle(frame, (int(x), int(y - size * 0.38)), head, color, -1)
+    cv2.ellipse(frame, (int(x), int(y - size * 0.08)), (max(2, int(size * 0.12)), max(3, int(size * 0.2))), 0, 0, 360, color, -1)
+    for offset in (-0.05, 0.05):
+        cv2.line(frame, (int(x + size * offset), int(y + size * 0.1)), (int(x + size * offset * 2), int(y + size * 0.5)), color, max(1, int(size * 0.05)))
+
+
+def generate_video(path, width=1280, height=720, fps=30, seconds=10, people=5, seed=0):
+    """Writes a deterministic video of figures walking over a static background.
+
+    The same parameters and seed always produce the same frames, so benchmark
+    runs on different commits process identical input.
+    """
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(60, 160, width, dtype=np.float32)
+    background = np.repeat(np.repeat(gradient[None, :, None], height, axis=0), 3, axis=2)
+    background += rng.normal(0, 6, background.shape).astype(np.float32)
+    background = np.clip(background, 0, 255).astype(np.uint8)
+
+    sprites = person_sprites(people, width, height, rng)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write video: {path}")
+    try:
+        for _ in range(int(fps * seconds)):
+            frame = background.copy()
+            for i in range(people):
+                draw_person(frame, sprites["x"][i], sprites["y"][i], sprites["size"][i], sprites["color"][i])
+            sprites["x"] += sprites["vx"]
+            sprites["y"] += sprites["vy"]
+            # Walk back and forth inside the frame
+            for axis, velocity, limit in (("x", "vx", width), ("y", "vy", height)):
+                outside = (sprites[axis] < 0) | (sprites[axis] > limit)
+                sprites[velocity][outside] *= -1
+                sprites[axis] = np.clip(sprites[axis], 0, limit)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
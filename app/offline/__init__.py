@@ -0,0 +1,4 @@
+from .runner import run_offline, process_file
+from .writers import OUTPUT_FORMATS
+
+__all__ = ["run_offline", "process_file", "OUTPUT_FORMATS"]
@@ -0,0 +1,253 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import yaml
+
+from app.offline.writers import JSONL, create_writer
+from app.utils.frame_record import FrameRecord, STAGES
+from app.utils.person_counter import PersonCounter
+from app.vision.decode import OPENCV, open_capture, output_size, pyav_available, select_decode_backend
+from app.utils.logger import setup_logger, get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+OFFLINE_SETTINGS = config.get("offline", {})
+
+# Model of a worker process, loaded once by init_worker
+worker_model = None
+
+
+def parse_start_time(value):
+    # Epoch seconds or an ISO 8601 date and time (local time when it has no offset); returns epoch ms
+    try:
+        return int(float(value) * 1000)
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def recording_start_ms(path, duration_ms):
+    # The container's creation time when PyAV can read it, else the file's modification time
+    # (when the recorder finished writing) minus the video's duration
+    if pyav_available():
+        import av
+
+        try:
+            with av.open(str(path)) as container:
+                creation_time = container.metadata.get("creation_time")
+            if creation_time:
+                return parse_start_time(creation_time)
+        except (av.error.FFmpegError, ValueError):
+            pass
+    return int(os.path.getmtime(path) * 1000 - duration_ms)
+
+
+def output_names(files):
+    # Output name of each file: its path relative to the common directory of all inputs, without the extension,
+    # which is only kept to tell apart files differing by it (cam.mp4 and cam.mkv)
+    paths = [Path(os.path.abspath(path)) for path in files]
+    if len(set(paths)) < len(paths):
+        raise ValueError("The same file is given more than once")
+    root = Path(os.path.commonpath([path.parent for path in paths])) if paths else None
+    names = [str(path.relative_to(root).with_suffix("")) for path in paths]
+    return [str(path.relative_to(root)) if names.count(name) > 1 else name for path, name in zip(paths, names)]
+
+
+def read_batch(vid, batch_size):
+    # Up to batch_size (frame, presentation time in ms) pairs
+    frames, pts = [], []
+    while len(frames) < batch_size:
+        success, frame = vid.read()
+        if not success:
+            break
+        frames.append(frame)
+        pts.append(round(vid.get(cv2.CAP_PROP_POS_MSEC)))
+    return frames, pts
+
+
+def process_file(
+    path, model, output_dir, output_format=JSONL, batch_size=16, classes=(0,), imgsz=None, start_ms=None, decode_settings=None, output_name=None
+):
+    """Runs detection and tracking over every frame of a video file and writes the results to output_dir.
+
+    Frames are decoded in order and run through the model in batches, then
+    through ByteTrack one by one. Detections are timestamped with the start of
+    the recording plus the frame's presentation time, and person track intervals
+    are kept by a PersonCounter as in live mode. Results are written under
+    ``output_name`` (default: the file's name without extension). Returns a
+    summary dict.
+    """
+    # Imported here: torch is only loaded once a file is actually processed
+    from app.vision.inference import apply_tracker, create_tracker
+
+    started = time.time()
+    decode_settings = config.get("decode", {}) if decode_settings is None else decode_settings
+    threads = decode_settings.get("threads", 0)
+    # Frames are decoded at the inference size and boxes scaled back to source pixels, as in live mode
+    target = max(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz or 640
+
+    def decode_size_for(width, height):
+        return output_size(width, height, target) if decode_settings.get("downscale", True) else None
+
+    backend, _ = select_decode_backend(
+        path, decode_settings.get("backend", OPENCV), threads, decode_settings.get("probe_frames", 30), is_file=True, size_for=decode_size_for
+    )
+    vid = open_capture(str(path), backend, threads)
+    if not vid.isOpened():
+        raise ValueError(f"Failed to open video file: {path}")
+
+    width = int(vid.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(vid.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = vid.get(cv2.CAP_PROP_FPS)
+    duration_ms = vid.get(cv2.CAP_PROP_FRAME_COUNT) * 1000 / fps if fps else 0
+    start_ms = recording_start_ms(path, duration_ms) if start_ms is None else start_ms
+    decode_size = decode_size_for(width, height)
+    scale = (width / decode_size[0], height / decode_size[1]) if decode_size else (1.0, 1.0)
+    if decode_size:
+        vid.set_output_size(decode_size)
+
+    stem = Path(output_dir) / (output_name or Path(path).stem)
+    stem.parent.mkdir(parents=True, exist_ok=True)
+    writer = create_writer(output_format, str(stem))
+    tracker = create_tracker()
+    # Nothing recorded in the file falls out of the retention window before the end
+    counter = PersonCounter(f"offline-{Path(path).name}", retention_hours=duration_ms / 3600000 + 1)
+    options = {"imgsz": imgsz} if imgsz else {}
+    frames_count = objects_count = 0
+    logger.info(
+        create_log_message(
+            event="offline_file_start", path=str(path), backend=backend, resolution=f"{width}x{height}", fps=fps, start_ms=start_ms, format=output_format
+        )
+    )
+
+    try:
+        while True:
+            frames, pts = read_batch(vid, batch_size)
+            if not frames:
+                break
+            frames_count += len(frames)
+            results = model.predict(frames, classes=list(classes) if classes is not None else None, verbose=False, **options)
+            for result, pts_ms in zip(results, pts):
+                result = apply_tracker(tracker, result)
+                if len(result.boxes) == 0:
+                    continue
+                timestamp = start_ms + pts_ms
+                record = FrameRecord.from_box_data(
+                    timestamp, str(path), fps, result.boxes.data.cpu().numpy(), model.names, tuple(result.speed[stage] for stage in STAGES), scale=scale
+                )
+                writer.write_frame(record, pts_ms)
+                counter.update_ids(record.track_ids("person"), timestamp)
+                objects_count += len(record)
+        # Sorted by first sighting, like the track interval store
+        writer.write_tracks(sorted(((track_id, first, latest) for track_id, first, latest in counter.movements.items()), key=lambda track: track[1:]))
+    finally:
+        writer.close()
+        vid.release()
+
+    seconds = time.time() - started
+    summary = {
+        "file": str(path),
+        "frames": frames_count,
+        "objects": objects_count,
+        "persons": counter.get_count_since_boot(),
+        "start_ms": start_ms,
+        "video_seconds": round(duration_ms / 1000, 3),
+        "processing_seconds": round(seconds, 3),
+        # How many times faster than real time the file was processed
+        "speed": round(duration_ms / 1000 / seconds, 2) if seconds > 0 else None,
+        "outputs": writer.paths,
+    }
+    logger.info(create_log_message(event="offline_file_done", **summary))
+    return summary
+
+
+def init_worker(model_name, torch_threads, log_level, file_only):
+    global worker_model
+    setup_logger(level=log_level, file_only=file_only)
+    import torch
+
+    from app.vision.inference import load_model
+
+    # Workers share the cores instead of each starting one torch thread per core
+    torch.set_num_threads(torch_threads)
+    worker_model = load_model(model_name)
+
+
+def process_task(task):
+    path, options = task
+    try:
+        return process_file(path, worker_model, **options)
+    except Exception as e:
+        logger.error(create_log_message(event="offline_file_error", path=str(path), error=str(e)))
+        return {"file": str(path), "error": str(e)}
+
+
+def run_offline(
+    files,
+    model_name,
+    output_dir=None,
+    output_format=None,
+    workers=None,
+    batch_size=None,
+    track_all=False,
+    start_time=None,
+    settings=None,
+    log_level=logging.INFO,
+    file_only=False,
+):
+    """Processes video files as fast as possible, in parallel worker processes, and writes a summary.json next to the results."""
+    global worker_model
+    settings = OFFLINE_SETTINGS if settings is None else settings
+    output_dir = Path(output_dir or settings.get("output_dir", "offline"))
+    options = {
+        "output_dir": output_dir,
+        "output_format": output_format or settings.get("format", JSONL),
+        "batch_size": int(batch_size or settings.get("batch_size", 16)),
+        "classes": None if track_all else (0,),
+        "imgsz": config.get("inference", {}).get("imgsz"),
+        "start_ms": parse_start_time(start_time) if start_time is not None else None,
+    }
+    workers = max(1, min(len(files), int(workers or settings.get("workers") or os.cpu_count() or 1)))
+    # Inputs with the same name in different directories must not overwrite each other's results
+    tasks = [(path, {**options, "output_name": name}) for path, name in zip(files, output_names(files))]
+    logger.info(
+        create_log_message(
+            event="offline_start",
+            files=len(files),
+            workers=workers,
+            model=model_name,
+            output_dir=str(output_dir),
+            format=options["output_format"],
+            batch_size=options["batch_size"],
+        )
+    )
+
+    started = time.time()
+    if workers == 1:
+        from app.vision.inference import load_model
+
+        worker_model = load_model(model_name)
+        results = [process_task(task) for task in tasks]
+    else:
+        # Spawned workers start from a clean interpreter on every platform
+        context = multiprocessing.get_context("spawn")
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        with context.Pool(workers, initializer=init_worker, initargs=(model_name, torch_threads, log_level, file_only)) as pool:
+            results = pool.map(process_task, tasks, chunksize=1)
+
+    report = {"model": model_name, "workers": workers, "seconds": round(time.time() - started, 3), "files": results}
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "summary.json", "w") as summary_file:
+        json.dump(report, summary_file, indent=2)
+    report["output"] = str(output_dir / "summary.json")
+    logger.info(create_log_message(event="offline_done", files=len(files), workers=workers, seconds=report["seconds"]))
+    return report
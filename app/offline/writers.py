@@ -0,0 +1,132 @@
+import importlib.util
+import json
+
+import numpy as np
+
+from app.utils.frame_record import NO_ID
+
+JSONL = "jsonl"
+PARQUET = "parquet"
+OUTPUT_FORMATS = (JSONL, PARQUET)
+
+# Rows buffered before a Parquet row group is written
+ROW_GROUP_ROWS = 65536
+
+
+def pyarrow_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class JsonlWriter:
+    """One JSON line per frame with detections, in the /detections format plus the frame's ``pts_ms``.
+
+    Person track intervals go to a second file, one ``{"id", "first", "latest"}``
+    line per track.
+    """
+
+    def __init__(self, stem):
+        self.detections_path = f"{stem}.detections.jsonl"
+        self.tracks_path = f"{stem}.tracks.jsonl"
+        self.detections = open(self.detections_path, "w")
+
+    def write_frame(self, record, pts_ms):
+        self.detections.write(json.dumps({**record.to_dict(), "pts_ms": pts_ms}, separators=(",", ":")) + "\n")
+
+    def write_tracks(self, tracks):
+        with open(self.tracks_path, "w") as tracks_file:
+            for track_id, first, latest in tracks:
+                tracks_file.write(json.dumps({"id": track_id, "first": first, "latest": latest}, separators=(",", ":")) + "\n")
+
+    def close(self):
+        self.detections.close()
+
+    @property
+    def paths(self):
+        return [self.detections_path, self.tracks_path]
+
+
+class ParquetWriter:
+    """One row per detected object, written column by column from the FrameRecord arrays.
+
+    Columns: timestamp, pts_ms, track_id (null when untracked), label, x, y, w, h
+    (box center and size) and confidence. Person track intervals are written to
+    a second file with id, first and latest columns.
+    """
+
+    def __init__(self, stem):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.pq = pq
+        self.detections_path = f"{stem}.detections.parquet"
+        self.tracks_path = f"{stem}.tracks.parquet"
+        self.schema = pa.schema(
+            [
+                ("timestamp", pa.int64()),
+                ("pts_ms", pa.int64()),
+                ("track_id", pa.int64()),
+                ("label", pa.string()),
+                ("x", pa.float32()),
+                ("y", pa.float32()),
+                ("w", pa.float32()),
+                ("h", pa.float32()),
+                ("confidence", pa.float32()),
+            ]
+        )
+        self.writer = pq.ParquetWriter(self.detections_path, self.schema)
+        self.pending = []
+        self.pending_rows = 0
+
+    def write_frame(self, record, pts_ms):
+        self.pending.append((record, pts_ms))
+        self.pending_rows += len(record)
+        if self.pending_rows >= ROW_GROUP_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        records = [record for record, _ in self.pending]
+        counts = [len(record) for record in records]
+        ids = np.concatenate([record.ids for record in records])
+        boxes = np.concatenate([record.boxes for record in records]).astype(np.float32)
+        pa = self.pa
+        table = pa.Table.from_arrays(
+            [
+                pa.array(np.repeat([record.timestamp for record in records], counts).astype(np.int64)),
+                pa.array(np.repeat([pts_ms for _, pts_ms in self.pending], counts).astype(np.int64)),
+                pa.array(ids, mask=ids == NO_ID),
+                pa.array([label for record in records for label in record.labels()], type=pa.string()),
+                *(pa.array(boxes[:, column]) for column in range(4)),
+                pa.array(np.concatenate([record.confidences for record in records]).astype(np.float32)),
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(table)
+        self.pending.clear()
+        self.pending_rows = 0
+
+    def write_tracks(self, tracks):
+        pa = self.pa
+        track_ids, firsts, latests = zip(*tracks) if tracks else ((), (), ())
+        table = pa.table({"id": pa.array(track_ids, pa.int64()), "first": pa.array(firsts, pa.int64()), "latest": pa.array(latests, pa.int64())})
+        self.pq.write_table(table, self.tracks_path)
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    @property
+    def paths(self):
+        return [self.detections_path, self.tracks_path]
+
+
+def create_writer(output_format, stem):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}. Must be one of {', '.join(OUTPUT_FORMATS)}")
+    if output_format == PARQUET:
+        if not pyarrow_available():
+            raise ValueError("Parquet output requires pyarrow (pip install pyarrow)")
+        return ParquetWriter(stem)
+    return JsonlWriter(stem)
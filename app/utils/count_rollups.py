@@ -0,0 +1,171 @@
+import numpy as np
+
+# Default tiers as (bucket resolution in seconds, buckets kept): 1 s over the last hour,
+# 1 min over the last week and 1 h over the last year, about 540 KB per instance
+DEFAULT_TIERS = ((1, 3600), (60, 7 * 24 * 60), (3600, 366 * 24))
+
+
+class RollupTier:
+    """Ring of fixed-width time buckets holding, at each bucket's start boundary t:
+
+    - ``cumulative``: tracks that started at or before t (the count of new tracks since
+      the rollups started), so the new tracks of any range of boundaries is a difference;
+    - ``active``: tracks that started at or before t and were still visible at t.
+
+    A bucket is opened when time first reaches it, and the oldest bucket is reused
+    once ``capacity`` buckets are open, so memory does not depend on foot traffic.
+    """
+
+    def __init__(self, resolution_ms, capacity):
+        self.resolution_ms = int(resolution_ms)
+        self.capacity = int(capacity)
+        self.bucket_ids = np.full(self.capacity, -1, dtype=np.int64)
+        self.cumulative = np.zeros(self.capacity, dtype=np.int64)
+        self.active = np.zeros(self.capacity, dtype=np.int64)
+        # Index (time // resolution) of the newest open bucket
+        self.latest = None
+
+    @property
+    def nbytes(self):
+        return self.bucket_ids.nbytes + self.cumulative.nbytes + self.active.nbytes
+
+    def advance(self, now_ms, total):
+        # Opens every bucket up to the one holding now_ms; `total` is the number of tracks started so far
+        bucket = now_ms // self.resolution_ms
+        if self.latest is not None and bucket <= self.latest:
+            return
+        first = bucket if self.latest is None else max(self.latest + 1, bucket - self.capacity + 1)
+        buckets = np.arange(first, bucket + 1, dtype=np.int64)
+        slots = buckets % self.capacity
+        self.bucket_ids[slots] = buckets
+        self.cumulative[slots] = total
+        self.active[slots] = 0
+        self.latest = bucket
+
+    def add(self, now_ms, count):
+        # Tracks first seen exactly on a boundary are counted at it
+        bucket, offset = divmod(now_ms, self.resolution_ms)
+        if not offset and self.is_open(bucket):
+            slot = bucket % self.capacity
+            self.cumulative[slot] += count
+            self.active[slot] += count
+
+    def is_open(self, bucket):
+        return self.latest is not None and self.latest - self.capacity < bucket <= self.latest and self.bucket_ids[bucket % self.capacity] == bucket
+
+    def extend(self, old_end_ms, new_end_ms):
+        # A track seen again at new_end_ms was visible at every boundary in (old_end_ms, new_end_ms]
+        first = old_end_ms // self.resolution_ms + 1
+        last = new_end_ms // self.resolution_ms
+        if self.latest is None or first > last:
+            return
+        first = max(first, self.latest - self.capacity + 1)
+        last = min(last, self.latest)
+        if first <= last:
+            self.active[np.arange(first, last + 1) % self.capacity] += 1
+
+
+class CountRollups:
+    """Multi-resolution rollups of person tracks answering overlap counts in constant time.
+
+    The tracks overlapping [lo, hi] are those that started by hi, less those that
+    ended before lo: ``cumulative(hi) - (cumulative(lo) - active(lo))``. Each end
+    is read from the finest tier still holding its bucket: any second over the
+    last hour, then minutes over the last week and hours over the last year, so
+    the whole buckets in between cost nothing. An end falling inside a bucket is
+    not rounded to it, which could count a whole bucket of extra tracks: the part
+    of the bucket up to the end is counted by ``source(lo, hi)``, which counts the
+    tracks overlapping a short range (from memory or from the track store), and
+    the count is None when there is no such source. Tracks are only counted from
+    ``since_ms``, the time the rollups started.
+    """
+
+    def __init__(self, tiers=DEFAULT_TIERS, since_ms=0):
+        self.tiers = [RollupTier(resolution * 1000, capacity) for resolution, capacity in sorted(tiers)]
+        self.since_ms = since_ms
+        self.total = 0
+        # Time of the current frame
+        self.now_ms = None
+
+    @property
+    def nbytes(self):
+        return sum(tier.nbytes for tier in self.tiers)
+
+    def advance(self, now_ms):
+        # Called once per frame, before the frame's new tracks are added
+        self.now_ms = now_ms
+        for tier in self.tiers:
+            tier.advance(now_ms, self.total)
+
+    def add(self, count=1):
+        # Tracks first seen in the current frame
+        self.total += count
+        if count and self.now_ms is not None:
+            for tier in self.tiers:
+                tier.add(self.now_ms, count)
+
+    def extend(self, old_end_ms, new_end_ms):
+        for tier in self.tiers:
+            tier.extend(old_end_ms, new_end_ms)
+
+    def find_bucket(self, time_ms):
+        # (tier, bucket) of the finest tier holding the bucket of time_ms (or not there yet), or None
+        if time_ms < self.since_ms:
+            return None
+        for tier in self.tiers:
+            bucket = time_ms // tier.resolution_ms
+            if tier.is_open(bucket) or (tier.latest is not None and bucket > tier.latest):
+                return tier, bucket
+        return None
+
+    def boundary_at(self, tier, bucket):
+        # (cumulative, active) at the start of a held bucket. A boundary after the newest open bucket has
+        # not been reached: every track so far started before it and none is still visible there
+        if bucket > tier.latest:
+            return self.total, 0
+        slot = bucket % tier.capacity
+        return int(tier.cumulative[slot]), int(tier.active[slot])
+
+    def started_by(self, hi_ms, source=None):
+        # Tracks that started at or before hi_ms, or None
+        found = self.find_bucket(hi_ms)
+        if found is None:
+            return None
+        tier, bucket = found
+        if bucket > tier.latest:
+            return self.total
+        cumulative, active = self.boundary_at(tier, bucket)
+        boundary = bucket * tier.resolution_ms
+        if hi_ms == boundary:
+            return cumulative
+        # Tracks overlapping [boundary, hi_ms] are those visible at the boundary plus those started since
+        remainder = source(boundary, hi_ms) if source is not None else None
+        if remainder is None:
+            return None
+        return cumulative + remainder - active
+
+    def ended_before(self, lo_ms, source=None):
+        # Tracks that ended before lo_ms, or None
+        found = self.find_bucket(lo_ms)
+        if found is None:
+            return None
+        tier, bucket = found
+        if bucket > tier.latest:
+            # Not reached yet: every track so far was last seen before it
+            return self.total
+        if lo_ms % tier.resolution_ms == 0:
+            cumulative, active = self.boundary_at(tier, bucket)
+            return cumulative - active
+        # Of the tracks started by the next boundary, those overlapping [lo_ms, boundary] had not ended
+        remainder = source(lo_ms, (bucket + 1) * tier.resolution_ms) if source is not None else None
+        if remainder is None:
+            return None
+        return self.boundary_at(tier, bucket + 1)[0] - remainder
+
+    def count(self, lo_ms, hi_ms, source=None):
+        # Tracks overlapping [lo_ms, hi_ms], or None when an end is neither held nor answered by `source`
+        started = self.started_by(hi_ms, source)
+        ended = self.ended_before(lo_ms, source) if started is not None else None
+        if ended is None:
+            return None
+        return started - ended
@@ -0,0 +1,152 @@
+import math
+import threading
+
+import numpy as np
+
+from app.utils.frame_record import NO_ID, STAGES, as_record
+
+
+class DetectionRingBuffer:
+    """Fixed-size, array-backed history of detections for one instance.
+
+    Frames and objects are stored in two preallocated rings of NumPy columns.
+    Each frame keeps the offset and count of its objects in the object ring, and
+    frames are appended in time order, so a time window is located with a binary
+    search on the timestamp column instead of a scan. Memory is allocated once,
+    from the history length in seconds and the FPS of the source.
+    """
+
+    def __init__(self, seconds, fps, objects_per_frame=32):
+        self.seconds = seconds
+        self.fps = fps
+        self.frame_capacity = max(1, math.ceil(seconds * fps)) + 1
+        self.object_capacity = self.frame_capacity * objects_per_frame
+        self.lock = threading.Lock()
+
+        # Frame columns
+        self.times = np.zeros(self.frame_capacity, dtype=np.float64)
+        self.timestamps = np.zeros(self.frame_capacity, dtype=np.int64)
+        self.frame_fps = np.zeros(self.frame_capacity, dtype=np.float64)
+        self.speeds = np.zeros((self.frame_capacity, 3), dtype=np.float64)
+        self.offsets = np.zeros(self.frame_capacity, dtype=np.int64)
+        self.counts = np.zeros(self.frame_capacity, dtype=np.int64)
+
+        # Object columns
+        self.ids = np.zeros(self.object_capacity, dtype=np.int64)
+        self.classes = np.zeros(self.object_capacity, dtype=np.int16)
+        self.boxes = np.zeros((self.object_capacity, 4), dtype=np.float32)
+        self.confidences = np.zeros(self.object_capacity, dtype=np.float32)
+
+        # Frames [frame_tail, frame_head) and objects [.., object_head) are valid, as absolute positions
+        self.frame_head = 0
+        self.frame_tail = 0
+        self.object_head = 0
+
+        self.labels = []
+        self.label_codes = {}
+        self.input_source = None
+
+    def __len__(self):
+        return self.frame_head - self.frame_tail
+
+    @property
+    def nbytes(self):
+        columns = (self.times, self.timestamps, self.frame_fps, self.speeds, self.offsets, self.counts, self.ids, self.classes, self.boxes, self.confidences)
+        return sum(column.nbytes for column in columns)
+
+    def label_code(self, label):
+        code = self.label_codes.get(label)
+        if code is None:
+            code = self.label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def object_slots(self, start, count):
+        return np.arange(start, start + count) % self.object_capacity
+
+    def append(self, time, detection):
+        # Columns of a FrameRecord are copied as whole arrays; dicts are converted first
+        record = as_record(detection)
+        objects = slice(max(0, len(record) - self.object_capacity), len(record))
+        count = objects.stop - objects.start
+        with self.lock:
+            self.input_source = record.input_source
+            slots = self.object_slots(self.object_head, count)
+            if count:
+                self.ids[slots] = record.ids[objects]
+                # Class indices of the record are mapped to this buffer's label codes once per distinct class
+                classes, inverse = np.unique(record.classes[objects], return_inverse=True)
+                self.classes[slots] = np.array([self.label_code(record.names[cls]) for cls in classes.tolist()], dtype=np.int16)[inverse]
+                self.boxes[slots] = record.boxes[objects]
+                self.confidences[slots] = record.confidences[objects]
+
+            slot = self.frame_head % self.frame_capacity
+            self.times[slot] = time
+            self.timestamps[slot] = record.timestamp
+            self.frame_fps[slot] = record.fps
+            self.speeds[slot] = record.speeds if record.speeds is not None else 0
+            self.offsets[slot] = self.object_head
+            self.counts[slot] = count
+
+            self.frame_head += 1
+            self.object_head += count
+            self.frame_tail = max(self.frame_tail, self.frame_head - self.frame_capacity)
+            # Busy scenes can wrap the object ring first; drop frames whose objects were overwritten
+            while self.frame_tail < self.frame_head and self.offsets[self.frame_tail % self.frame_capacity] < self.object_head - self.object_capacity:
+                self.frame_tail += 1
+
+    def find_first(self, since):
+        # Binary search over the (possibly wrapped) timestamp column: first frame with time >= since
+        lo, hi = self.frame_tail, self.frame_head
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[mid % self.frame_capacity] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def window(self, since):
+        # Columns of the frames recorded at or after `since`, and of their objects
+        with self.lock:
+            first = self.find_first(since)
+            frame_slots = np.arange(first, self.frame_head) % self.frame_capacity
+            object_start = self.offsets[frame_slots[0]] if len(frame_slots) else self.object_head
+            object_slots = self.object_slots(object_start, self.object_head - object_start)
+            return {
+                "times": self.times[frame_slots],
+                "timestamps": self.timestamps[frame_slots],
+                "fps": self.frame_fps[frame_slots],
+                "speeds": self.speeds[frame_slots],
+                "counts": self.counts[frame_slots],
+                "ids": self.ids[object_slots],
+                "classes": self.classes[object_slots],
+                "boxes": self.boxes[object_slots],
+                "confidences": self.confidences[object_slots],
+            }
+
+    def get_detections(self, since):
+        window = self.window(since)
+        detections = []
+        position = 0
+        for timestamp, fps, speeds, count in zip(window["timestamps"].tolist(), window["fps"].tolist(), window["speeds"].tolist(), window["counts"].tolist()):
+            objects = slice(position, position + count)
+            position += count
+            detections.append(
+                {
+                    "timestamp": timestamp,
+                    "input_source": self.input_source,
+                    "fps": fps,
+                    "tracked_objects": [
+                        {"id": None if id == NO_ID else id, "label": self.labels[cls], "box": box, "confidence": conf}
+                        for id, cls, box, conf in zip(
+                            window["ids"][objects].tolist(),
+                            window["classes"][objects].tolist(),
+                            window["boxes"][objects].tolist(),
+                            window["confidences"][objects].tolist(),
+                        )
+                    ],
+                    "processing_time": dict(zip(STAGES, speeds)),
+                }
+            )
+        return detections
@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import deque
+
+import yaml
+
+from app.utils.frame_record import as_dict
+from app.utils.logger import get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+STREAM_SETTINGS = config.get("api", {}).get("stream", {})
+
+# Coalescing policies for slow subscribers
+DROP_OLDEST = "drop_oldest"  # keep the most recent `buffer_size` events, deliver all of them
+LATEST = "latest"  # deliver only the newest pending event
+COALESCE_POLICIES = (DROP_OLDEST, LATEST)
+
+# Broadcaster per instance, created on first use
+broadcasters = {}
+broadcasters_lock = threading.Lock()
+
+
+def encode_event(event_id, detection):
+    data = json.dumps(as_dict(detection), separators=(",", ":"))
+    return f"id: {event_id}\nevent: detection\ndata: {data}\n\n".encode()
+
+
+class StreamSubscriber:
+    """Bounded buffer of encoded events for one connected client.
+
+    The tracking loop only ever appends to it, so a client that cannot keep up
+    loses events instead of delaying the loop or the other clients.
+    """
+
+    def __init__(self, buffer_size=16, coalesce=DROP_OLDEST):
+        if coalesce not in COALESCE_POLICIES:
+            raise ValueError(f"Unknown coalesce policy: {coalesce}")
+        self.coalesce = coalesce
+        self.buffer = deque(maxlen=max(1, buffer_size))
+        self.condition = threading.Condition()
+        self.closed = False
+        self.delivered = 0
+        self.dropped = 0
+
+    def put(self, message):
+        with self.condition:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(message)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        # Returns every pending event (or only the newest one), an empty list on timeout or close
+        with self.condition:
+            if not self.buffer and not self.closed:
+                self.condition.wait(timeout)
+            messages = list(self.buffer)
+            self.buffer.clear()
+            if self.coalesce == LATEST and len(messages) > 1:
+                self.dropped += len(messages) - 1
+                messages = messages[-1:]
+            self.delivered += len(messages)
+        return messages
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class DetectionBroadcaster:
+    """Fans out the detections of one instance to its stream subscribers.
+
+    Each detection is encoded once as a Server-Sent Event and the same bytes are
+    handed to every subscriber. Nothing is encoded while nobody is subscribed.
+    """
+
+    def __init__(self, instance_name, buffer_size=None, coalesce=None):
+        self.instance_name = instance_name
+        self.buffer_size = buffer_size if buffer_size is not None else STREAM_SETTINGS.get("buffer_size", 16)
+        self.coalesce = coalesce or STREAM_SETTINGS.get("coalesce", DROP_OLDEST)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.event_id = 0
+        self.last_detection = None
+        self.last_message = None
+
+    def subscribe(self):
+        subscriber = StreamSubscriber(self.buffer_size, self.coalesce)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            # New subscribers start from the current state instead of waiting for the next frame
+            if self.last_message is None and self.last_detection is not None:
+                self.last_message = encode_event(self.event_id, self.last_detection)
+            if self.last_message is not None:
+                subscriber.put(self.last_message)
+        logger.info(create_log_message(event="stream_subscribed", subscribers=len(self.subscribers), instance=self.instance_name))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+        subscriber.close()
+        logger.info(
+            create_log_message(
+                event="stream_unsubscribed",
+                subscribers=len(self.subscribers),
+                delivered=subscriber.delivered,
+                dropped=subscriber.dropped,
+                instance=self.instance_name,
+            )
+        )
+
+    def publish(self, detection):
+        with self.lock:
+            self.event_id += 1
+            self.last_detection = detection
+            if not self.subscribers:
+                self.last_message = None
+                return
+            self.last_message = encode_event(self.event_id, detection)
+            for subscriber in self.subscribers:
+                subscriber.put(self.last_message)
+
+    def close(self):
+        # Ends every open stream, e.g. when the instance stops
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "subscribers": len(self.subscribers),
+                "events": self.event_id,
+                "dropped": sum(subscriber.dropped for subscriber in self.subscribers),
+            }
+
+
+def get_broadcaster(instance_name):
+    broadcaster = broadcasters.get(instance_name)
+    if broadcaster is None:
+        with broadcasters_lock:
+            broadcaster = broadcasters.setdefault(instance_name, DetectionBroadcaster(instance_name))
+    return broadcaster
+
+
+def pump_remote_detections(instance_name, view, interval_seconds, stop_event=None):
+    # In --processes mode detections are produced in a worker; forward each new published frame
+    broadcaster = get_broadcaster(instance_name)
+    stop_event = stop_event or threading.Event()
+    version = None
+    last_timestamp = None
+    while not stop_event.wait(interval_seconds):
+        if not broadcaster.subscribers or view.get_version() == version:
+            continue
+        version = view.get_version()
+        latest = view.get_latest_detections()
+        if latest and latest[0]["timestamp"] != last_timestamp:
+            last_timestamp = latest[0]["timestamp"]
+            broadcaster.publish(latest[0])
+        elif not latest and last_timestamp is not None:
+            last_timestamp = None
+            broadcaster.publish({"timestamp": int(time.time() * 1000), "tracked_objects": []})
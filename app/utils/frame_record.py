@@ -0,0 +1,118 @@
+import numpy as np
+
+NO_ID = -1
+
+STAGES = ("preprocess", "inference", "postprocess")
+
+
+class FrameRecord:
+    """Detections of one frame as NumPy columns.
+
+    The tracking loop, the history buffer, the unique-object buckets and the
+    person counter read the columns directly. The JSON-ready dict of the API (``timestamp``,
+    ``tracked_objects`` with ``id``, ``label``, ``box`` and ``confidence``, ...)
+    is only built by ``to_dict`` when a response, stream event or worker snapshot
+    needs it, and then reused.
+    """
+
+    __slots__ = ("timestamp", "input_source", "fps", "ids", "classes", "boxes", "confidences", "names", "speeds", "captured_at", "detection")
+
+    def __init__(self, timestamp, input_source, fps, ids, classes, boxes, confidences, names, speeds=None, captured_at=None):
+        self.timestamp = timestamp
+        self.input_source = input_source
+        self.fps = fps
+        # int64 track ids (NO_ID when untracked), class indices into `names`, xywh boxes and confidences
+        self.ids = ids
+        self.classes = classes
+        self.boxes = boxes
+        self.confidences = confidences
+        self.names = names
+        # (preprocess, inference, postprocess) in ms, or None
+        self.speeds = speeds
+        # Wall-clock ms at which the frame was read from the source, or None
+        self.captured_at = captured_at
+        self.detection = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_box_data(cls, timestamp, input_source, fps, data, names, speeds=None, offset=(0, 0), scale=(1.0, 1.0), captured_at=None):
+        """Builds a record from Ultralytics ``Boxes.data`` rows: x1, y1, x2, y2, [track id], confidence, class."""
+        data = np.asarray(data, dtype=np.float32)
+        boxes = np.empty((len(data), 4), dtype=np.float32)
+        boxes[:, :2] = (data[:, :2] + data[:, 2:4]) / 2
+        boxes[:, 2:] = data[:, 2:4] - data[:, :2]
+        # Boxes of a region of interest are relative to its crop; shift their centers back to full-frame coordinates
+        if offset != (0, 0):
+            boxes[:, :2] += offset
+        # Frames decoded below the source resolution: scale boxes back to source pixels
+        if scale != (1.0, 1.0):
+            boxes *= (scale[0], scale[1], scale[0], scale[1])
+        ids = data[:, 4].astype(np.int64) if data.shape[1] == 7 else np.full(len(data), NO_ID, dtype=np.int64)
+        return cls(timestamp, input_source, fps, ids, data[:, -1].astype(np.int64), boxes, data[:, -2].copy(), names, speeds, captured_at)
+
+    @classmethod
+    def from_dict(cls, detection):
+        objects = detection["tracked_objects"]
+        labels = list(dict.fromkeys(obj["label"] for obj in objects))
+        codes = {label: code for code, label in enumerate(labels)}
+        processing_time = detection.get("processing_time")
+        return cls(
+            detection["timestamp"],
+            detection.get("input_source"),
+            detection.get("fps", 0),
+            np.array([NO_ID if obj["id"] is None else obj["id"] for obj in objects], dtype=np.int64),
+            np.array([codes[obj["label"]] for obj in objects], dtype=np.int64),
+            # Kept as float64 so converted dicts round-trip unchanged
+            np.array([obj["box"] for obj in objects], dtype=np.float64).reshape(-1, 4),
+            np.array([obj["confidence"] for obj in objects], dtype=np.float64),
+            labels,
+            tuple(processing_time.get(stage, 0) for stage in STAGES) if processing_time is not None else None,
+            detection.get("captured_at"),
+        )
+
+    def with_time(self, timestamp, fps, captured_at=None):
+        # Same objects seen at another time; the columns are shared, not copied
+        return FrameRecord(
+            timestamp, self.input_source, fps, self.ids, self.classes, self.boxes, self.confidences, self.names, self.speeds, captured_at
+        )
+
+    def labels(self):
+        return [self.names[cls] for cls in self.classes.tolist()]
+
+    def track_ids(self, label):
+        # Ids of the tracked objects with the given label
+        codes = [code for code, name in (self.names.items() if isinstance(self.names, dict) else enumerate(self.names)) if name == label]
+        return self.ids[np.isin(self.classes, codes) & (self.ids != NO_ID)].tolist()
+
+    def sightings(self):
+        # (label, id) of every object, with None for untracked ones
+        return [(label, None if track_id == NO_ID else track_id) for label, track_id in zip(self.labels(), self.ids.tolist())]
+
+    def to_dict(self):
+        if self.detection is None:
+            detection = {
+                "timestamp": self.timestamp,
+                "input_source": self.input_source,
+                "fps": self.fps,
+                "tracked_objects": [
+                    {"id": None if track_id == NO_ID else track_id, "label": label, "box": box, "confidence": confidence}
+                    for track_id, label, box, confidence in zip(self.ids.tolist(), self.labels(), self.boxes.tolist(), self.confidences.tolist())
+                ],
+            }
+            if self.speeds is not None:
+                detection["processing_time"] = dict(zip(STAGES, self.speeds))
+            if self.captured_at is not None:
+                detection["captured_at"] = self.captured_at
+            self.detection = detection
+        return self.detection
+
+
+def as_dict(detection):
+    # The tracking loop passes FrameRecords; decoded snapshots and tests pass plain dicts
+    return detection.to_dict() if isinstance(detection, FrameRecord) else detection
+
+
+def as_record(detection):
+    return detection if isinstance(detection, FrameRecord) else FrameRecord.from_dict(detection)
@@ -0,0 +1,170 @@
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+
+class FenwickTree:
+    """Prefix sums over a growable array of counts (binary indexed tree)."""
+
+    def __init__(self, values=()):
+        self.tree = [0]
+        for value in values:
+            self.append(value)
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def append(self, value):
+        # Node i covers the items (i - lowbit(i), i], which are all known when i is appended
+        i = len(self.tree)
+        self.tree.append(value + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def add(self, index, delta):
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, count):
+        # Sum of the first `count` items
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+
+class EndpointLog:
+    """Non-decreasing log of interval endpoints supporting removal and rank queries.
+
+    Endpoints are appended in time order, so the log stays sorted without any
+    insertion cost. Removed endpoints are only marked dead in a Fenwick tree;
+    ``count_below``/``count_above`` are a bisect plus a prefix sum.
+    """
+
+    def __init__(self, entries=()):
+        self.values = []
+        self.keys = []
+        self.live = FenwickTree()
+        self.live_count = 0
+        for value, key in entries:
+            self.append(value, key)
+
+    def __len__(self):
+        return len(self.values)
+
+    def is_sorted_after(self, value):
+        return not self.values or value >= self.values[-1]
+
+    def append(self, value, key):
+        self.values.append(value)
+        self.keys.append(key)
+        self.live.append(1)
+        self.live_count += 1
+        return len(self.values) - 1
+
+    def discard(self, position):
+        self.live.add(position, -1)
+        self.live_count -= 1
+
+    def count_below(self, value):
+        return self.live.prefix(bisect_left(self.values, value))
+
+    def count_above(self, value):
+        return self.live_count - self.live.prefix(bisect_right(self.values, value))
+
+
+class IntervalIndex:
+    """Intervals keyed by id, with logarithmic overlap counts.
+
+    An interval [start, end] overlaps [lo, hi] unless it starts after ``hi`` or
+    ends before ``lo``. Since start <= end both cases are exclusive, so
+
+        overlapping = total - #(start > hi) - #(end < lo)
+
+    and each term is a rank query on a sorted log of endpoints. Extending an
+    interval appends its new end and kills the old one; the logs are rebuilt
+    once dead entries outnumber live ones, keeping updates amortized O(log n).
+    """
+
+    def __init__(self):
+        # key -> [start, end, start position, end position]
+        self.intervals = {}
+        self.starts = EndpointLog()
+        self.ends = EndpointLog()
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __contains__(self, key):
+        return key in self.intervals
+
+    def get(self, key):
+        interval = self.intervals.get(key)
+        return (interval[0], interval[1]) if interval is not None else None
+
+    def items(self):
+        return ((key, interval[0], interval[1]) for key, interval in self.intervals.items())
+
+    def add(self, key, start, end=None):
+        end = start if end is None else end
+        if key in self.intervals:
+            self.remove(key)
+        if not (self.starts.is_sorted_after(start) and self.ends.is_sorted_after(end)):
+            # Out-of-order endpoint (e.g. the clock went backwards): rebuild the logs sorted
+            self.intervals[key] = [start, end, None, None]
+            self.rebuild()
+            return
+        self.intervals[key] = [start, end, self.starts.append(start, key), self.ends.append(end, key)]
+        self.maybe_rebuild()
+
+    def add_many(self, items):
+        # Bulk insert of (key, start, end) items, sorting the logs once instead of per interval
+        for key, start, end in items:
+            self.intervals[key] = [start, end, None, None]
+        self.rebuild()
+
+    def extend(self, key, end):
+        interval = self.intervals[key]
+        if end == interval[1]:
+            return
+        if not self.ends.is_sorted_after(end):
+            interval[1] = end
+            self.rebuild()
+            return
+        self.ends.discard(interval[3])
+        interval[1] = end
+        interval[3] = self.ends.append(end, key)
+        self.maybe_rebuild()
+
+    def remove(self, key):
+        interval = self.intervals.pop(key)
+        self.starts.discard(interval[2])
+        self.ends.discard(interval[3])
+
+    def remove_ended_before(self, cutoff):
+        # The ends log is sorted, so expired intervals are found without scanning the live ones
+        stop = bisect_left(self.ends.values, cutoff)
+        expired = []
+        for position, key in enumerate(self.ends.keys[:stop]):
+            interval = self.intervals.get(key)
+            # Skip log entries left behind by an extended or removed interval
+            if interval is not None and interval[3] == position:
+                expired.append(key)
+        for key in expired:
+            self.remove(key)
+        return len(expired)
+
+    def count_overlapping(self, lo, hi):
+        return len(self.intervals) - self.starts.count_above(hi) - self.ends.count_below(lo)
+
+    def maybe_rebuild(self):
+        if len(self.ends) > 2 * len(self.intervals) + 1024:
+            self.rebuild()
+
+    def rebuild(self):
+        self.starts = EndpointLog(sorted(((interval[0], key) for key, interval in self.intervals.items()), key=itemgetter(0)))
+        self.ends = EndpointLog(sorted(((interval[1], key) for key, interval in self.intervals.items()), key=itemgetter(0)))
+        for position, key in enumerate(self.starts.keys):
+            self.intervals[key][2] = position
+        for position, key in enumerate(self.ends.keys):
+            self.intervals[key][3] = position
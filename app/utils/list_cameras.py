@@ -1,5 +1,12 @@
 import cv2  # type: ignore
+import glob
+import json
+import os
 import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
 
 # Check if running on MacOS
 MACOS = platform.system() == "Darwin"
@@ -14,7 +21,7 @@ if MACOS:
     )
 
     # Lists available camera indices up to a maximum number for MacOS
-    def list_available_cameras():
+    def list_available_cameras(refresh=False):
         devices = AVCaptureDeviceDiscoverySession.discoverySessionWithDeviceTypes_mediaType_position_(
             [AVCaptureDeviceTypeBuiltInWideAngleCamera, AVCaptureDeviceTypeExternal, AVCaptureDeviceTypeContinuityCamera], None, 0
         ).devices()
@@ -25,20 +32,72 @@ if MACOS:
         return available_cameras
 
 else:
+    # Load configuration
+    with open("config.yaml", "r") as config_file:
+        config = yaml.safe_load(config_file)
+
+    CAMERA_SETTINGS = config.get("cameras", {})
+
+    def probe_camera(index):
+        cap = cv2.VideoCapture(index)
+        try:
+            return cap.isOpened()
+        finally:
+            cap.release()
+
+    def candidate_indices(max_index):
+        # On Linux only indices with a /dev/videoN node can open; elsewhere every index is probed
+        if os.path.isdir("/dev"):
+            indices = (node[len("/dev/video") :] for node in glob.glob("/dev/video*"))
+            return sorted(index for index in map(int, filter(str.isdigit, indices)) if index < max_index)
+        return list(range(max_index))
+
+    def load_camera_cache(cache_file, candidates, ttl_seconds):
+        # The inventory is reused while it is recent and the set of device nodes has not changed
+        try:
+            with open(cache_file, "r") as cache:
+                cached = json.load(cache)
+        except (OSError, ValueError):
+            return None
+        if cached.get("candidates") != candidates or time.time() - cached.get("time", 0) > ttl_seconds:
+            return None
+        return cached.get("cameras")
+
+    def save_camera_cache(cache_file, candidates, cameras):
+        try:
+            with open(cache_file, "w") as cache:
+                json.dump({"time": time.time(), "candidates": candidates, "cameras": cameras}, cache)
+        except OSError:
+            pass
+
     # Lists available camera indices up to a maximum number for other systems
-    def list_available_cameras():
+    def list_available_cameras(refresh=False):
+        max_index = CAMERA_SETTINGS.get("max_index", 10)
+        cache_file = CAMERA_SETTINGS.get("cache_file", ".camera_cache.json")
+        candidates = candidate_indices(max_index)
+        if not refresh and cache_file:
+            cameras = load_camera_cache(cache_file, candidates, CAMERA_SETTINGS.get("cache_ttl_seconds", 3600))
+            if cameras is not None:
+                return cameras
+
+        # Opening a device can block for a while, so all candidates are probed at once
         available_cameras = []
-        for index in range(10):  # Adjust the range as needed
-            cap = cv2.VideoCapture(index)
-            if cap.isOpened():
-                available_cameras.append({"index": index, "id": index, "name": f"Camera {index}"})
-                cap.release()
+        if candidates:
+            with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+                for index, is_open in zip(candidates, executor.map(probe_camera, candidates)):
+                    if is_open:
+                        available_cameras.append({"index": index, "id": index, "name": f"Camera {index}"})
+        if cache_file:
+            save_camera_cache(cache_file, candidates, available_cameras)
         return available_cameras
 
 
 # Prints the list of available cameras with more informative names
 def list_cameras():
-    available_cameras = list_available_cameras()
+    available_cameras = list_available_cameras(refresh=True)
+    if not available_cameras:
+        print("No cameras found")
+        return
     max_name_length = max(len(camera["name"]) for camera in available_cameras)
     for camera in available_cameras:
         index = camera["index"]
@@ -1,16 +1,29 @@
+import atexit
 import logging
 import json
-from logging.handlers import TimedRotatingFileHandler
+import queue
+import threading
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 from pathlib import Path
 from datetime import datetime
-import time
+
+import yaml
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+LOGGING_SETTINGS = config.get("logging") or {}
+
+# Background writer of the current setup_logger() call
+log_listener = None
 
 
 class CloudCompatibleFormatter(logging.Formatter):
     def format(self, record):
         log_data = {
             "timestamp": self.formatTime(record, self.datefmt),
-            "epoch_ms": int(time.time() * 1000),
+            "epoch_ms": int(record.created * 1000),
             "level": record.levelname,
             "module": record.module,
             "function": record.funcName,
@@ -20,8 +33,11 @@ class CloudCompatibleFormatter(logging.Formatter):
 
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_data["exception"] = record.exc_text
 
-        return json.dumps(log_data)
+        # Values that are not JSON types (paths, numpy scalars...) are written as strings
+        return json.dumps(log_data, default=str)
 
     def format_message(self, record):
         if isinstance(record.msg, dict):
@@ -35,13 +51,94 @@ class CloudCompatibleFormatter(logging.Formatter):
             return {"text": str(record.msg)}
 
 
-def setup_logger(log_dir="logs", level=logging.INFO, file_only=False):
+class EventRateLimiter(logging.Filter):
+    """Drops structured records of chatty events before they are queued.
+
+    Limits are configured per event name, as a maximum number of records per
+    second and/or as keeping one record out of every `sample_every`. The next
+    record kept for an event carries the number suppressed since the last one.
+    """
+
+    def __init__(self, limits=None):
+        super().__init__()
+        self.limits = limits or {}
+        self.lock = threading.Lock()
+        # event -> [window start, records kept in the window, records seen, records suppressed]
+        self.state = {}
+
+    def filter(self, record):
+        if not isinstance(record.msg, dict):
+            return True
+        event = record.msg.get("event")
+        limit = self.limits.get(event)
+        if not limit:
+            return True
+
+        with self.lock:
+            state = self.state.setdefault(event, [0.0, 0, 0, 0])
+            state[2] += 1
+            sample_every = limit.get("sample_every", 1)
+            keep = (state[2] - 1) % sample_every == 0
+            max_per_second = limit.get("max_per_second")
+            if keep and max_per_second is not None:
+                if record.created - state[0] >= 1:
+                    state[0], state[1] = record.created, 0
+                keep = state[1] < max_per_second
+            if not keep:
+                state[3] += 1
+                return False
+            state[1] += 1
+            suppressed, state[3] = state[3], 0
+
+        if suppressed:
+            record.msg = dict(record.msg, suppressed=suppressed)
+        return True
+
+
+class StructuredQueueHandler(QueueHandler):
+    """Hands records to the background writer without formatting them on the caller's thread."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Tracebacks reference live frames, render them now; the message dict is passed through as is
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if not isinstance(record.msg, dict):
+            record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the caller: when the writer falls behind, records are dropped
+            self.dropped += 1
+
+
+def stop_log_listener():
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        for handler in log_listener.handlers:
+            handler.close()
+        log_listener = None
+
+
+def setup_logger(log_dir="logs", level=logging.INFO, file_only=False, settings=None):
+    settings = LOGGING_SETTINGS if settings is None else settings
     log_dir = Path(log_dir)
     log_dir.mkdir(exist_ok=True)
 
     logger = logging.getLogger()
     logger.setLevel(level)
 
+    # Flush and stop the writer of a previous setup before replacing its handlers
+    stop_log_listener()
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
 
@@ -51,18 +148,28 @@ def setup_logger(log_dir="logs", level=logging.INFO, file_only=False):
     formatter = CloudCompatibleFormatter()
     file_handler.setFormatter(formatter)
     file_handler.setLevel(level)
-
-    logger.addHandler(file_handler)
+    handlers = [file_handler]
 
     if not file_only:
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
         console_handler.setLevel(level)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
+
+    # Callers only enqueue records; formatting and writing happen on the listener's thread
+    queue_handler = StructuredQueueHandler(queue.Queue(settings.get("queue_size", 10000)))
+    queue_handler.addFilter(EventRateLimiter(settings.get("events")))
+    logger.addHandler(queue_handler)
+
+    global log_listener
+    log_listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    log_listener.start()
 
     return logger
 
 
+atexit.register(stop_log_listener)
+
 root_logger = setup_logger()
 
 
@@ -70,6 +177,6 @@ def get_logger(name):
     return logging.getLogger(name)
 
 
-# Helper function to create structured log messages
+# Helper function to create structured log messages, passed to the handlers as a dict and serialized once
 def create_log_message(**kwargs):
-    return json.dumps(kwargs)
+    return kwargs
@@ -0,0 +1,245 @@
+import threading
+from bisect import bisect_left
+
+from app.utils.shared_state import (
+    detection_history,
+    get_capture_stats,
+    get_motion_stats,
+    get_scheduler_stats,
+    get_zone_stats,
+    inference_services,
+    remote_instances,
+)
+
+# Upper bounds in seconds, from sub-millisecond stages to slow inference on CPU
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def escape_label_value(value):
+    # The text format requires backslashes, double quotes and line feeds in label values to be escaped
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_family(name, kind, help_text, samples):
+    """Text exposition of one metric family; samples are (suffix, label names, label values, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{suffix}{format_labels(names, values)} {format_value(value)}" for suffix, names, values, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by label values. Observing costs one bisect and one locked update."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self, label_filter=None):
+        # JSON-friendly copy of the series, e.g. to publish a worker's histograms through shared memory
+        with self.lock:
+            return [[list(values), list(counts), total] for values, (counts, total) in self.series.items() if label_filter is None or label_filter(values)]
+
+    def render(self, extra_series=(), label_filter=None):
+        with self.lock:
+            series = [(values, list(counts), total) for values, (counts, total) in self.series.items() if label_filter is None or label_filter(values)]
+        series.extend((tuple(values), counts, total) for values, counts, total in extra_series)
+        samples = []
+        for values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                samples.append(("_bucket", self.labels + ("le",), values + (bound,), cumulative))
+            samples.append(("_sum", self.labels, values, total))
+            samples.append(("_count", self.labels, values, cumulative))
+        return format_family(self.name, "histogram", self.help_text, samples)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, label_filter=None):
+        with self.lock:
+            samples = [("", self.labels, values, value) for values, value in sorted(self.values.items()) if label_filter is None or label_filter(values)]
+        return format_family(self.name, "counter", self.help_text, samples)
+
+
+STAGE_DURATION = Histogram("oatracker_stage_duration_seconds", "Duration of each per-frame pipeline stage.", ("instance", "stage"))
+PUBLISH_LATENCY = Histogram("oatracker_capture_to_publish_seconds", "Time from frame capture to its detections being published.", ("instance",))
+HTTP_DURATION = Histogram("oatracker_http_request_duration_seconds", "HTTP request handling time per route.", ("instance", "route"))
+HTTP_REQUESTS = Counter("oatracker_http_requests_total", "HTTP requests per route and status code.", ("instance", "route", "code"))
+
+
+class InstanceStageMetrics:
+    """Stage sink for track(): same add(stage, milliseconds) interface as StageTimer, recorded into histograms."""
+
+    def __init__(self, instance_name):
+        self.instance_name = instance_name
+
+    def add(self, stage, milliseconds):
+        if stage == "capture_to_publish":
+            PUBLISH_LATENCY.observe(milliseconds / 1000, self.instance_name)
+        else:
+            STAGE_DURATION.observe(milliseconds / 1000, self.instance_name, stage)
+
+
+def instance_snapshot(instance_name):
+    # Published by --processes workers, so the API process can expose their histograms
+    history = detection_history.get(instance_name)
+    return {
+        "stages": STAGE_DURATION.snapshot(lambda values: values[0] == instance_name),
+        "publish": PUBLISH_LATENCY.snapshot(lambda values: values[0] == instance_name),
+        "history_bytes": history.nbytes if history is not None else 0,
+        "history_frames": len(history) if history is not None else 0,
+    }
+
+
+def collect_instance_gauges(instance_names, person_counters, broadcasters):
+    families = {
+        "capture_queue_depth": ("gauge", "Decoded frames waiting for inference.", []),
+        "frames_captured_total": ("counter", "Frames read from the source.", []),
+        "frames_dropped_total": ("counter", "Frames dropped by the capture queue.", []),
+        "frames_drained_total": ("counter", "Buffered live frames skipped to serve the freshest one.", []),
+        "frame_age_seconds": ("gauge", "Age of the frame behind the latest detections.", []),
+        "capture_connected": ("gauge", "1 while the source is open, 0 while it is being reconnected.", []),
+        "capture_reconnects_total": ("counter", "Reconnections to the source.", []),
+        "target_fps": ("gauge", "Frame rate the inference scheduler paces the instance to.", []),
+        "achieved_fps": ("gauge", "Frames run by the shared inference service per second.", []),
+        "frames_processed_total": ("counter", "Frames that went through inference.", []),
+        "frames_skipped_total": ("counter", "Frames skipped by the motion gate.", []),
+        "person_tracks": ("gauge", "Person tracks retained by the person counter.", []),
+        "persons_since_boot_total": ("counter", "Person tracks seen since start.", []),
+        "detection_history_bytes": ("gauge", "Memory of the detection history buffers.", []),
+        "detection_history_frames": ("gauge", "Frames held in the detection history.", []),
+        "stream_subscribers": ("gauge", "Connected /detections/stream clients.", []),
+        "zone_occupancy": ("gauge", "Objects currently inside each zone.", []),
+        "line_crossings_total": ("counter", "Crossings of each line, by direction.", []),
+    }
+
+    def add(family, instance_name, value):
+        if value is not None:
+            families[family][2].append(("", ("instance",), (instance_name,), value))
+
+    for name in instance_names:
+        capture = get_capture_stats(name) or {}
+        add("capture_queue_depth", name, capture.get("queue_depth"))
+        add("frames_captured_total", name, capture.get("frames_captured"))
+        add("frames_dropped_total", name, capture.get("frames_dropped"))
+        add("frames_drained_total", name, capture.get("frames_drained"))
+        add("frame_age_seconds", name, capture["frame_age_ms"] / 1000 if capture.get("frame_age_ms") is not None else None)
+        add("capture_connected", name, int(capture["connected"]) if "connected" in capture else None)
+        add("capture_reconnects_total", name, capture.get("reconnects"))
+        scheduler = get_scheduler_stats(name) or {}
+        add("target_fps", name, scheduler.get("target_fps"))
+        add("achieved_fps", name, scheduler.get("achieved_fps"))
+        motion = get_motion_stats(name)
+        if motion:
+            add("frames_processed_total", name, motion["processed_frames"])
+            add("frames_skipped_total", name, motion["skipped_frames"])
+
+        counter = person_counters.get(name)
+        if counter is not None:
+            add("person_tracks", name, len(counter))
+            add("persons_since_boot_total", name, counter.get_count_since_boot())
+
+        if name in remote_instances:
+            metrics = remote_instances[name].get("metrics") or {}
+            add("detection_history_bytes", name, metrics.get("history_bytes"))
+            add("detection_history_frames", name, metrics.get("history_frames"))
+        elif name in detection_history:
+            add("detection_history_bytes", name, detection_history[name].nbytes)
+            add("detection_history_frames", name, len(detection_history[name]))
+
+        broadcaster = broadcasters.get(name)
+        if broadcaster is not None:
+            add("stream_subscribers", name, len(broadcaster.subscribers))
+
+        zones = get_zone_stats(name)
+        if zones:
+            for zone, occupancy in zones["zones"].items():
+                families["zone_occupancy"][2].append(("", ("instance", "zone"), (name, zone), occupancy))
+            for line, counts in zones["lines"].items():
+                for direction in ("in", "out"):
+                    families["line_crossings_total"][2].append(("", ("instance", "line", "direction"), (name, line, direction), counts[direction]))
+
+    return "".join(format_family(f"oatracker_{family}", kind, help_text, samples) for family, (kind, help_text, samples) in families.items() if samples)
+
+
+def collect_inference_gauges():
+    # Shared inference services of this process, by model
+    samples = {"inference_queue_depth": [], "inference_batches_total": [], "inference_frames_total": []}
+    for model_name, service in sorted(inference_services.items()):
+        labels = (("model",), (model_name,))
+        samples["inference_queue_depth"].append(("", *labels, len(service.scheduler.queue)))
+        samples["inference_batches_total"].append(("", *labels, service.batches))
+        samples["inference_frames_total"].append(("", *labels, service.frames))
+    if not inference_services:
+        return ""
+    return "".join(
+        [
+            format_family("oatracker_inference_queue_depth", "gauge", "Frames waiting for the shared inference service.", samples["inference_queue_depth"]),
+            format_family("oatracker_inference_batches_total", "counter", "Batches run by the shared inference service.", samples["inference_batches_total"]),
+            format_family("oatracker_inference_frames_total", "counter", "Frames run by the shared inference service.", samples["inference_frames_total"]),
+        ]
+    )
+
+
+def render_metrics(instance_names, person_counters, broadcasters):
+    """Prometheus text exposition for the given instances, local or running in worker processes."""
+    instance_names = sorted(instance_names)
+    remote_stages, remote_publish = [], []
+    for name in instance_names:
+        if name in remote_instances:
+            metrics = remote_instances[name].get("metrics") or {}
+            remote_stages.extend(metrics.get("stages", []))
+            remote_publish.extend(metrics.get("publish", []))
+
+    # Metrics are process-wide; a listener only exposes the series of the instances it serves
+    selected = set(instance_names)
+
+    def served(values):
+        return values[0] in selected
+
+    return "".join(
+        [
+            STAGE_DURATION.render(remote_stages, served),
+            PUBLISH_LATENCY.render(remote_publish, served),
+            HTTP_DURATION.render(label_filter=served),
+            HTTP_REQUESTS.render(served),
+            collect_instance_gauges(instance_names, person_counters, broadcasters),
+            collect_inference_gauges(),
+        ]
+    )
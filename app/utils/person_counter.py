@@ -1,8 +1,30 @@
+import logging
+import threading
 import time
+import yaml
+from app.utils.count_rollups import CountRollups, DEFAULT_TIERS
+from app.utils.interval_index import IntervalIndex
+from app.utils.track_store import TrackIntervalStore
 from app.utils.logger import get_logger, create_log_message
 
 logger = get_logger(__name__)
 
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+PERSON_COUNTER_SETTINGS = config.get("person_counter", {})
+STORE_SETTINGS = PERSON_COUNTER_SETTINGS.get("store", {})
+ROLLUP_SETTINGS = PERSON_COUNTER_SETTINGS.get("rollups", {})
+
+
+def create_rollups(since_ms, settings=None):
+    # None when rollups are disabled
+    settings = ROLLUP_SETTINGS if settings is None else settings
+    if not settings.get("enabled", True):
+        return None
+    return CountRollups(settings.get("tiers") or DEFAULT_TIERS, since_ms)
+
 
 class PersonCounter:
     counters = {}
@@ -13,51 +35,127 @@ class PersonCounter:
             # If no specific device_id is provided, return the first (and possibly only) counter
             return next(iter(cls.counters.values())) if cls.counters else None
         if device_id not in cls.counters:
-            cls.counters[device_id] = PersonCounter(device_id)
+            cls.counters[device_id] = PersonCounter(device_id, store=TrackIntervalStore.from_config(device_id, STORE_SETTINGS))
             logger.info(create_log_message(event="person_counter_created", device_id=device_id))
         return cls.counters[device_id]
 
-    def __init__(self, device_id):
+    def __init__(self, device_id, retention_hours=None, store=None, rollups=None):
         self.device_id = device_id
-        self.movements_by_trackid = {}
-        self.movements = []
+        # Track intervals [first, latest] in ms, keyed by track id
+        self.movements = IntervalIndex()
+        self.lock = threading.Lock()
         self.last_cleanup = time.time() * 1000
-        self.track_limit = 500
+        if retention_hours is None:
+            retention_hours = PERSON_COUNTER_SETTINGS.get("retention_hours", 24)
+        self.retention_ms = int(retention_hours * 3600 * 1000)
         self.__count_since_boot = 0
-        logger.info(create_log_message(event="person_counter_init", device_id=device_id))
+        # Optional on-disk TrackIntervalStore: tracks updated since the last flush are appended to it periodically
+        self.store = store
+        self.flush_lock = threading.Lock()
+        self.dirty = set()
+        self.last_flush = self.last_compaction = self.last_cleanup
+        # Every track started by this time is in the store, with its interval as of the last flush: set once
+        # the flushed rows are written. Tracks restored at startup all started before it
+        self.flushed_until = self.last_flush
+        self.flush_ms = STORE_SETTINGS.get("flush_seconds", 5) * 1000
+        self.compact_ms = STORE_SETTINGS.get("compact_minutes", 10) * 60 * 1000
+        logger.info(create_log_message(event="person_counter_init", device_id=device_id, retention_hours=retention_hours, store=store is not None))
+        if store is not None:
+            self.restore()
+        # Counts of ranges older than the retention window, kept from now on at a bounded memory cost
+        self.rollups = rollups if rollups is not None else create_rollups(int(time.time() * 1000))
+
+    def restore(self):
+        # Reloads the tracks of the retention window after a restart. Track ids restart with the tracker,
+        # so restored tracks are keyed by (first_ms, track_id) and never collide with new ones
+        rows = self.store.load(int(time.time() * 1000) - self.retention_ms)
+        with self.lock:
+            self.movements.add_many(((int(first), int(track_id)), int(first), int(latest)) for first, latest, track_id in rows.tolist())
+        logger.info(create_log_message(event="person_counter_restored", device_id=self.device_id, restored=len(rows)))
 
     def update(self, tracked_objects):
-        now = int(time.time() * 1000)
+        self.update_ids([obj["id"] for obj in tracked_objects if obj["id"] is not None and obj["label"] == "person"])
+
+    def update_ids(self, track_ids, now_ms=None):
+        # Track ids of the persons seen in one frame, e.g. FrameRecord.track_ids("person");
+        # `now_ms` is the frame's time when it is not now (offline processing of recordings)
+        now = int(time.time() * 1000) if now_ms is None else now_ms
         updated_count = 0
-        for obj in tracked_objects:
-            if obj["id"] is not None and obj["label"] == "person":
-                if obj["id"] in self.movements_by_trackid:
-                    self.movements_by_trackid[obj["id"]][1] = now
+        with self.lock:
+            if self.rollups is not None:
+                self.rollups.advance(now)
+            for track_id in track_ids:
+                movement = self.movements.get(track_id)
+                if movement is not None:
+                    if self.rollups is not None:
+                        self.rollups.extend(movement[1], now)
+                    self.movements.extend(track_id, now)
                 else:
                     self.__count_since_boot += 1
                     updated_count += 1
-                    movements = [now, now, obj["id"]]
-                    self.movements.append(movements)
-                    self.movements_by_trackid[obj["id"]] = movements
-        logger.debug(
-            create_log_message(
-                event="person_counter_update", device_id=self.device_id, updated_count=updated_count, total_count=self.__count_since_boot
+                    self.movements.add(track_id, now)
+            if self.rollups is not None:
+                self.rollups.add(updated_count)
+            if self.store is not None:
+                self.dirty.update(track_ids)
+        self.cleanup(now_ms)
+        if self.store is not None and now - self.last_flush >= self.flush_ms:
+            self.flush(now_ms)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                create_log_message(
+                    event="person_counter_update", device_id=self.device_id, updated_count=updated_count, total_count=self.__count_since_boot
+                )
             )
-        )
+
+    def __len__(self):
+        # Number of retained person tracks
+        return len(self.movements)
+
+    def get_movement(self, track_id):
+        # Returns (first_ms, latest_ms) for a track, or None if it is not retained
+        return self.movements.get(track_id)
+
+    def count_part(self, lo_ms, hi_ms):
+        # Tracks overlapping part of a rollup bucket, called with the lock held: from memory when no track
+        # overlapping it can have been dropped yet, else from the store as of its last flush, else None
+        if lo_ms >= self.last_cleanup - self.retention_ms:
+            return self.movements.count_overlapping(lo_ms, hi_ms)
+        if self.store is not None:
+            return self.store.count(lo_ms, hi_ms)
+        return None
 
     def get_count(self, from_seconds, to_seconds):
+        # Tracks overlapping the range, or None when the tracks it reaches back to are no longer kept
         from_ms = int(from_seconds * 1000)
         to_ms = int(to_seconds * 1000)
-        count = 0
-        for first_movement, latest_movement, _ in self.movements:
-            if first_movement <= to_ms and latest_movement >= from_ms:
-                count += 1
+        count = None
+        source = "tracks"
+        if from_ms < int(time.time() * 1000) - self.retention_ms:
+            # Tracks dropped from memory are counted from the rollups, or from disk before they started
+            if self.rollups is not None:
+                with self.lock:
+                    count = self.rollups.count(from_ms, to_ms, self.count_part)
+                source = "rollups"
+            if count is None and self.store is not None:
+                # Only read here: the tracking loop flushes and compacts, so the last flush_seconds may be missing
+                count = self.store.count(from_ms, to_ms)
+                source = "store"
+            if count is None:
+                logger.warning(
+                    create_log_message(event="person_counter_range_unavailable", device_id=self.device_id, from_ms=from_ms, to_ms=to_ms)
+                )
+                return None
+        else:
+            with self.lock:
+                count = self.movements.count_overlapping(from_ms, to_ms)
         self.cleanup()
         logger.info(
             create_log_message(
                 event="person_counter_get_count",
                 device_id=self.device_id,
                 count=count,
+                source=source,
                 from_ms=from_ms,
                 to_ms=to_ms,
                 total_movements=len(self.movements),
@@ -65,13 +163,37 @@ class PersonCounter:
         )
         return count
 
-    def cleanup(self):
-        now = int(time.time() * 1000)
-        if now - self.last_cleanup < 1000 or len(self.movements) < self.track_limit:
+    def cleanup(self, now_ms=None):
+        # Drop tracks last seen before the retention window
+        now = int(time.time() * 1000) if now_ms is None else now_ms
+        # Frame times of a recording may be far from the wall clock the counter started with
+        if abs(now - self.last_cleanup) < 1000:
             return
         self.last_cleanup = now
-        self.movements = sorted(self.movements, key=lambda x: x[1], reverse=True)[: self.track_limit]
-        self.movements_by_trackid = {x[2]: x for x in self.movements}
+        with self.lock:
+            removed = self.movements.remove_ended_before(now - self.retention_ms)
+        if removed:
+            logger.debug(create_log_message(event="person_counter_cleanup", device_id=self.device_id, removed=removed, total_movements=len(self.movements)))
+
+    def flush(self, now_ms=None):
+        # Appends the current interval of every track updated since the last flush
+        if self.store is None:
+            return
+        with self.flush_lock:
+            now = int(time.time() * 1000) if now_ms is None else now_ms
+            with self.lock:
+                rows = []
+                for track_id in self.dirty:
+                    movement = self.movements.get(track_id)
+                    if movement is not None:
+                        rows.append((movement[0], movement[1], track_id))
+                self.dirty.clear()
+                self.last_flush = now
+            self.store.append(rows)
+            self.flushed_until = now
+            if now - self.last_compaction >= self.compact_ms:
+                self.last_compaction = now
+                self.store.compact(now)
 
     def get_count_since_boot(self):
         return self.__count_since_boot
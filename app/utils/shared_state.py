@@ -1,47 +1,150 @@
-from collections import deque
 import time
 
+from app.utils.detection_buffer import DetectionRingBuffer
+from app.utils.frame_record import as_dict, as_record
+from app.utils.unique_objects import UniqueObjectAggregator
+
 MAX_HISTORY_SECONDS = 30
+DEFAULT_FPS = 30
+OBJECTS_PER_FRAME = 32
 
 latest_detections = {}
 camera_info = {}
 
 detection_history = {}
 
+# Per-second buckets of the objects seen by each instance, for /detections?from=N
+unique_objects = {}
+
+# Bumped every time an instance publishes detections, used to version cached API responses
+detection_versions = {}
+
+# Active FrameGrabber per instance, used to report capture queue statistics
+capture_stats = {}
+
+# Shared InferenceService per model name, used to report batching statistics
+inference_services = {}
+
+# MotionGate per instance (None when motion gating is disabled), used to report skipped frames
+motion_gates = {}
+
+# ZoneEngine per instance (None when it has no zones or lines), used to report occupancy and crossings
+zone_engines = {}
+
+# Lifecycle of each instance: state (starting, warming_up, running, stopped) and startup timings
+instance_status = {}
+
+# Instances running in a worker process (--processes), read through shared memory
+remote_instances = {}
+
 input_sources = {}
 is_camera = {}
 
 
+def configure_history(instance_name, fps):
+    # Size the instance's history from the real FPS of its source; cameras may report 0
+    fps = fps if fps and fps > 0 else DEFAULT_FPS
+    detection_history[instance_name] = DetectionRingBuffer(MAX_HISTORY_SECONDS, fps, OBJECTS_PER_FRAME)
+    return detection_history[instance_name]
+
+
 def add_detection(detection, instance_name):
     if instance_name not in detection_history:
-        detection_history[instance_name] = deque(maxlen=MAX_HISTORY_SECONDS * 30)  # Assuming 30 FPS max
-    detection_history[instance_name].append((time.time(), detection))
+        configure_history(instance_name, DEFAULT_FPS)
+    if instance_name not in unique_objects:
+        unique_objects[instance_name] = UniqueObjectAggregator(MAX_HISTORY_SECONDS)
+    now = time.time()
+    record = as_record(detection)
+    detection_history[instance_name].append(now, record)
+    unique_objects[instance_name].add_sightings(now, record.sightings())
 
 
 def get_detections_from(seconds_ago, instance_name):
     if instance_name not in detection_history:
         return []
-    current_time = time.time()
-    return [d for t, d in detection_history[instance_name] if current_time - t <= seconds_ago]
+    return detection_history[instance_name].get_detections(time.time() - seconds_ago)
+
+
+def bump_detection_version(instance_name):
+    detection_versions[instance_name] = detection_versions.get(instance_name, 0) + 1
+
+
+def get_detection_version(instance_name):
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get_version()
+    return detection_versions.get(instance_name, 0)
+
+
+def get_latest_detections(instance_name):
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get_latest_detections()
+    # JSON dicts are only built here, when a response needs them
+    return [as_dict(detection) for detection in latest_detections.get(instance_name, [])]
 
 
 def get_unique_object_counts(seconds_ago, instance_name):
-    detections = get_detections_from(seconds_ago, instance_name)
-    unique_objects = {}
-    for detection in detections:
-        for obj in detection["tracked_objects"]:
-            if obj["id"] is not None:
-                # If we have a tracking ID, use it
-                obj_id = (obj["label"], obj["id"])
-                if obj_id not in unique_objects or unique_objects[obj_id]["timestamp"] < detection["timestamp"]:
-                    unique_objects[obj_id] = {"timestamp": detection["timestamp"], "label": obj["label"]}
-            else:
-                # If no tracking ID, count each detection as unique
-                unique_objects[len(unique_objects)] = {"timestamp": detection["timestamp"], "label": obj["label"]}
-
-    return {
-        label: sum(1 for obj in unique_objects.values() if obj["label"] == label) for label in set(obj["label"] for obj in unique_objects.values())
-    }
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get_unique_object_counts(seconds_ago)
+    if instance_name not in unique_objects:
+        return {}
+    return unique_objects[instance_name].counts(time.time(), seconds_ago)
+
+
+def get_unique_object_counts_by_window(max_seconds, instance_name):
+    # Same semantics as get_unique_object_counts, for every window from 1 to max_seconds in a single pass
+    if instance_name not in unique_objects:
+        return {seconds: {} for seconds in range(1, max_seconds + 1)}
+    return unique_objects[instance_name].counts_by_window(time.time(), max_seconds)
+
+
+def get_capture_stats(instance_name):
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get("capture")
+    grabber = capture_stats.get(instance_name)
+    return grabber.get_stats() if grabber is not None else None
+
+
+def get_motion_stats(instance_name):
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get("motion")
+    gate = motion_gates.get(instance_name)
+    return gate.get_stats() if gate is not None else None
+
+
+def get_scheduler_stats(instance_name):
+    # Target and achieved FPS of an instance sharing an inference service (None when it runs its own model)
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get("scheduler")
+    for service in inference_services.values():
+        stats = service.scheduler.get_stats(instance_name)
+        if stats is not None:
+            return stats
+    return None
+
+
+def get_zone_stats(instance_name):
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get("zones")
+    engine = zone_engines.get(instance_name)
+    return engine.get_stats() if engine is not None else None
+
+
+def get_line_crossings(instance_name, from_ms, to_ms):
+    # None when the crossings of that range are not kept here (older than the event ring, or in a --processes worker)
+    engine = zone_engines.get(instance_name)
+    return engine.count_crossings(from_ms, to_ms) if engine is not None else None
+
+
+def set_instance_state(instance_name, state, **fields):
+    status = instance_status.setdefault(instance_name, {})
+    status.update(fields, state=state)
+    return status
+
+
+def get_instance_status(instance_name):
+    if instance_name in remote_instances:
+        return remote_instances[instance_name].get("status") or {}
+    return instance_status.get(instance_name, {})
 
 
 def set_input_source(source, camera=True, instance_name=None):
@@ -0,0 +1,441 @@
+import json
+import struct
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.utils.frame_record import FrameRecord, as_record
+from app.utils.logger import get_logger, create_log_message
+from app.utils.shared_state import latest_detections, get_detection_version, get_unique_object_counts_by_window
+
+logger = get_logger(__name__)
+
+# Segment layout: a header of uint64 fields, then
+#   snapshot   JSON document of the worker's unique-object counts and stats (capture, motion, scheduler, ...),
+#              guarded by `seq` (odd while being written)
+#   labels     JSON list [input_source, label, ...] of the strings the detection columns refer to, only
+#              rewritten when a new label appears
+#   intervals  interval_capacity rows of (first_ms, latest_ms, track_id), used as a ring guarded by interval_seq.
+#              evicted_until and evicted_first are the latest end and start of the rows overwritten so far (0 before
+#              any); flushed_until is the time by which every track started is in the worker's track store
+#   frames     frame_capacity rows: the frames of the latest detections, and
+#   objects    object_capacity rows: their objects, one frame after the other. frames, objects and labels are
+#              guarded together by frames_seq
+HEADER_FIELDS = (
+    "seq",
+    "snapshot_len",
+    "interval_count",
+    "interval_capacity",
+    "snapshot_capacity",
+    "count_since_boot",
+    "interval_seq",
+    "evicted_until",
+    "evicted_first",
+    "flushed_until",
+    "frames_seq",
+    "frame_count",
+    "object_count",
+    "frame_capacity",
+    "object_capacity",
+    "labels_len",
+    "labels_capacity",
+)
+HEADER = struct.Struct(f"<{len(HEADER_FIELDS)}Q")
+FIELD_OFFSETS = {name: index * 8 for index, name in enumerate(HEADER_FIELDS)}
+HEADER_SIZE = 192
+INTERVAL_DTYPE = np.dtype([("first", "<i8"), ("latest", "<i8"), ("id", "<i8")])
+# captured_at is -1 and speeds are NaN for frames without them
+FRAME_DTYPE = np.dtype([("timestamp", "<i8"), ("fps", "<f8"), ("captured_at", "<i8"), ("speeds", "<f8", (3,)), ("objects", "<i8")])
+OBJECT_DTYPE = np.dtype([("id", "<i8"), ("label", "<i8"), ("box", "<f8", (4,)), ("confidence", "<f8")])
+
+
+def aligned(size):
+    return (size + 7) // 8 * 8
+
+
+class SharedInstanceSegment:
+    """Shared memory block through which a worker process publishes one instance's state."""
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        header = self.read_header()
+        self.snapshot_capacity = header["snapshot_capacity"]
+        self.labels_capacity = header["labels_capacity"]
+        self.interval_capacity = header["interval_capacity"]
+        self.frame_capacity = header["frame_capacity"]
+        self.object_capacity = header["object_capacity"]
+        self.snapshot_offset = HEADER_SIZE
+        self.labels_offset = self.snapshot_offset + aligned(self.snapshot_capacity)
+        offset = self.labels_offset + aligned(self.labels_capacity)
+        self.intervals = np.ndarray((self.interval_capacity,), dtype=INTERVAL_DTYPE, buffer=shm.buf, offset=offset)
+        offset += self.interval_capacity * INTERVAL_DTYPE.itemsize
+        self.frames = np.ndarray((self.frame_capacity,), dtype=FRAME_DTYPE, buffer=shm.buf, offset=offset)
+        offset += self.frame_capacity * FRAME_DTYPE.itemsize
+        self.objects = np.ndarray((self.object_capacity,), dtype=OBJECT_DTYPE, buffer=shm.buf, offset=offset)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def create(cls, name, snapshot_capacity=64 * 1024, interval_capacity=65536, frame_capacity=4, object_capacity=1024, labels_capacity=4096):
+        size = (
+            HEADER_SIZE
+            + aligned(snapshot_capacity)
+            + aligned(labels_capacity)
+            + interval_capacity * INTERVAL_DTYPE.itemsize
+            + frame_capacity * FRAME_DTYPE.itemsize
+            + object_capacity * OBJECT_DTYPE.itemsize
+        )
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        capacities = {
+            "interval_capacity": interval_capacity,
+            "snapshot_capacity": snapshot_capacity,
+            "frame_capacity": frame_capacity,
+            "object_capacity": object_capacity,
+            "labels_capacity": labels_capacity,
+        }
+        HEADER.pack_into(shm.buf, 0, *(capacities.get(field, 0) for field in HEADER_FIELDS))
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        # Workers share the resource tracker of the process that created the segment, which unlinks it
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def read_header(self):
+        return dict(zip(HEADER_FIELDS, HEADER.unpack_from(self.shm.buf, 0)))
+
+    def field(self, name):
+        return struct.unpack_from("<Q", self.shm.buf, FIELD_OFFSETS[name])[0]
+
+    def set_fields(self, **values):
+        for name, value in values.items():
+            struct.pack_into("<Q", self.shm.buf, FIELD_OFFSETS[name], value)
+
+    def begin(self, seq_field):
+        # Makes the sequence counter odd while its region is written, so readers retry instead of reading half of it
+        seq = self.field(seq_field)
+        self.set_fields(**{seq_field: seq + 1})
+        return seq
+
+    def end(self, seq_field, seq, **values):
+        self.set_fields(**values)
+        self.set_fields(**{seq_field: seq + 2})
+
+    def read_consistent(self, seq_field, reader, retries=100):
+        # (seq, reader()) for a read that no write overlapped, or (None, None) if the writer kept the region busy
+        for _ in range(retries):
+            seq = self.field(seq_field)
+            if seq % 2:
+                time.sleep(0)
+                continue
+            result = reader()
+            if self.field(seq_field) == seq:
+                return seq, result
+        return None, None
+
+    def write_snapshot(self, payload):
+        if len(payload) > self.snapshot_capacity:
+            raise ValueError(f"Snapshot of {len(payload)} bytes exceeds the shared memory capacity of {self.snapshot_capacity} bytes")
+        seq = self.begin("seq")
+        self.shm.buf[self.snapshot_offset : self.snapshot_offset + len(payload)] = payload
+        self.end("seq", seq, snapshot_len=len(payload))
+
+    def read_snapshot(self, retries=100):
+        return self.read_consistent("seq", lambda: bytes(self.shm.buf[self.snapshot_offset : self.snapshot_offset + self.field("snapshot_len")]), retries)
+
+    def write_labels(self, payload):
+        # Only called between begin("frames_seq") and end()
+        self.shm.buf[self.labels_offset : self.labels_offset + len(payload)] = payload
+        self.set_fields(labels_len=len(payload))
+
+    def read_labels(self):
+        return bytes(self.shm.buf[self.labels_offset : self.labels_offset + self.field("labels_len")])
+
+    def read_intervals(self, reader, retries=100):
+        # reader(rows, header) on a consistent view of the ring, or None if the writer kept it busy
+        def read():
+            header = self.read_header()
+            return reader(self.intervals[: min(header["interval_count"], self.interval_capacity)], header)
+
+        return self.read_consistent("interval_seq", read, retries)[1]
+
+    def close(self):
+        # Views into the buffer must be released before the mapping can be closed
+        self.intervals = self.frames = self.objects = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class InstancePublisher:
+    """Worker-side writer: mirrors detections and PersonCounter intervals into the segment.
+
+    The latest detections are copied column by column into the frame and object
+    arrays, with labels as indices into a list that is only rewritten when it
+    grows, so publishing them encodes nothing per frame.
+    """
+
+    def __init__(self, segment, instance_name, publish_interval_ms=100, max_window_seconds=30):
+        self.segment = segment
+        self.instance_name = instance_name
+        self.publish_interval = publish_interval_ms / 1000
+        self.max_window_seconds = max_window_seconds
+        self.last_publish = 0
+        self.interval_count = 0
+        self.evicted_until = 0
+        self.evicted_first = 0
+        self.rows = {}
+        self.row_ids = np.full(segment.interval_capacity, -1, dtype=np.int64)
+        self.published_version = None
+        self.labels = []
+        self.label_codes = {}
+        self.published_strings = None
+
+    def publish(self, detection, person_counter, extra=None):
+        if detection is not None:
+            self.publish_intervals(as_record(detection).track_ids("person"), person_counter)
+        now = time.time()
+        if now - self.last_publish >= self.publish_interval:
+            self.last_publish = now
+            version = get_detection_version(self.instance_name)
+            if version != self.published_version:
+                self.published_version = version
+                self.publish_detections(latest_detections.get(self.instance_name, []))
+            self.publish_snapshot(extra)
+
+    def publish_intervals(self, track_ids, person_counter):
+        intervals = self.segment.intervals
+        capacity = self.segment.interval_capacity
+        seq = self.segment.begin("interval_seq")
+        for track_id in track_ids:
+            movement = person_counter.get_movement(track_id)
+            if movement is None:
+                continue
+            first, latest = movement
+            row = self.rows.get(track_id)
+            if row is not None and intervals[row]["first"] == first:
+                intervals[row]["latest"] = latest
+                continue
+            row = self.interval_count % capacity
+            evicted = self.row_ids[row]
+            if evicted >= 0:
+                # Counts of ranges reaching back before this end would miss the overwritten track
+                self.evicted_until = max(self.evicted_until, int(intervals[row]["latest"]))
+                self.evicted_first = max(self.evicted_first, int(intervals[row]["first"]))
+                if self.rows.get(evicted) == row:
+                    del self.rows[evicted]
+            intervals[row] = (first, latest, track_id)
+            self.row_ids[row] = track_id
+            self.rows[track_id] = row
+            self.interval_count += 1
+        self.segment.end(
+            "interval_seq",
+            seq,
+            interval_count=self.interval_count,
+            count_since_boot=person_counter.get_count_since_boot(),
+            evicted_until=self.evicted_until,
+            evicted_first=self.evicted_first,
+            flushed_until=max(0, int(person_counter.flushed_until)) if person_counter.store is not None else 0,
+        )
+
+    def label_code(self, label):
+        code = self.label_codes.get(label)
+        if code is None:
+            code = self.label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def publish_detections(self, detections):
+        segment = self.segment
+        records = [as_record(detection) for detection in detections][-segment.frame_capacity :]
+        # Labels are coded before the write starts, so their list can be checked against its capacity
+        codes = []
+        for record in records:
+            classes, inverse = np.unique(record.classes, return_inverse=True)
+            codes.append(np.array([self.label_code(record.names[cls]) for cls in classes.tolist()], dtype=np.int64)[inverse])
+        strings = [records[-1].input_source if records else None, *self.labels]
+        payload = None
+        if strings != self.published_strings:
+            payload = json.dumps(strings).encode()
+            if len(payload) > segment.labels_capacity:
+                logger.error(create_log_message(event="shm_publish_error", error="Labels exceed the shared memory capacity", instance=self.instance_name))
+                return
+        seq = segment.begin("frames_seq")
+        position = 0
+        for index, (record, labels) in enumerate(zip(records, codes)):
+            count = min(len(record), segment.object_capacity - position)
+            if count < len(record):
+                logger.warning(create_log_message(event="shm_objects_truncated", objects=len(record), published=count, instance=self.instance_name))
+            objects = segment.objects[position : position + count]
+            objects["id"] = record.ids[:count]
+            objects["label"] = labels[:count]
+            objects["box"] = record.boxes[:count]
+            objects["confidence"] = record.confidences[:count]
+            frame = segment.frames[index : index + 1]
+            frame["timestamp"] = record.timestamp
+            frame["fps"] = record.fps
+            frame["captured_at"] = record.captured_at if record.captured_at is not None else -1
+            frame["speeds"] = record.speeds if record.speeds is not None else np.nan
+            frame["objects"] = count
+            position += count
+        if payload is not None:
+            segment.write_labels(payload)
+            self.published_strings = strings
+        segment.end("frames_seq", seq, frame_count=len(records), object_count=position)
+
+    def publish_snapshot(self, extra=None):
+        snapshot = {
+            "published_at": int(time.time() * 1000),
+            "unique_counts": get_unique_object_counts_by_window(self.max_window_seconds, self.instance_name),
+        }
+        # extra may be a callable, so that it is only evaluated when a snapshot is actually published
+        if callable(extra):
+            extra = extra()
+        if extra:
+            snapshot.update(extra)
+        try:
+            self.segment.write_snapshot(json.dumps(snapshot).encode())
+        except ValueError as e:
+            logger.error(create_log_message(event="shm_publish_error", error=str(e), instance=self.instance_name))
+
+
+class RemoteInstanceView:
+    """API-side reader: rebuilds the latest detections and decodes the snapshot once per published version."""
+
+    def __init__(self, segment, instance_name):
+        self.segment = segment
+        self.instance_name = instance_name
+        self.seq = None
+        self.snapshot = {}
+        self.frames_seq = None
+        self.latest = []
+        self.labels_payload = None
+        self.strings = [None]
+
+    def get_snapshot(self):
+        seq = self.segment.field("seq")
+        if seq != self.seq and seq % 2 == 0:
+            seq, payload = self.segment.read_snapshot()
+            if payload:
+                self.snapshot = json.loads(payload)
+                self.seq = seq
+        return self.snapshot
+
+    def get_version(self):
+        # The frames_seq counter advances on every published change of the latest detections
+        return self.segment.field("frames_seq") // 2
+
+    def read_frames(self):
+        header = self.segment.read_header()
+        frames = self.segment.frames[: min(header["frame_count"], self.segment.frame_capacity)].copy()
+        objects = self.segment.objects[: min(header["object_count"], self.segment.object_capacity)].copy()
+        return frames, objects, self.segment.read_labels()
+
+    def get_latest_detections(self):
+        seq = self.segment.field("frames_seq")
+        if seq != self.frames_seq and seq % 2 == 0:
+            seq, columns = self.segment.read_consistent("frames_seq", self.read_frames)
+            if seq is not None:
+                frames, objects, labels_payload = columns
+                if labels_payload != self.labels_payload:
+                    self.strings = json.loads(labels_payload) if labels_payload else [None]
+                    self.labels_payload = labels_payload
+                self.latest = self.build_detections(frames, objects)
+                self.frames_seq = seq
+        return self.latest
+
+    def build_detections(self, frames, objects):
+        input_source, labels = self.strings[0], self.strings[1:]
+        detections = []
+        position = 0
+        for frame in frames:
+            count = int(frame["objects"])
+            frame_objects = objects[position : position + count]
+            position += count
+            speeds = frame["speeds"]
+            record = FrameRecord(
+                int(frame["timestamp"]),
+                input_source,
+                float(frame["fps"]),
+                frame_objects["id"],
+                frame_objects["label"],
+                frame_objects["box"],
+                frame_objects["confidence"],
+                labels,
+                None if np.isnan(speeds).any() else tuple(speeds.tolist()),
+                int(frame["captured_at"]) if frame["captured_at"] >= 0 else None,
+            )
+            detections.append(record.to_dict())
+        return detections
+
+    def get_unique_object_counts(self, seconds_ago):
+        return self.get_snapshot().get("unique_counts", {}).get(str(seconds_ago), {})
+
+    def get(self, key, default=None):
+        return self.get_snapshot().get(key, default)
+
+
+class RemotePersonCounter:
+    """Answers PersonCounter queries in the API process from the published intervals.
+
+    Ranges the ring no longer fully covers, or older than the retention window,
+    are counted from the worker's track store for the tracks started by its
+    last flush, plus the ring's rows for the tracks started since, so tracks not
+    flushed yet are not missed and none is counted twice.
+    """
+
+    def __init__(self, segment, device_id, store=None, retention_ms=None):
+        self.segment = segment
+        self.device_id = device_id
+        # Read-only view of the worker's TrackIntervalStore
+        self.store = store
+        self.retention_ms = retention_ms
+
+    def __len__(self):
+        return min(self.segment.field("interval_count"), self.segment.interval_capacity)
+
+    def get_count(self, from_seconds, to_seconds):
+        # None when the range reaches back to tracks the ring no longer holds and no store can count it
+        from_ms = int(from_seconds * 1000)
+        to_ms = int(to_seconds * 1000)
+
+        def reader(rows, header):
+            overlapping = (rows["first"] <= to_ms) & (rows["latest"] >= from_ms)
+            unflushed = int(np.count_nonzero(overlapping & (rows["first"] > header["flushed_until"])))
+            return int(np.count_nonzero(overlapping)), unflushed, header
+
+        result = self.segment.read_intervals(reader)
+        count = None
+        source = "intervals"
+        if result is not None:
+            count, unflushed, header = result
+            evicted = from_ms <= header["evicted_until"]
+            if self.store is not None and (evicted or from_ms < int(time.time() * 1000) - self.retention_ms):
+                source = "store"
+                flushed_until = header["flushed_until"]
+                # The ring must still hold every track started since the last flush
+                if header["evicted_first"] > flushed_until:
+                    count = None
+                else:
+                    count = self.store.count(from_ms, min(to_ms, flushed_until)) + unflushed
+            elif evicted:
+                count = None
+            if count is None:
+                logger.warning(
+                    create_log_message(
+                        event="person_counter_intervals_overwritten",
+                        device_id=self.device_id,
+                        from_ms=from_ms,
+                        evicted_until=header["evicted_until"],
+                        store=self.store is not None,
+                    )
+                )
+        logger.info(create_log_message(event="person_counter_get_count", device_id=self.device_id, count=count, source=source, from_ms=from_ms, to_ms=to_ms, total_movements=len(self)))
+        return count
+
+    def get_count_since_boot(self):
+        return self.segment.field("count_since_boot")
@@ -0,0 +1,39 @@
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class StageTimer:
+    """Collects per-frame durations of pipeline stages, in milliseconds.
+
+    Samples are recorded from the tracking loop and the capture thread and
+    summarized as percentiles, e.g. by the benchmark runner.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def add(self, stage, milliseconds):
+        with self.lock:
+            self.samples[stage].append(milliseconds)
+
+    def count(self, stage):
+        with self.lock:
+            return len(self.samples.get(stage, ()))
+
+    def summary(self):
+        with self.lock:
+            samples = {stage: np.array(values, dtype=np.float64) for stage, values in self.samples.items() if values}
+        summary = {}
+        for stage, values in samples.items():
+            summary[stage] = {
+                "count": int(values.size),
+                "mean": round(float(values.mean()), 3),
+                **{f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+                "max": round(float(values.max()), 3),
+            }
+        return summary
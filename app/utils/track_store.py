@@ -0,0 +1,238 @@
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.utils.logger import get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+# Partition files hold fixed-width rows of (first_ms, latest_ms, track_id) int64, partitioned by first_ms:
+#   <partition start ms>.log  appended by the tracking loop; a track has one row per flush while it is visible
+#   <partition start ms>.dat  compacted: one row per track, sorted by first_ms
+RECORD_DTYPE = np.dtype([("first", "<i8"), ("latest", "<i8"), ("id", "<i8")])
+LOG_SUFFIX = ".log"
+DATA_SUFFIX = ".dat"
+
+
+def read_rows(path, missing=()):
+    # Maps the file read-only; a trailing partial row (interrupted write) is ignored.
+    # A file removed by a concurrent compaction reads as `missing` (no rows by default)
+    try:
+        with open(path, "rb") as file:
+            count = os.fstat(file.fileno()).st_size // RECORD_DTYPE.itemsize
+            if not count:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            mapped = mmap.mmap(file.fileno(), count * RECORD_DTYPE.itemsize, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return np.empty(0, dtype=RECORD_DTYPE) if missing == () else missing
+    # The mapping is released with the last array referencing it
+    return np.frombuffer(mapped, dtype=RECORD_DTYPE, count=count)
+
+
+def latest_rows(rows):
+    # Keeps the last flushed row of each track, i.e. the one with the highest latest_ms
+    if len(rows) == 0:
+        return rows
+    rows = rows[np.lexsort((rows["latest"], rows["id"], rows["first"]))]
+    last = np.ones(len(rows), dtype=bool)
+    last[:-1] = (rows["first"][1:] != rows["first"][:-1]) | (rows["id"][1:] != rows["id"][:-1])
+    return rows[last]
+
+
+def count_tracks(rows):
+    # Tracks are identified by (first_ms, track_id), since track ids restart with the tracker
+    if len(rows) == 0:
+        return 0
+    order = np.lexsort((rows["id"], rows["first"]))
+    first, ids = rows["first"][order], rows["id"][order]
+    return 1 + int(np.count_nonzero((first[1:] != first[:-1]) | (ids[1:] != ids[:-1])))
+
+
+class Partition:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.data_path = None
+        self.log_path = None
+        # (path, size, mtime) of the .dat file -> (row count, max latest_ms)
+        self.data_key = None
+        self.data_summary = (0, None)
+
+    def summarize(self):
+        # Compacted files are only ever replaced, so their summary is cached until the file changes
+        stat = os.stat(self.data_path)
+        key = (self.data_path, stat.st_size, stat.st_mtime_ns)
+        if key != self.data_key:
+            rows = read_rows(self.data_path)
+            self.data_summary = (len(rows), int(rows["latest"].max()) if len(rows) else None)
+            self.data_key = key
+        return self.data_summary
+
+    def max_latest(self):
+        if self.log_path is None:
+            return self.summarize()[1] if self.data_path is not None else None
+        rows = self.rows()
+        return int(rows["latest"].max()) if len(rows) else None
+
+    def rows(self):
+        data = read_rows(self.data_path) if self.data_path is not None else np.empty(0, dtype=RECORD_DTYPE)
+        if self.log_path is None:
+            return data
+        log = read_rows(self.log_path, missing=None)
+        if log is None:
+            # Compacted meanwhile (by the writer process, for a read-only store): the data file was
+            # replaced before the log was removed, so it now holds the log's rows
+            self.data_path, self.log_path = os.path.splitext(self.log_path)[0] + DATA_SUFFIX, None
+            return read_rows(self.data_path)
+        return np.concatenate([data, log])
+
+    def count(self, lo, hi):
+        if self.log_path is None and self.data_path is not None:
+            try:
+                row_count, max_latest = self.summarize()
+            except FileNotFoundError:
+                return 0
+            if max_latest is None or max_latest < lo:
+                return 0
+            # Every track starting inside [lo, hi] overlaps it, so fully covered partitions are not read
+            if self.start >= lo and self.end - 1 <= hi:
+                return row_count
+            rows = self.rows()
+            return int(np.count_nonzero((rows["first"] <= hi) & (rows["latest"] >= lo)))
+        rows = self.rows()
+        return count_tracks(rows[(rows["first"] <= hi) & (rows["latest"] >= lo)])
+
+
+class TrackIntervalStore:
+    """Append-only on-disk store of person track intervals for one instance.
+
+    Intervals are written as fixed-width rows into files partitioned by the
+    track's first sighting, and read back through ``mmap``. Counting the tracks
+    overlapping ``[lo, hi]`` skips partitions starting after ``hi`` or whose
+    tracks all ended before ``lo``, counts compacted partitions inside the range
+    from their cached row count, and only scans the partitions at its edges, so
+    queries over weeks of data touch a handful of files.
+
+    Open tracks are re-appended on every flush; ``compact`` later merges the rows
+    of settled partitions into one row per track and drops expired partitions.
+    Appends, compactions and reads of one store are serialized by its lock, so
+    HTTP threads can count while the tracking loop writes.
+    """
+
+    def __init__(self, directory, partition_minutes=60, retention_days=None, readonly=False):
+        self.directory = Path(directory)
+        self.partition_ms = int(partition_minutes * 60 * 1000)
+        self.retention_ms = int(retention_days * 24 * 3600 * 1000) if retention_days else None
+        self.readonly = readonly
+        self.partitions = {}
+        self.lock = threading.RLock()
+        if not readonly:
+            self.recover()
+
+    def scan(self):
+        # Refreshes the partition list from the directory, which another process may be writing
+        found = {}
+        if self.directory.is_dir():
+            for entry in os.scandir(self.directory):
+                stem, suffix = os.path.splitext(entry.name)
+                if suffix in (LOG_SUFFIX, DATA_SUFFIX) and stem.isdigit():
+                    found.setdefault(int(stem), {})[suffix] = entry.path
+        partitions = {}
+        for start, paths in found.items():
+            # Partitions are reused so their cached summaries survive rescans
+            partition = self.partitions.get(start) or Partition(start, start + self.partition_ms)
+            partition.log_path = paths.get(LOG_SUFFIX)
+            partition.data_path = paths.get(DATA_SUFFIX)
+            partitions[start] = partition
+        self.partitions = partitions
+        return [partitions[start] for start in sorted(partitions)]
+
+    def recover(self):
+        # Truncates rows cut short by a crash, so later appends stay aligned
+        for partition in self.scan():
+            if partition.log_path is None:
+                continue
+            size = os.path.getsize(partition.log_path)
+            if size % RECORD_DTYPE.itemsize:
+                with open(partition.log_path, "r+b") as file:
+                    file.truncate(size - size % RECORD_DTYPE.itemsize)
+                logger.warning(create_log_message(event="track_store_truncated", path=partition.log_path, size=size))
+
+    def append(self, rows):
+        rows = np.asarray(rows, dtype=RECORD_DTYPE)
+        if len(rows) == 0:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        starts = rows["first"] - rows["first"] % self.partition_ms
+        with self.lock:
+            for start in np.unique(starts):
+                with open(self.directory / f"{int(start)}{LOG_SUFFIX}", "ab") as file:
+                    file.write(rows[starts == start].tobytes())
+
+    def count(self, lo, hi):
+        total = 0
+        with self.lock:
+            for partition in self.scan():
+                if partition.start > hi:
+                    break
+                total += partition.count(lo, hi)
+        return total
+
+    def load(self, since_ms):
+        # Last known interval of every track seen since `since_ms`
+        parts = []
+        with self.lock:
+            for partition in self.scan():
+                max_latest = partition.max_latest()
+                if max_latest is None or max_latest < since_ms:
+                    continue
+                rows = latest_rows(partition.rows())
+                parts.append(rows[rows["latest"] >= since_ms])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+
+    def compact(self, now_ms=None, settle_ms=None):
+        """Merges the log of every partition that ended `settle_ms` ago into its data file."""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        settle_ms = self.partition_ms if settle_ms is None else settle_ms
+        cutoff = now_ms - self.retention_ms if self.retention_ms is not None else None
+        with self.lock:
+            compacted, removed = 0, 0
+            for partition in self.scan():
+                if cutoff is not None and partition.end <= cutoff and (partition.max_latest() or 0) < cutoff:
+                    for path in (partition.data_path, partition.log_path):
+                        if path:
+                            os.remove(path)
+                    removed += 1
+                    continue
+                if partition.log_path is None or partition.end > now_ms - settle_ms:
+                    continue
+                rows = latest_rows(partition.rows())
+                data_path = self.directory / f"{partition.start}{DATA_SUFFIX}"
+                temporary_path = data_path.with_suffix(".tmp")
+                with open(temporary_path, "wb") as file:
+                    file.write(rows.tobytes())
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporary_path, data_path)
+                os.remove(partition.log_path)
+                compacted += 1
+            if compacted or removed:
+                self.scan()
+                logger.info(create_log_message(event="track_store_compacted", directory=str(self.directory), compacted=compacted, removed=removed))
+        return compacted, removed
+
+    @classmethod
+    def from_config(cls, instance_name, settings, readonly=False):
+        # One directory per instance under `directory`; None when the store is disabled
+        if not settings or not settings.get("enabled", False):
+            return None
+        return cls(
+            Path(settings.get("directory", "data/tracks")) / str(instance_name),
+            settings.get("partition_minutes", 60),
+            settings.get("retention_days"),
+            readonly,
+        )
@@ -0,0 +1,96 @@
+import math
+import threading
+from collections import Counter, deque
+
+
+class SecondBucket:
+    __slots__ = ("second", "last_seen", "untracked", "untracked_counts")
+
+    def __init__(self, second):
+        self.second = second
+        # (label, id) -> time of the object's last sighting within this second
+        self.last_seen = {}
+        # (time, label) of every untracked sighting, each of them counts as a unique object
+        self.untracked = []
+        self.untracked_counts = Counter()
+
+
+class UniqueObjectAggregator:
+    """Per-second buckets of the objects seen by one instance, maintained as frames arrive.
+
+    A window of N seconds is answered by merging the N + 1 buckets it touches.
+    Only the oldest one is partially covered; its sightings are filtered by
+    time, so results match a scan over every frame of the window.
+    """
+
+    def __init__(self, max_seconds=30):
+        self.max_seconds = max_seconds
+        self.buckets = deque()
+        self.lock = threading.Lock()
+
+    def add(self, time, tracked_objects):
+        self.add_sightings(time, [(obj["label"], obj["id"]) for obj in tracked_objects])
+
+    def add_sightings(self, time, sightings):
+        # (label, id) pairs of the objects of one frame, id None for untracked objects
+        second = math.floor(time)
+        with self.lock:
+            if not self.buckets or self.buckets[-1].second != second:
+                self.buckets.append(SecondBucket(second))
+                while self.buckets[0].second < second - self.max_seconds:
+                    self.buckets.popleft()
+            bucket = self.buckets[-1]
+            for label, track_id in sightings:
+                if track_id is not None:
+                    bucket.last_seen[(label, track_id)] = time
+                else:
+                    bucket.untracked.append((time, label))
+                    bucket.untracked_counts[label] += 1
+
+    def window_buckets(self, since):
+        # Buckets overlapping [since, ...), oldest first; the first one may start before `since`
+        with self.lock:
+            buckets = []
+            for bucket in reversed(self.buckets):
+                if bucket.second + 1 <= since:
+                    break
+                buckets.append(bucket)
+            return buckets[::-1]
+
+    def counts(self, now, seconds_ago):
+        since = now - seconds_ago
+        tracked = set()
+        untracked = Counter()
+        for bucket in self.window_buckets(since):
+            if bucket.second >= since:
+                tracked.update(bucket.last_seen)
+                untracked.update(bucket.untracked_counts)
+            else:
+                tracked.update(key for key, t in bucket.last_seen.items() if t >= since)
+                untracked.update(label for t, label in bucket.untracked if t >= since)
+
+        counts = Counter(label for label, _ in tracked)
+        counts.update(untracked)
+        return dict(counts)
+
+    def counts_by_window(self, now, max_seconds):
+        # Answers every window from 1 to max_seconds at once from each object's most recent sighting
+        last_seen = {}
+        sightings = []
+        for bucket in self.window_buckets(now - max_seconds):
+            last_seen.update(bucket.last_seen)
+            sightings.extend((label, t) for t, label in bucket.untracked)
+        sightings.extend((label, t) for (label, _), t in last_seen.items())
+
+        first_window = [Counter() for _ in range(max_seconds + 1)]
+        for label, t in sightings:
+            age = now - t
+            if age <= max_seconds:
+                first_window[max(1, math.ceil(age))][label] += 1
+
+        counts = {}
+        running = Counter()
+        for seconds in range(1, max_seconds + 1):
+            running.update(first_window[seconds])
+            counts[seconds] = dict(running)
+        return counts
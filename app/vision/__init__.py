@@ -1,3 +1,10 @@
-from .track import track
-
 __all__ = ["track"]
+
+
+def __getattr__(name):
+    # Importing app.vision.track loads torch and ultralytics; defer it until track is used
+    if name == "track":
+        from .track import track
+
+        return track
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
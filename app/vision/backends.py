@@ -0,0 +1,98 @@
+import hashlib
+import importlib.util
+import shutil
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from app.utils.logger import get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+PYTORCH = "pytorch"
+ONNX = "onnx"
+OPENVINO = "openvino"
+BACKENDS = (PYTORCH, ONNX, OPENVINO)
+
+# Python package each exported format needs at runtime
+BACKEND_PACKAGES = {ONNX: "onnxruntime", OPENVINO: "openvino"}
+
+EXPORT_DIR = Path("models") / "exports"
+
+
+def select_device(device="auto"):
+    # "auto" picks the fastest device available on this machine
+    if device and device != "auto":
+        return device
+    if torch.cuda.is_available():
+        return "cuda:0"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def backend_available(backend):
+    package = BACKEND_PACKAGES.get(backend)
+    return package is None or importlib.util.find_spec(package) is not None
+
+
+def select_backend(backend="auto", device="cpu"):
+    # Exported formats only pay off on CPU; GPUs run the PyTorch weights
+    if backend and backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}")
+        return backend
+    if not device.startswith("cpu"):
+        return PYTORCH
+    for candidate in (OPENVINO, ONNX):
+        if backend_available(candidate):
+            return candidate
+    return PYTORCH
+
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as weights:
+        for chunk in iter(lambda: weights.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_path(model_path, backend, imgsz, int8=False):
+    # Exports are keyed by the weights' content and the input size, so changed weights are re-exported
+    model_path = Path(model_path)
+    name = f"{model_path.stem}-{file_hash(model_path)}-{imgsz}{'-int8' if int8 else ''}"
+    if backend == ONNX:
+        return EXPORT_DIR / f"{name}.onnx"
+    return EXPORT_DIR / f"{name}_openvino_model"
+
+
+def export_model(model, model_path, backend, imgsz, int8=False):
+    """Returns the path of `model_path` exported to `backend`, exporting it on the first call only."""
+    target = export_path(model_path, backend, imgsz, int8)
+    if target.exists():
+        logger.info(create_log_message(event="export_cache_hit", backend=backend, path=str(target)))
+        return target
+
+    start = time.time()
+    # Ultralytics writes the export next to the weights; it is then moved into the cache
+    exported = Path(model.export(format=backend, imgsz=imgsz, int8=int8, dynamic=True, verbose=False))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(exported), str(target))
+    logger.info(create_log_message(event="model_exported", backend=backend, int8=int8, imgsz=imgsz, path=str(target), duration=round(time.time() - start, 2)))
+    return target
+
+
+def measure_latency(model, imgsz=640, runs=5):
+    # Median latency of a single blank frame, after one warm-up run
+    frame = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    model.predict(frame, imgsz=imgsz, verbose=False)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict(frame, imgsz=imgsz, verbose=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
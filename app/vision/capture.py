@@ -0,0 +1,229 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from app.utils.logger import get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+# Drop policies for the capture queue
+DROP_OLDEST = "drop_oldest"  # Latest frame wins, stale frames are discarded (live cameras, RTSP)
+BLOCK = "block"  # Capture waits for the consumer, no frame is lost (video files)
+DROP_POLICIES = (DROP_OLDEST, BLOCK)
+
+
+# Grabs skipped in a row at most while draining, so a source that never blocks still yields frames
+MAX_DRAIN = 100
+
+
+class FrameGrabber:
+    """Reads frames on a dedicated thread and hands them over through a bounded queue.
+
+    Decoding the next frame overlaps with inference on the current one. With the
+    ``drop_oldest`` policy the queue only ever holds the freshest frames, so the
+    age of the frame being processed stays bounded whatever the model cost.
+
+    For live sources, ``drain_threshold_ms`` skips frames that the decoder had
+    already buffered: grabs returning faster than the threshold did not wait for
+    the source, so their frames are dropped without being converted. Since a grab
+    from a live source mostly waits for the next frame, the decode time of a live
+    frame is that of retrieving the kept frame, and time spent in grabs is
+    reported apart as ``grab_wait_ms``. When
+    ``reconnect`` is given (a callable returning a new capture), a failed read
+    reopens the source with exponential backoff instead of ending the capture.
+    """
+
+    def __init__(
+        self,
+        vid,
+        input_source,
+        instance_name=None,
+        drop_policy=DROP_OLDEST,
+        queue_size=1,
+        loop_video=False,
+        timer=None,
+        drain_threshold_ms=None,
+        reconnect=None,
+        backoff_initial=0.5,
+        backoff_max=30.0,
+        max_reconnect_attempts=0,
+        live=False,
+    ):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Invalid drop policy: {drop_policy}. Must be one of {', '.join(DROP_POLICIES)}")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        self.vid = vid
+        self.input_source = input_source
+        self.instance_name = instance_name
+        self.drop_policy = drop_policy
+        self.queue_size = queue_size
+        self.loop_video = loop_video
+        # Optional StageTimer receiving the decode time of every frame
+        self.timer = timer
+        self.drain_threshold = drain_threshold_ms / 1000 if drain_threshold_ms else None
+        # Cameras and streams: reads wait for the source, so grabs are timed apart from decoding
+        self.live = live
+        self.reconnect = reconnect
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        # 0 retries forever
+        self.max_reconnect_attempts = max_reconnect_attempts
+
+        # (capture time, frame) pairs
+        self.frames = deque()
+        # Capture time of the frame last returned by read()
+        self.last_captured_at = None
+        self.condition = threading.Condition()
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        # Total decode time, reported per frame so backends can be compared per source
+        self.decode_seconds = 0.0
+        # Total time live reads spent in grabs, waiting for the source and skipping drained frames
+        self.grab_seconds = 0.0
+        self.frames_drained = 0
+        self.reconnects = 0
+        self.connected = True
+        self.stopped = False
+        self.finished = False
+        self.thread = threading.Thread(target=self._run, name=f"capture-{instance_name}", daemon=True)
+
+    def start(self):
+        logger.info(
+            create_log_message(
+                event="capture_start",
+                input_source=self.input_source,
+                drop_policy=self.drop_policy,
+                queue_size=self.queue_size,
+                instance=self.instance_name,
+            )
+        )
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while not self.stopped:
+                start = time.perf_counter()
+                success, frame, grab_time = self._read()
+                if not success and self.loop_video:
+                    self.vid.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    success, frame = self.vid.read()
+                    grab_time = 0.0
+                if not success:
+                    if self.reconnect is not None and not self.stopped and self._reconnect():
+                        continue
+                    break
+                decode_time = time.perf_counter() - start - grab_time
+                self.decode_seconds += decode_time
+                self.grab_seconds += grab_time
+                if self.timer:
+                    self.timer.add("decode", decode_time * 1000)
+                self._put(frame)
+        except Exception as e:
+            logger.error(create_log_message(event="capture_error", error=str(e), input_source=self.input_source, instance=self.instance_name))
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def _read(self):
+        # (success, frame, seconds spent in grabs); a file's read is all decoding
+        if not self.live and self.drain_threshold is None:
+            return (*self.vid.read(), 0.0)
+        skipped = 0
+        started = time.perf_counter()
+        while True:
+            start = time.perf_counter()
+            if not self.vid.grab():
+                return False, None, 0.0
+            # A grab that had to wait for the source returned a frame that just arrived
+            if self.drain_threshold is None or time.perf_counter() - start >= self.drain_threshold or skipped >= MAX_DRAIN:
+                break
+            skipped += 1
+        self.frames_drained += skipped
+        grab_time = time.perf_counter() - started
+        return (*self.vid.retrieve(), grab_time)
+
+    def _reconnect(self):
+        # Reopens the source, waiting backoff_initial, then twice as long after each failure, up to backoff_max
+        self.connected = False
+        self.vid.release()
+        delay = self.backoff_initial
+        attempts = 0
+        while True:
+            attempts += 1
+            logger.warning(
+                create_log_message(event="capture_reconnecting", attempt=attempts, delay=delay, input_source=self.input_source, instance=self.instance_name)
+            )
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopped, timeout=delay)
+            if self.stopped:
+                return False
+            vid = self.reconnect()
+            if vid is not None and vid.isOpened():
+                self.vid = vid
+                self.reconnects += 1
+                self.connected = True
+                logger.info(
+                    create_log_message(event="capture_reconnected", attempts=attempts, reconnects=self.reconnects, input_source=self.input_source, instance=self.instance_name)
+                )
+                return True
+            if vid is not None:
+                vid.release()
+            if self.max_reconnect_attempts and attempts >= self.max_reconnect_attempts:
+                logger.error(create_log_message(event="capture_reconnect_failed", attempts=attempts, input_source=self.input_source, instance=self.instance_name))
+                return False
+            delay = min(delay * 2, self.backoff_max)
+
+    def _put(self, frame):
+        with self.condition:
+            if self.drop_policy == BLOCK:
+                while len(self.frames) >= self.queue_size and not self.stopped:
+                    self.condition.wait()
+            elif len(self.frames) >= self.queue_size:
+                self.frames.popleft()
+                self.frames_dropped += 1
+            self.frames.append((time.time(), frame))
+            self.frames_captured += 1
+            self.condition.notify_all()
+
+    def read(self):
+        # Same contract as cv2.VideoCapture.read(): (False, None) once the source is exhausted
+        with self.condition:
+            while not self.frames and not self.finished:
+                self.condition.wait()
+            if not self.frames:
+                return False, None
+            self.last_captured_at, frame = self.frames.popleft()
+            self.condition.notify_all()
+            return True, frame
+
+    def stop(self, timeout=1.0):
+        with self.condition:
+            self.stopped = True
+            self.frames.clear()
+            self.condition.notify_all()
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                "drop_policy": self.drop_policy,
+                "queue_size": self.queue_size,
+                "queue_depth": len(self.frames),
+                "frames_captured": self.frames_captured,
+                "frames_dropped": self.frames_dropped,
+                "decode_backend": getattr(self.vid, "backend", None),
+                "decode_ms": round(self.decode_seconds * 1000 / self.frames_captured, 3) if self.frames_captured else None,
+                "grab_wait_ms": round(self.grab_seconds * 1000 / self.frames_captured, 3) if self.frames_captured and self.live else None,
+                "frames_drained": self.frames_drained,
+                "connected": self.connected,
+                "reconnects": self.reconnects,
+                # Age of the frame behind the latest detections, i.e. how far they lag the source
+                "frame_age_ms": round((time.time() - self.last_captured_at) * 1000) if self.last_captured_at else None,
+            }
@@ -0,0 +1,225 @@
+import importlib.util
+import time
+
+import cv2
+
+from app.utils.logger import get_logger, create_log_message
+
+logger = get_logger(__name__)
+
+OPENCV = "opencv"
+PYAV = "pyav"
+DECODE_BACKENDS = (OPENCV, PYAV)
+
+
+def pyav_available():
+    return importlib.util.find_spec("av") is not None
+
+
+def output_size(width, height, max_side):
+    # Same aspect ratio with the longer side at most `max_side`; None when the frame is already small enough
+    if not max_side or not width or not height or max(width, height) <= max_side:
+        return None
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class OpenCVCapture:
+    """cv2.VideoCapture with a decoder thread count and an optional output size.
+
+    OpenCV cannot scale inside the decoder, so frames are resized right after
+    decoding, before they are queued for inference.
+    """
+
+    backend = OPENCV
+
+    def __init__(self, source, threads=0, timeout=None):
+        params = [cv2.CAP_PROP_N_THREADS, threads] if threads else []
+        if timeout:
+            # Without a read timeout, a stalled stream blocks read() forever and is never reconnected
+            params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(timeout * 1000), cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(timeout * 1000)]
+        self.vid = cv2.VideoCapture(source, cv2.CAP_ANY, params)
+        if str(source).startswith("rtsp://"):
+            # Keep as few decoded frames as possible waiting inside the backend
+            self.vid.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.size = None
+
+    def set_output_size(self, size):
+        self.size = size
+
+    def read(self):
+        success, frame = self.vid.read()
+        if success and self.size is not None:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return success, frame
+
+    def grab(self):
+        return self.vid.grab()
+
+    def retrieve(self):
+        success, frame = self.vid.retrieve()
+        if success and self.size is not None:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return success, frame
+
+    def get(self, prop):
+        return self.vid.get(prop)
+
+    def set(self, prop, value):
+        return self.vid.set(prop, value)
+
+    def isOpened(self):
+        return self.vid.isOpened()
+
+    def release(self):
+        self.vid.release()
+
+
+class PyAVCapture:
+    """The part of the cv2.VideoCapture interface used by the tracker, on top of PyAV (FFmpeg).
+
+    Frames are decoded with FFmpeg's frame and slice threading, and scaled to the
+    output size by the same swscale pass that converts them to BGR.
+    """
+
+    backend = PYAV
+
+    def __init__(self, source, threads=0, timeout=None):
+        import av
+
+        self.av = av
+        # Low-delay flags stop FFmpeg from buffering stream input
+        options = {"rtsp_transport": "tcp", "fflags": "nobuffer", "flags": "low_delay"} if str(source).startswith("rtsp://") else {}
+        self.container = None
+        self.grabbed = None
+        try:
+            self.container = av.open(str(source), options=options, timeout=timeout)
+            self.stream = self.container.streams.video[0]
+        except (av.error.FFmpegError, IndexError) as e:
+            logger.error(create_log_message(event="pyav_open_error", error=str(e), input_source=source))
+            if self.container is not None:
+                self.container.close()
+                self.container = None
+            return
+        self.stream.thread_type = "AUTO"
+        if threads:
+            self.stream.codec_context.thread_count = threads
+        self.frames = self.container.decode(self.stream)
+        self.size = None
+
+    def set_output_size(self, size):
+        self.size = size
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def grab(self):
+        # Decodes the next frame without converting it
+        self.grabbed = None
+        if self.container is None:
+            return False
+        try:
+            self.grabbed = next(self.frames)
+        except StopIteration:
+            return False
+        except self.av.error.FFmpegError as e:
+            logger.error(create_log_message(event="pyav_decode_error", error=str(e)))
+            return False
+        return True
+
+    def retrieve(self):
+        frame = self.grabbed
+        if frame is None:
+            return False, None
+        width, height = self.size if self.size is not None else (frame.width, frame.height)
+        return True, frame.to_ndarray(format="bgr24", width=width, height=height)
+
+    def get(self, prop):
+        if self.container is None:
+            return 0
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.stream.codec_context.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.stream.codec_context.height
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.stream.average_rate or 0)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.stream.frames
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            # Presentation time of the last grabbed frame, from the start of the stream like OpenCV's
+            if self.grabbed is None or self.grabbed.pts is None:
+                return 0
+            start = self.stream.start_time or 0
+            return float((self.grabbed.pts - start) * self.stream.time_base * 1000)
+        return 0
+
+    def set(self, prop, value):
+        # Only rewinding is supported, which is what looping a video file needs
+        if self.container is None or prop != cv2.CAP_PROP_POS_FRAMES or value != 0:
+            return False
+        self.container.seek(0)
+        self.frames = self.container.decode(self.stream)
+        return True
+
+    def isOpened(self):
+        return self.container is not None
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+def open_capture(source, backend=OPENCV, threads=0, timeout=None, size=None):
+    # `size`: (width, height) frames are decoded to, None for the source size
+    capture = PyAVCapture(source, threads, timeout) if backend == PYAV else OpenCVCapture(source, threads, timeout)
+    if size and capture.isOpened():
+        capture.set_output_size(size)
+    return capture
+
+
+def measure_decode(source, backend, threads=0, frames=30, size_for=None):
+    # Mean decode time per frame in ms over the first `frames` frames, None if the source cannot be decoded.
+    # `size_for(width, height)` gives the output size frames are decoded to, as the tracker will
+    capture = open_capture(source, backend, threads)
+    try:
+        if not capture.isOpened():
+            return None
+        size = size_for(int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))) if size_for else None
+        if size:
+            capture.set_output_size(size)
+        capture.read()  # Opening the decoder is not part of the per-frame cost
+        decoded = 0
+        start = time.perf_counter()
+        for _ in range(frames):
+            if not capture.read()[0]:
+                break
+            decoded += 1
+        return round((time.perf_counter() - start) * 1000 / decoded, 3) if decoded else None
+    finally:
+        capture.release()
+
+
+def select_decode_backend(source, backend="auto", threads=0, probe_frames=30, is_file=False, size_for=None):
+    """Returns (backend, measured costs in ms per frame).
+
+    "auto" decodes the first frames of a video file with each available backend
+    and keeps the cheaper one. Frames are decoded at the output size given by
+    ``size_for(width, height)``, so the costs include OpenCV's resize and PyAV's
+    scaling during conversion. Cameras and streams use OpenCV, which also opens
+    camera indices, unless a backend is configured.
+    """
+    if backend != "auto":
+        if backend not in DECODE_BACKENDS:
+            raise ValueError(f"Unknown decode backend: {backend}")
+        if backend == PYAV and not pyav_available():
+            logger.warning(create_log_message(event="decode_backend_unavailable", backend=backend, fallback=OPENCV))
+            return OPENCV, {}
+        return backend, {}
+    if not is_file or not pyav_available():
+        return OPENCV, {}
+    costs = {candidate: measure_decode(source, candidate, threads, probe_frames, size_for) for candidate in DECODE_BACKENDS}
+    measured = {candidate: cost for candidate, cost in costs.items() if cost is not None}
+    return (min(measured, key=measured.get) if measured else OPENCV), costs
@@ -0,0 +1,223 @@
+import os
+import threading
+from concurrent.futures import Future
+
+import torch
+import yaml
+from ultralytics import YOLO
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import YAML, IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+from app.utils.logger import get_logger, create_log_message
+from app.utils.shared_state import inference_services
+from app.vision.backends import PYTORCH, OPENVINO, select_device, select_backend, export_model, measure_latency
+from app.vision.scheduler import FrameScheduler
+
+logger = get_logger(__name__)
+
+# Load configuration
+with open("config.yaml", "r") as config_file:
+    config = yaml.safe_load(config_file)
+
+INFERENCE_SETTINGS = config.get("inference", {})
+
+TRACKER_CONFIG = "bytetrack.yaml"
+
+
+def load_model(model_name, settings=None, measure=True):
+    # `measure` times the model at startup (with inference.measure_latency); extra copies of a model skip it
+    settings = INFERENCE_SETTINGS if settings is None else settings
+    if model_name.startswith("models/"):
+        model_path = model_name
+    elif os.path.isfile(model_name):
+        model_path = model_name
+    else:
+        model_path = f"models/{model_name}"
+    logger.info(create_log_message(event="load_model", model_path=model_path))
+    model = YOLO(model_path)
+
+    device = select_device(settings.get("device", "auto"))
+    backend = select_backend(settings.get("backend", "auto"), device)
+    imgsz = settings.get("imgsz") or 640
+    # Only OpenVINO exports are quantized by ultralytics
+    int8 = bool(settings.get("int8", False)) and backend == OPENVINO
+    if backend != PYTORCH and model_path.endswith(".pt"):
+        try:
+            exported = export_model(model, getattr(model, "ckpt_path", None) or model_path, backend, imgsz, int8)
+            model = YOLO(str(exported), task="detect")
+            device = "cpu"
+        except Exception as e:
+            logger.warning(create_log_message(event="model_export_failed", backend=backend, error=str(e), model_path=model_path))
+            backend, int8 = PYTORCH, False
+
+    # Default device for every predict/track call on this model
+    model.overrides["device"] = device
+    latency_ms = measure_latency(model, imgsz) if measure and settings.get("measure_latency", True) else None
+    logger.info(
+        create_log_message(event="inference_backend", backend=backend, device=device, int8=int8, imgsz=imgsz, latency_ms=latency_ms, model_path=model_path)
+    )
+    return model
+
+
+def create_tracker():
+    tracker_config = IterableSimpleNamespace(**YAML.load(check_yaml(TRACKER_CONFIG)))
+    return BYTETracker(args=tracker_config)
+
+
+def apply_tracker(tracker, result):
+    # Mirrors ultralytics' on_predict_postprocess_end for a single stream
+    tracks = tracker.update(result.boxes.cpu().numpy(), result.orig_img)
+    if len(tracks) == 0:
+        if any(not t.is_activated for t in tracker.tracked_stracks):
+            return result[:0]
+        return result
+    idx = tracks[:, -1].astype(int)
+    result = result[idx]
+    result.update(boxes=torch.as_tensor(tracks[:, :-1], device=result.boxes.data.device))
+    return result
+
+
+class InferenceRequest:
+    __slots__ = ("instance_name", "frame", "classes", "imgsz", "future")
+
+    def __init__(self, instance_name, frame, classes, imgsz=None):
+        self.instance_name = instance_name
+        self.frame = frame
+        self.classes = classes
+        self.imgsz = imgsz
+        self.future = Future()
+
+
+class InferenceService:
+    """Runs a fixed pool of model copies for every instance and batches their frames together.
+
+    Frames submitted by the instances are collected into micro-batches of at most
+    ``max_batch_size`` frames, waiting no longer than ``max_wait_ms`` for the batch
+    to fill. Detection runs once per batch, then each result goes through the
+    ByteTrack state of the instance that submitted the frame. There is one worker
+    thread per model copy (``model`` and ``worker_models``), and a FrameScheduler
+    decides which instance's frames they run next.
+    """
+
+    services = {}
+    services_lock = threading.Lock()
+
+    @classmethod
+    def get_service(cls, model_name, max_batch_size=8, max_wait_ms=10, workers=1):
+        with cls.services_lock:
+            if model_name not in cls.services:
+                # Worker threads cannot share a model: each one runs its own copy, timed once for all of them
+                models = [load_model(model_name, measure=index == 0) for index in range(max(1, int(workers)))]
+                cls.services[model_name] = InferenceService(models[0], model_name, max_batch_size, max_wait_ms, worker_models=models[1:]).start()
+                inference_services[model_name] = cls.services[model_name]
+                logger.info(
+                    create_log_message(
+                        event="inference_service_created", model=model_name, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, workers=len(models)
+                    )
+                )
+            return cls.services[model_name]
+
+    def __init__(self, model, model_name=None, max_batch_size=8, max_wait_ms=10, device=None, worker_models=()):
+        self.model = model
+        self.model_name = model_name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000
+        self.device = device
+        self.scheduler = FrameScheduler()
+        self.trackers = {}
+        self.trackers_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.batches = 0
+        self.frames = 0
+        self.threads = [
+            threading.Thread(target=self._run, args=(worker_model,), name=f"inference-{model_name}-{index}", daemon=True)
+            for index, worker_model in enumerate([model, *worker_models])
+        ]
+
+    @property
+    def names(self):
+        return self.model.names
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def register(self, instance_name, target_fps=None, priority=1.0):
+        with self.trackers_lock:
+            if instance_name not in self.trackers:
+                self.trackers[instance_name] = create_tracker()
+        self.scheduler.register(instance_name, target_fps, priority)
+
+    def release(self, instance_name):
+        with self.trackers_lock:
+            self.trackers.pop(instance_name, None)
+        self.scheduler.unregister(instance_name)
+
+    def wait_turn(self, instance_name):
+        # Called by an instance's loop before it reads a frame, to run at its target FPS
+        return self.scheduler.wait_turn(instance_name)
+
+    def submit(self, instance_name, frame, classes=None, imgsz=None):
+        # Instances that were not registered run unpaced; registered ones keep their schedule
+        if instance_name not in self.trackers:
+            self.register(instance_name)
+        request = InferenceRequest(instance_name, frame, classes, imgsz)
+        self.scheduler.push(request)
+        return request.future
+
+    def track(self, instance_name, frame, classes=None, imgsz=None):
+        # Drop-in replacement for process_frame(): returns a list with one Results object
+        return self.submit(instance_name, frame, classes, imgsz).result()
+
+    def _run(self, model):
+        while True:
+            # Each instance has at most one frame in flight, so the scheduler stops waiting once all of them are in
+            batch = self.scheduler.pop_batch(self.max_batch_size, self.max_wait)
+            # The class filter and inference size are applied by the model, so frames are grouped by both
+            groups = {}
+            for request in batch:
+                key = (tuple(request.classes) if request.classes is not None else None, request.imgsz)
+                groups.setdefault(key, []).append(request)
+            for requests in groups.values():
+                try:
+                    self._run_group(model, requests)
+                finally:
+                    self.scheduler.complete([request.instance_name for request in requests])
+
+    def _run_group(self, model, requests):
+        try:
+            # Without an explicit device the model uses the one selected by load_model()
+            options = {"imgsz": requests[0].imgsz} if requests[0].imgsz else {}
+            if self.device:
+                options["device"] = self.device
+            results = model.predict([r.frame for r in requests], classes=requests[0].classes, verbose=False, **options)
+            with self.stats_lock:
+                self.batches += 1
+                self.frames += len(requests)
+        except Exception as e:
+            logger.error(create_log_message(event="inference_error", error=str(e), model=self.model_name, batch_size=len(requests)))
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        for request, result in zip(requests, results):
+            try:
+                with self.trackers_lock:
+                    tracker = self.trackers.get(request.instance_name) or create_tracker()
+                request.future.set_result([apply_tracker(tracker, result)])
+            except Exception as e:
+                logger.error(create_log_message(event="tracker_update_error", error=str(e), instance=request.instance_name))
+                request.future.set_exception(e)
+
+    def get_stats(self):
+        return {
+            "model": self.model_name,
+            "instances": len(self.trackers),
+            "queue_depth": len(self.scheduler.queue),
+            "workers": len(self.threads),
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0,
+        }
@@ -0,0 +1,58 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Decides whether a frame differs enough from the last processed one to run inference.
+
+    Frames are compared on a small grayscale copy: a pixel counts as changed when
+    its difference exceeds `pixel_threshold`, and the frame is static when fewer
+    than `min_changed_fraction` of the pixels changed. The reference is the last
+    frame that went through inference, so slow changes accumulate until they pass
+    the threshold. Inference is forced at least every `max_skip_seconds` so the
+    tracker still sees the scene regularly.
+    """
+
+    def __init__(self, width=64, pixel_threshold=25, min_changed_fraction=0.002, max_skip_seconds=1.0):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip_seconds = max_skip_seconds
+        self.reference = None
+        self.reference_time = 0
+        self.processed = 0
+        self.skipped = 0
+        self.last_changed_fraction = None
+
+    def thumbnail(self, frame):
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Blur away sensor noise so it does not register as motion
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def should_process(self, frame, now=None):
+        now = time.time() if now is None else now
+        thumbnail = self.thumbnail(frame)
+        if self.reference is not None and self.reference.shape == thumbnail.shape and now - self.reference_time < self.max_skip_seconds:
+            changed = cv2.absdiff(thumbnail, self.reference) > self.pixel_threshold
+            self.last_changed_fraction = float(np.count_nonzero(changed)) / changed.size
+            if self.last_changed_fraction < self.min_changed_fraction:
+                self.skipped += 1
+                return False
+        self.reference = thumbnail
+        self.reference_time = now
+        self.processed += 1
+        return True
+
+    def get_stats(self):
+        total = self.processed + self.skipped
+        return {
+            "processed_frames": self.processed,
+            "skipped_frames": self.skipped,
+            "skipped_ratio": round(self.skipped / total, 4) if total else 0.0,
+            "last_changed_fraction": self.last_changed_fraction,
+        }
@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+
+class RegionOfInterest:
+    """Crops (and for polygons, masks) frames to the part of the scene that is tracked.
+
+    The region is given either as a rectangle ``[x1, y1, x2, y2]`` or as a list of
+    polygon points ``[[x, y], ...]``. Coordinates are pixels, or fractions of the
+    frame size when all of them are between 0 and 1. Frames are cropped to the
+    bounding rectangle of the region; pixels of that rectangle outside a polygon
+    are blacked out. ``offset`` maps boxes from the crop back to the full frame.
+    """
+
+    def __init__(self, rect=None, polygon=None):
+        if (rect is None) == (polygon is None):
+            raise ValueError("A region of interest needs exactly one of 'rect' or 'polygon'")
+        if rect is not None:
+            x1, y1, x2, y2 = rect
+            self.points = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float64)
+            self.is_polygon = False
+        else:
+            self.points = np.array(polygon, dtype=np.float64)
+            if self.points.ndim != 2 or self.points.shape[0] < 3 or self.points.shape[1] != 2:
+                raise ValueError("A polygon region of interest needs at least 3 [x, y] points")
+            self.is_polygon = True
+        self.normalized = bool(np.all((self.points >= 0) & (self.points <= 1)))
+        self.shape = None
+        self.bounds = None
+        self.mask = None
+
+    @classmethod
+    def from_config(cls, settings):
+        # `roi: [x1, y1, x2, y2]`, `roi: {rect: [...]}` or `roi: {polygon: [[x, y], ...]}`
+        if not settings:
+            return None
+        if isinstance(settings, dict):
+            return cls(rect=settings.get("rect"), polygon=settings.get("polygon"))
+        return cls(rect=settings)
+
+    def resolve(self, shape):
+        # Pixel bounds and mask depend on the frame size, computed once per size
+        height, width = shape[:2]
+        points = self.points * [width, height] if self.normalized else self.points
+        points = np.round(points).astype(np.int32)
+        x1, y1 = np.clip(points.min(axis=0), 0, [width - 1, height - 1])
+        x2, y2 = np.clip(points.max(axis=0), [x1 + 1, y1 + 1], [width, height])
+        self.bounds = (int(x1), int(y1), int(x2), int(y2))
+        self.mask = None
+        if self.is_polygon:
+            self.mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+            cv2.fillPoly(self.mask, [points - [x1, y1]], 255)
+        self.shape = shape[:2]
+
+    def scaled(self, x_factor, y_factor):
+        # Same region on frames resized by the given factors; fractions of the frame size are unchanged
+        if self.normalized:
+            return self
+        points = self.points * [x_factor, y_factor]
+        return RegionOfInterest(polygon=points) if self.is_polygon else RegionOfInterest(rect=[*points[0], *points[2]])
+
+    @property
+    def offset(self):
+        return self.bounds[:2] if self.bounds else (0, 0)
+
+    def apply(self, frame):
+        if self.shape != frame.shape[:2]:
+            self.resolve(frame.shape)
+        x1, y1, x2, y2 = self.bounds
+        crop = frame[y1:y2, x1:x2]
+        if self.mask is not None:
+            return cv2.bitwise_and(crop, crop, mask=self.mask)
+        return np.ascontiguousarray(crop)
+
+    def area_fraction(self):
+        # Share of the frame's pixels still sent to the model
+        if self.shape is None:
+            return None
+        x1, y1, x2, y2 = self.bounds
+        return round((x2 - x1) * (y2 - y1) / (self.shape[0] * self.shape[1]), 4)
@@ -0,0 +1,193 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+# Achieved FPS is measured over this many seconds
+RATE_WINDOW_SECONDS = 5.0
+# Share of the workers an instance without a target FPS is entitled to, expressed as a target
+UNLIMITED_SHARE_FPS = 30.0
+# An instance still counts as contending for the workers this long after its last frame completed,
+# while it handles the results and reads its next frame
+CONTENTION_GRACE_SECONDS = 0.1
+
+
+class InstanceSchedule:
+    __slots__ = ("target_fps", "priority", "period", "stride", "next_turn", "virtual_time", "pending", "gated", "pacing", "last_completed", "registered_at", "turns", "frames", "wait_ms")
+
+    def __init__(self, target_fps=None, priority=1.0):
+        self.configure(target_fps, priority)
+        self.next_turn = 0.0
+        # Virtual time of the instance's next frame: advanced by `stride` for every frame it is let through
+        self.virtual_time = 0.0
+        # Frames queued or running, whether the instance is held back by the fair share or sleeping until its
+        # next frame is due, and when its last frame completed
+        self.pending = 0
+        self.gated = False
+        self.pacing = False
+        self.last_completed = 0.0
+        self.registered_at = time.monotonic()
+        # Monotonic times of the instance's turns within the rate window; frames skipped by the
+        # motion gate take a turn without running inference, so they count towards the achieved FPS
+        self.turns = deque()
+        self.frames = 0
+        # Moving average of the time frames spend queued before a worker takes them
+        self.wait_ms = 0.0
+
+    def configure(self, target_fps, priority):
+        self.target_fps = target_fps
+        self.priority = priority
+        # Seconds between two frames of the instance; 0 runs it as fast as its share allows
+        self.period = 1 / target_fps if target_fps else 0.0
+        self.stride = 1 / ((target_fps or UNLIMITED_SHARE_FPS) * priority)
+
+    def contending(self, now):
+        return self.pending > 0 or self.gated or (not self.pacing and now - self.last_completed < CONTENTION_GRACE_SECONDS)
+
+
+class FrameScheduler:
+    """Shares a pool of inference workers between instances with a target FPS and a priority.
+
+    Each instance is paced to its target: ``wait_turn`` holds its loop until its
+    next frame is due, so it reads the freshest frame and leaves the workers to
+    the others in between. When the workers cannot keep up, ``wait_turn`` also
+    holds back the instances that got more than their share (stride scheduling,
+    with a share proportional to target FPS times priority), so every instance
+    falls below its target in proportion to it instead of the fastest loops
+    taking all the frames. Submitted frames are served earliest deadline first,
+    the deadline being the submission time plus the instance's frame period
+    divided by its priority.
+    """
+
+    def __init__(self):
+        self.instances = {}
+        self.queue = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        # Frames taken by workers and not completed yet
+        self.in_flight = 0
+
+    def register(self, instance_name, target_fps=None, priority=1.0):
+        # Sets the instance's target FPS (None runs it unpaced, also when it had a target) and priority
+        target_fps = None if target_fps is None else float(target_fps)
+        priority = 1.0 if priority is None else float(priority)
+        if target_fps is not None and target_fps <= 0:
+            raise ValueError(f"target_fps of instance '{instance_name}' must be positive, or empty for no target (got {target_fps:g})")
+        if priority <= 0:
+            raise ValueError(f"priority of instance '{instance_name}' must be positive (got {priority:g})")
+        with self.condition:
+            schedule = self.instances.get(instance_name)
+            if schedule is None:
+                self.instances[instance_name] = InstanceSchedule(target_fps, priority)
+            else:
+                schedule.configure(target_fps, priority)
+
+    def unregister(self, instance_name):
+        with self.condition:
+            self.instances.pop(instance_name, None)
+            self.condition.notify_all()
+
+    def wait_turn(self, instance_name):
+        # Sleeps until the instance's next frame is due and it is within its share; returns the time waited in seconds
+        started = time.monotonic()
+        with self.condition:
+            schedule = self.instances.get(instance_name)
+            if schedule is None:
+                return 0.0
+            delay = max(0.0, schedule.next_turn - started)
+            idle = delay > 0 or not schedule.contending(started)
+            # An instance running late is not allowed to catch up with a burst
+            schedule.next_turn = max(schedule.next_turn, started) + schedule.period
+            schedule.pacing = delay > 0
+        if delay:
+            time.sleep(delay)
+        with self.condition:
+            schedule.pacing = False
+            others = self.contending_times(schedule)
+            # An instance that was idle keeps at most one frame of credit over the instances that kept running
+            if idle and others:
+                schedule.virtual_time = max(schedule.virtual_time, min(others) - schedule.stride)
+            schedule.gated = True
+            while instance_name in self.instances:
+                others = self.contending_times(schedule)
+                if not others or schedule.virtual_time <= min(others) + schedule.stride:
+                    break
+                # Woken up by completions; the timeout covers instances that stop contending without one
+                self.condition.wait(0.1)
+            schedule.gated = False
+            schedule.virtual_time += schedule.stride
+            now = time.monotonic()
+            schedule.turns.append(now)
+            while schedule.turns[0] < now - RATE_WINDOW_SECONDS:
+                schedule.turns.popleft()
+            self.condition.notify_all()
+        return time.monotonic() - started
+
+    def contending_times(self, schedule):
+        now = time.monotonic()
+        return [other.virtual_time for other in self.instances.values() if other is not schedule and other.contending(now)]
+
+    def push(self, request):
+        with self.condition:
+            schedule = self.instances.get(request.instance_name)
+            if schedule is not None:
+                schedule.pending += 1
+            now = time.monotonic()
+            deadline = now + (schedule.period / schedule.priority if schedule is not None else 0.0)
+            heapq.heappush(self.queue, (deadline, next(self.sequence), now, request))
+            self.condition.notify()
+
+    def pop_batch(self, max_batch_size, max_wait):
+        # Earliest-deadline requests, waiting up to max_wait for the instances that have no frame in flight yet
+        with self.condition:
+            while not self.queue:
+                self.condition.wait()
+            wait_until = time.monotonic() + max_wait
+            while len(self.queue) < min(max_batch_size, len(self.instances) - self.in_flight):
+                remaining = wait_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            now = time.monotonic()
+            batch = []
+            while self.queue and len(batch) < max_batch_size:
+                _, _, submitted_at, request = heapq.heappop(self.queue)
+                schedule = self.instances.get(request.instance_name)
+                if schedule is not None:
+                    schedule.wait_ms += 0.1 * ((now - submitted_at) * 1000 - schedule.wait_ms)
+                batch.append(request)
+            self.in_flight += len(batch)
+            return batch
+
+    def complete(self, instance_names):
+        with self.condition:
+            now = time.monotonic()
+            self.in_flight -= len(instance_names)
+            for instance_name in instance_names:
+                schedule = self.instances.get(instance_name)
+                if schedule is None:
+                    continue
+                schedule.pending -= 1
+                schedule.last_completed = now
+                schedule.frames += 1
+            self.condition.notify_all()
+
+    def get_stats(self, instance_name):
+        with self.condition:
+            schedule = self.instances.get(instance_name)
+            if schedule is None:
+                return None
+            now = time.monotonic()
+            recent = sum(1 for turn in schedule.turns if turn >= now - RATE_WINDOW_SECONDS)
+            window = min(RATE_WINDOW_SECONDS, now - schedule.registered_at)
+            achieved_fps = round(recent / window, 2) if window > 0 else 0.0
+            return {
+                "target_fps": schedule.target_fps,
+                "achieved_fps": achieved_fps,
+                # Only judged over a full window, and with 10% of slack for the pacing jitter
+                "below_target": bool(schedule.target_fps) and window >= RATE_WINDOW_SECONDS and achieved_fps < 0.9 * schedule.target_fps,
+                "priority": schedule.priority,
+                "inference_frames": schedule.frames,
+                "queue_wait_ms": round(schedule.wait_ms, 2),
+            }
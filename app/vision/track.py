@@ -1,15 +1,35 @@
 import os
+import logging
 import time
 import platform
 import sys
 import yaml
 import json
 import cv2
-from ultralytics import YOLO
+import numpy as np
 from collections import Counter
 
-from app.utils.shared_state import latest_detections, camera_info, add_detection
+from app.utils.shared_state import (
+    latest_detections,
+    add_detection,
+    capture_stats,
+    motion_gates,
+    zone_engines,
+    configure_history,
+    bump_detection_version,
+    set_instance_state,
+    instance_status,
+)
 from app.utils.person_counter import PersonCounter
+from app.utils.frame_record import FrameRecord, STAGES, as_record
+from app.utils.detection_stream import get_broadcaster
+from app.utils.metrics import InstanceStageMetrics, instance_snapshot
+from app.vision.capture import FrameGrabber, DROP_OLDEST, BLOCK
+from app.vision.decode import OPENCV, open_capture, output_size, select_decode_backend
+from app.vision.inference import InferenceService, load_model
+from app.vision.motion import MotionGate
+from app.vision.roi import RegionOfInterest
+from app.vision.zones import ZoneEngine
 from app.utils.logger import get_logger, create_log_message
 
 logger = get_logger(__name__)
@@ -24,6 +44,9 @@ os.environ["OPENCV_LOG_LEVEL"] = "ERROR"
 # Check if running on MacOS
 MACOS = platform.system() == "Darwin"
 
+# Inference size Ultralytics uses when none is configured
+DEFAULT_IMGSZ = 640
+
 
 def sticky_print(message):
     sys.stdout.write("\033[H\033[J")
@@ -31,69 +54,178 @@ def sticky_print(message):
     sys.stdout.flush()
 
 
-def initialize_video_capture(camera_id):
-    vid = cv2.VideoCapture(camera_id)
+def initialize_video_capture(camera_id, backend=OPENCV, threads=0, timeout=None):
+    vid = open_capture(camera_id, backend, threads, timeout)
     if not vid.isOpened():
         logger.error(create_log_message(event="video_capture_error", error="Failed to open video source", camera_id=camera_id))
         raise ValueError(f"Failed to open video source: {camera_id}")
     return vid
 
 
-def load_model(model_name):
-    if model_name.startswith("models/"):
-        model_path = model_name
-    elif os.path.isfile(model_name):
-        model_path = model_name
+def get_instance_config(instance_name):
+    for instance_config in config.get("instances", []):
+        if instance_config.get("name") == instance_name:
+            return instance_config
+    return {}
+
+
+def get_capture_settings(instance_name, is_file):
+    # Per-instance settings override the global ones
+    settings = {**config.get("capture", {}), **get_instance_config(instance_name).get("capture", {})}
+    drop_policy = settings.get("drop_policy", "auto")
+    if drop_policy == "auto":
+        drop_policy = BLOCK if is_file else DROP_OLDEST
+    return drop_policy, int(settings.get("queue_size", 1))
+
+
+def get_live_settings(instance_name):
+    # Draining and reconnection of cameras and streams; per-instance settings override the global ones
+    return {**config.get("capture", {}).get("live", {}), **get_instance_config(instance_name).get("capture", {}).get("live", {})}
+
+
+def make_reopen(input_source, backend, threads, timeout, decode_size):
+    # Opens the source again as it was set up, for the capture thread to reconnect
+    def reopen():
+        return open_capture(input_source, backend, threads, timeout, decode_size)
+
+    return reopen
+
+
+def get_decode_settings(instance_name):
+    # Per-instance settings override the global ones
+    return {**config.get("decode", {}), **get_instance_config(instance_name).get("decode", {})}
+
+
+def get_decode_size(width, height, roi, imgsz):
+    # The model resizes what it is given to the inference size anyway, so the region it is given
+    # (the region of interest, or the whole frame) is decoded at about that size
+    target = max(imgsz) if isinstance(imgsz, (list, tuple)) else imgsz or DEFAULT_IMGSZ
+    if roi:
+        roi.resolve((height, width))
+        x1, y1, x2, y2 = roi.bounds
+        region_side = max(x2 - x1, y2 - y1)
     else:
-        model_path = f"models/{model_name}"
-    logger.info(create_log_message(event="load_model", model_path=model_path))
-    return YOLO(model_path)
+        region_side = max(width, height)
+    return output_size(width, height, max(width, height) * target / region_side)
+
+
+def get_inference_service(model_name):
+    # Returns None when every instance should load and run its own model
+    settings = config.get("inference", {})
+    if not settings.get("shared_model", False):
+        return None
+    return InferenceService.get_service(model_name, settings.get("max_batch_size", 8), settings.get("max_wait_ms", 10), settings.get("workers", 1))
+
+
+def get_schedule_settings(instance_name):
+    # Returns the instance's target FPS (None runs it as fast as its share of the inference workers allows) and priority
+    instance_config = get_instance_config(instance_name)
+    target_fps = instance_config.get("target_fps", config.get("inference", {}).get("target_fps"))
+    return target_fps, instance_config.get("priority", 1.0)
+
+
+def get_motion_gate(instance_name):
+    # Returns None when every frame should go through inference
+    settings = {**config.get("motion", {}), **get_instance_config(instance_name).get("motion", {})}
+    if not settings.get("enabled", False):
+        return None
+    return MotionGate(
+        width=settings.get("width", 64),
+        pixel_threshold=settings.get("pixel_threshold", 25),
+        min_changed_fraction=settings.get("min_changed_fraction", 0.002),
+        max_skip_seconds=settings.get("max_skip_seconds", 1.0),
+    )
+
+
+def get_zone_engine(instance_name):
+    # Returns None when the instance has no zones or lines
+    instance_config = get_instance_config(instance_name)
+    if not instance_config.get("zones") and not instance_config.get("lines"):
+        return None
+    settings = {**config.get("analytics", {}), **instance_config.get("analytics", {})}
+    return ZoneEngine(
+        instance_config.get("zones"),
+        instance_config.get("lines"),
+        anchor=settings.get("anchor", "bottom"),
+        track_ttl_seconds=settings.get("track_ttl_seconds", 5.0),
+        max_events=settings.get("max_events", 100_000),
+    )
 
 
-def process_frame(model, frame, classes):
-    return model.track(frame, persist=True, classes=classes, verbose=False, device="mps", tracker="bytetrack.yaml")
+def get_roi_settings(instance_name):
+    # Returns the instance's region of interest (None for the full frame) and inference size (None for the model's)
+    instance_config = get_instance_config(instance_name)
+    roi = RegionOfInterest.from_config(instance_config.get("roi"))
+    imgsz = instance_config.get("imgsz", config.get("inference", {}).get("imgsz"))
+    return roi, imgsz
 
 
-def update_detections(results, model, input_source, fps, instance_name):
+def process_frame(model, frame, classes, imgsz=None):
+    options = {"imgsz": imgsz} if imgsz else {}
+    return model.track(frame, persist=True, classes=classes, verbose=False, tracker="bytetrack.yaml", **options)
+
+
+def update_detections(results, model, input_source, fps, instance_name, offset=(0, 0), scale=(1.0, 1.0), captured_at=None):
     timestamp = int(time.time() * 1000)
     if instance_name not in latest_detections:
         latest_detections[instance_name] = []
+    had_detections = bool(latest_detections[instance_name])
     latest_detections[instance_name].clear()
     if results and len(results[0].boxes) > 0:
-        boxes = results[0].boxes
-        detection = {
-            "timestamp": timestamp,
-            "input_source": input_source,
-            "fps": fps,
-            "tracked_objects": [
-                {
-                    "id": int(id) if id is not None else None,
-                    "label": model.names[int(cls)],
-                    "box": box,
-                    "confidence": float(conf),
-                }
-                for id, cls, box, conf in zip(
-                    boxes.id.int().cpu().tolist() if boxes.id is not None else [None] * len(boxes),
-                    boxes.cls.int().cpu().tolist(),
-                    boxes.xywh.cpu().tolist(),
-                    boxes.conf.cpu().tolist(),
-                )
-            ],
-            "processing_time": {
-                "preprocess": results[0].speed["preprocess"],
-                "inference": results[0].speed["inference"],
-                "postprocess": results[0].speed["postprocess"],
-            },
-        }
+        # A single device transfer of the box rows; dicts for the API are only built when requested
+        detection = FrameRecord.from_box_data(
+            timestamp,
+            input_source,
+            fps,
+            results[0].boxes.data.cpu().numpy(),
+            model.names,
+            tuple(results[0].speed[stage] for stage in STAGES),
+            offset,
+            scale,
+            captured_at,
+        )
         latest_detections[instance_name].append(detection)
         add_detection(detection, instance_name)
+        bump_detection_version(instance_name)
+        get_broadcaster(instance_name).publish(detection)
 
-        logger.debug(create_log_message(event="update_detections", input_source=input_source, objects_count=len(detection["tracked_objects"]), instance=instance_name))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(create_log_message(event="update_detections", input_source=input_source, objects_count=len(detection), instance=instance_name))
 
         return detection
+    if had_detections:
+        bump_detection_version(instance_name)
+        # Tell stream subscribers the scene is empty now
+        get_broadcaster(instance_name).publish({"timestamp": timestamp, "input_source": input_source, "fps": fps, "tracked_objects": []})
     return None
 
 
+def warm_up(model, inference_service, instance_name, frame_shape, roi, classes, imgsz):
+    # The first inference pays for lazy initialization and memory allocation; run it on a blank frame before going live
+    frame = np.zeros(frame_shape, dtype=np.uint8)
+    if roi:
+        frame = roi.apply(frame)
+    start = time.time()
+    if inference_service:
+        inference_service.track(instance_name, frame, classes, imgsz)
+    else:
+        process_frame(model, frame, classes, imgsz)
+    return time.time() - start
+
+
+def refresh_detections(fps, instance_name, captured_at=None):
+    # A static frame would give the same result: re-publish the last detection as seen now
+    previous = latest_detections.get(instance_name)
+    if not previous:
+        return None
+    detection = as_record(previous[-1]).with_time(int(time.time() * 1000), fps, captured_at)
+    latest_detections[instance_name][-1] = detection
+    add_detection(detection, instance_name)
+    bump_detection_version(instance_name)
+    get_broadcaster(instance_name).publish(detection)
+    return detection
+
+
 def display_frame(frame, results, fps, fps_flag):
     if MACOS:
         annotated_frame = results[0].plot()
@@ -134,7 +266,18 @@ def log_tracking_info(frame_count, fps, avg_fps, elapsed_time, detected_objects,
     logger.info(log_message)
 
 
-def track(input_source, model_name=None, show_flag=False, fps_flag=False, track_all=False, loop_video=True, verbose=False, instance_name=None):
+def track(
+    input_source,
+    model_name=None,
+    show_flag=False,
+    fps_flag=False,
+    track_all=False,
+    loop_video=True,
+    verbose=False,
+    instance_name=None,
+    publisher=None,
+    timer=None,
+):
     logger.info(
         create_log_message(
             event="tracking_start",
@@ -150,15 +293,97 @@ def track(input_source, model_name=None, show_flag=False, fps_flag=False, track_
     )
 
     model_name = model_name or config["default_model"]
+    started_at = time.time()
+    set_instance_state(instance_name, "starting", started_at=started_at)
+    # Stage timings feed the /metrics histograms unless a caller (the benchmark) collects them itself
+    timer = timer or InstanceStageMetrics(instance_name)
 
     try:
-        model = load_model(model_name)
-        vid = initialize_video_capture(input_source)
+        inference_service = get_inference_service(model_name)
+        model = inference_service.model if inference_service else load_model(model_name)
+        is_file = isinstance(input_source, str) and os.path.isfile(input_source)
+        decode_settings = get_decode_settings(instance_name)
+        decode_threads = decode_settings.get("threads", 0)
+        roi, imgsz = get_roi_settings(instance_name)
+        downscale = decode_settings.get("downscale", True)
+
+        def decode_size_for(width, height):
+            # Frames are decoded at the inference size; boxes are scaled back to source coordinates
+            return get_decode_size(width, height, roi, imgsz) if downscale and width and height else None
+
+        # Backends are compared at the size frames will be decoded to
+        decode_backend, decode_costs = select_decode_backend(
+            input_source, decode_settings.get("backend", OPENCV), decode_threads, decode_settings.get("probe_frames", 30), is_file, decode_size_for
+        )
+        live_settings = {} if is_file else get_live_settings(instance_name)
+        read_timeout = live_settings.get("timeout_seconds")
+        vid = initialize_video_capture(input_source, decode_backend, decode_threads, read_timeout)
 
         width = int(vid.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(vid.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        source_fps = vid.get(cv2.CAP_PROP_FPS)
+        configure_history(instance_name, source_fps)
+
+        logger.info(create_log_message(event="tracking_setup", input_source=input_source, model=model_name, resolution=f"{width}x{height}", source_fps=source_fps, instance=instance_name))
+
+        if roi or imgsz:
+            logger.info(create_log_message(event="roi_setup", roi=roi.points.tolist() if roi else None, imgsz=imgsz, instance=instance_name))
+        classes = [0] if not track_all else None
+
+        decode_size = decode_size_for(width, height)
+        scale = (1.0, 1.0)
+        if decode_size:
+            vid.set_output_size(decode_size)
+            scale = (width / decode_size[0], height / decode_size[1])
+            roi = roi.scaled(1 / scale[0], 1 / scale[1]) if roi else None
+        frame_width, frame_height = decode_size or (width, height)
+        logger.info(
+            create_log_message(
+                event="decode_setup",
+                backend=decode_backend,
+                threads=decode_threads,
+                costs_ms=decode_costs or None,
+                output_size=f"{frame_width}x{frame_height}",
+                instance=instance_name,
+            )
+        )
 
-        logger.info(create_log_message(event="tracking_setup", input_source=input_source, model=model_name, resolution=f"{width}x{height}", instance=instance_name))
+        # Sources that do not report their resolution are warmed up by their first frame instead
+        if inference_service:
+            target_fps, priority = get_schedule_settings(instance_name)
+            inference_service.register(instance_name, target_fps, priority)
+            logger.info(create_log_message(event="schedule_setup", target_fps=target_fps, priority=priority, instance=instance_name))
+        if width and height:
+            set_instance_state(instance_name, "warming_up")
+            warm_up_time = warm_up(model, inference_service, instance_name, (frame_height, frame_width, 3), roi, classes, imgsz)
+            logger.info(create_log_message(event="warm_up", duration=round(warm_up_time, 3), instance=instance_name))
+        time_to_ready = round(time.time() - started_at, 3)
+        set_instance_state(instance_name, "running", time_to_ready=time_to_ready)
+        logger.info(create_log_message(event="instance_ready", time_to_ready=time_to_ready, instance=instance_name))
+
+        drop_policy, queue_size = get_capture_settings(instance_name, is_file)
+        grabber = FrameGrabber(
+            vid,
+            input_source,
+            instance_name,
+            drop_policy,
+            queue_size,
+            loop_video and is_file,
+            timer,
+            drain_threshold_ms=live_settings.get("drain_threshold_ms"),
+            reconnect=make_reopen(input_source, decode_backend, decode_threads, read_timeout, decode_size) if live_settings.get("reconnect", True) and not is_file else None,
+            backoff_initial=live_settings.get("backoff_initial_seconds", 0.5),
+            backoff_max=live_settings.get("backoff_max_seconds", 30.0),
+            max_reconnect_attempts=live_settings.get("max_reconnect_attempts", 0),
+            live=not is_file,
+        ).start()
+        capture_stats[instance_name] = grabber
+        motion_gate = get_motion_gate(instance_name)
+        motion_gates[instance_name] = motion_gate
+        zone_engine = get_zone_engine(instance_name)
+        zone_engines[instance_name] = zone_engine
+        if zone_engine:
+            logger.info(create_log_message(event="zones_setup", zones=zone_engine.zone_names, lines=zone_engine.line_names, instance=instance_name))
 
         person_counter = PersonCounter.get_counter(instance_name)
         frame_count, start_time, prev_time = 0, time.time(), 0
@@ -166,31 +391,62 @@ def track(input_source, model_name=None, show_flag=False, fps_flag=False, track_
         log_interval = 10  # Log every 10 seconds
 
         detected_objects = Counter()
+        first_detection_seen = False
 
         while True:
-            success, frame = vid.read()
+            # Holds the instance to its target FPS, so that it reads the freshest frame when its turn comes
+            if inference_service:
+                inference_service.wait_turn(instance_name)
+            success, frame = grabber.read()
             if not success:
-                if loop_video and isinstance(input_source, str) and os.path.isfile(input_source):
-                    vid.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    success, frame = vid.read()
-                if not success:
-                    logger.info(create_log_message(event="video_end", reason="End of video stream", input_source=input_source, instance=instance_name))
-                    break
+                logger.info(create_log_message(event="video_end", reason="End of video stream", input_source=input_source, instance=instance_name))
+                break
 
             frame_count += 1
-            classes = [0] if not track_all else None
-            results = process_frame(model, frame, classes)
+            # Zones and lines are in source pixels; sources that do not report their resolution are sized by their first frame
+            if zone_engine and zone_engine.frame_size is None:
+                zone_engine.resolve(width or frame.shape[1], height or frame.shape[0])
+            if roi:
+                frame = roi.apply(frame)
+            # The gate always passes the first frame, so `results` is set before any frame is skipped
+            run_inference = motion_gate is None or motion_gate.should_process(frame)
+            if run_inference and inference_service:
+                results = inference_service.track(instance_name, frame, classes, imgsz)
+            elif run_inference:
+                results = process_frame(model, frame, classes, imgsz)
 
             current_time = time.time()
             fps = 1 / (current_time - prev_time) if prev_time != 0 else 0
             prev_time = current_time
 
-            detection = update_detections(results, model, input_source, fps, instance_name)
-            if detection:
-                person_counter.update(detection["tracked_objects"])
+            stage_start = time.perf_counter()
+            captured_at = int(grabber.last_captured_at * 1000)
+            if run_inference:
+                detection = update_detections(results, model, input_source, fps, instance_name, roi.offset if roi else (0, 0), scale, captured_at)
+            else:
+                detection = refresh_detections(fps, instance_name, captured_at)
+            timer.add("update_detections", (time.perf_counter() - stage_start) * 1000)
+            timer.add("capture_to_publish", (time.time() - grabber.last_captured_at) * 1000)
+            if run_inference and results:
+                for stage in ("preprocess", "inference", "postprocess"):
+                    timer.add(stage, results[0].speed[stage])
+            if zone_engine:
+                # An empty frame (no detection) empties the zones too
+                stage_start = time.perf_counter()
+                zone_engine.update(detection, detection.timestamp if detection is not None else int(current_time * 1000))
+                timer.add("zones", (time.perf_counter() - stage_start) * 1000)
+            if detection is not None:
+                stage_start = time.perf_counter()
+                person_counter.update_ids(detection.track_ids("person"))
+                timer.add("person_counter_update", (time.perf_counter() - stage_start) * 1000)
+                if not first_detection_seen:
+                    first_detection_seen = True
+                    time_to_first_detection = round(time.time() - started_at, 3)
+                    set_instance_state(instance_name, "running", time_to_first_detection=time_to_first_detection)
+                    logger.info(create_log_message(event="time_to_first_detection", seconds=time_to_first_detection, instance=instance_name))
 
                 detected_objects.clear()
-                detected_objects.update(obj["label"] for obj in detection["tracked_objects"])
+                detected_objects.update(detection.labels())
                 total_objects = sum(detected_objects.values())
                 elapsed_time = current_time - start_time
                 avg_fps = frame_count / elapsed_time if elapsed_time > 0 else 0
@@ -203,6 +459,20 @@ def track(input_source, model_name=None, show_flag=False, fps_flag=False, track_
                     info = format_tracking_info(input_source, width, height, fps, avg_fps, elapsed_time, total_objects, detected_objects, results, instance_name)
                     sticky_print(info)
 
+            if publisher:
+                publisher.publish(
+                    detection,
+                    person_counter,
+                    lambda: {
+                        "capture": grabber.get_stats(),
+                        "motion": motion_gate.get_stats() if motion_gate else None,
+                        "scheduler": inference_service.scheduler.get_stats(instance_name) if inference_service else None,
+                        "zones": zone_engine.get_stats() if zone_engine else None,
+                        "status": instance_status.get(instance_name),
+                        "metrics": instance_snapshot(instance_name),
+                    },
+                )
+
             if show_flag and display_frame(frame, results, fps, fps_flag):
                 logger.info(create_log_message(event="tracking_interrupted", reason="User interrupted", input_source=input_source, instance=instance_name))
                 break
@@ -211,8 +481,19 @@ def track(input_source, model_name=None, show_flag=False, fps_flag=False, track_
         logger.error(create_log_message(event="tracking_error", error=str(e), input_source=input_source, instance=instance_name))
         frame_count = 0  # Set frame_count to 0 if an error occurs before it's initialized
     finally:
-        if 'vid' in locals():
+        if 'inference_service' in locals() and inference_service:
+            inference_service.release(instance_name)
+        if 'grabber' in locals():
+            grabber.stop()
+            logger.info(create_log_message(event="capture_stats", **grabber.get_stats(), input_source=input_source, instance=instance_name))
+            # The capture thread may have replaced the capture when reconnecting
+            grabber.vid.release()
+        elif 'vid' in locals():
             vid.release()
+        if 'person_counter' in locals():
+            person_counter.flush()
+        get_broadcaster(instance_name).close()
+        set_instance_state(instance_name, "stopped")
         if MACOS and 'show_flag' in locals() and show_flag:
             cv2.destroyAllWindows()
 
@@ -0,0 +1,225 @@
+import math
+import threading
+
+import cv2
+import numpy as np
+
+from app.utils.frame_record import NO_ID
+
+ANCHORS = ("bottom", "center")
+DEFAULT_LABELS = ("person",)
+# Upper bound on the cells of the zone map; 1080p frames get 2x2 pixel cells
+MAX_ZONE_MAP_CELLS = 1 << 19
+
+
+def parse_shapes(settings, key, min_points, max_points=None):
+    # [(name, points, labels)] from an instance's `zones` or `lines` list
+    shapes = []
+    for index, shape in enumerate(settings or []):
+        name = str(shape.get("name", f"{key}{index + 1}"))
+        points = np.array(shape.get("polygon" if key == "zone" else "points", []), dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2 or points.shape[0] < min_points or (max_points and points.shape[0] > max_points):
+            expected = f"{min_points} [x, y] points" if max_points == min_points else f"at least {min_points} [x, y] points"
+            raise ValueError(f"{key.capitalize()} '{name}' needs {expected}")
+        if name in (existing for existing, _, _ in shapes):
+            raise ValueError(f"Duplicate {key} name '{name}'")
+        shapes.append((name, points, tuple(shape.get("labels", DEFAULT_LABELS))))
+    return shapes
+
+
+class ZoneEngine:
+    """Zone occupancy and line crossings of the tracked objects, vectorized over objects, zones and lines.
+
+    Zones are polygons and lines are segments, in pixels of the source frame or
+    as fractions of its size (like a region of interest). Each object is reduced
+    to an anchor point, the bottom center of its box by default (where a person
+    stands). Zones are rasterized once into a map holding one bit per zone for
+    every cell of the frame, so testing all anchors against all zones is a
+    single lookup whatever the number and shape of the polygons. For lines, the
+    side of every anchor relative to every line is one matrix product, and the
+    engine keeps each track's last side of every line: a track that moves to the
+    other side between two frames, across the segment itself, counts as a
+    crossing, ``in`` when it goes from the left to the right of the line looking
+    from its first point to its second, ``out`` otherwise. Tracks not seen for
+    ``track_ttl_seconds`` are forgotten. The last ``max_events`` crossings are
+    kept with their time for range queries.
+    """
+
+    def __init__(self, zones=(), lines=(), anchor="bottom", track_ttl_seconds=5.0, max_events=100_000):
+        if anchor not in ANCHORS:
+            raise ValueError(f"Unknown anchor '{anchor}', expected one of {', '.join(ANCHORS)}")
+        self.zones = parse_shapes(zones, "zone", 3)
+        self.lines = parse_shapes(lines, "line", 2, 2)
+        self.anchor = anchor
+        self.track_ttl_ms = int(track_ttl_seconds * 1000)
+        self.zone_names = [name for name, _, _ in self.zones]
+        self.line_names = [name for name, _, _ in self.lines]
+        # Zones and lines counting the same labels share a label group
+        self.label_sets = list(dict.fromkeys(labels for _, _, labels in self.zones + self.lines))
+        self.zone_groups = np.array([self.label_sets.index(labels) for _, _, labels in self.zones], dtype=np.intp)
+        self.line_groups = np.array([self.label_sets.index(labels) for _, _, labels in self.lines], dtype=np.intp)
+        self.lock = threading.Lock()
+        self.frame_size = None
+        # Per-track state, sorted by track id: last anchor, last side (-1, 1, or 0 before any) of each line, last seen (ms)
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.track_points = np.empty((0, 2), dtype=np.float32)
+        self.track_sides = np.empty((0, len(self.lines)), dtype=np.int8)
+        self.track_seen = np.empty(0, dtype=np.int64)
+        self.occupancy = np.zeros(len(self.zones), dtype=np.int64)
+        # Crossings since start, [line, 0] in and [line, 1] out
+        self.crossings = np.zeros((len(self.lines), 2), dtype=np.int64)
+        # Ring of the latest crossings: time, line and direction (0 in, 1 out)
+        self.event_times = np.zeros(max_events, dtype=np.int64)
+        self.event_lines = np.zeros(max_events, dtype=np.int32)
+        self.event_directions = np.zeros(max_events, dtype=np.int8)
+        self.event_count = 0
+        self.timestamp = None
+        self.names = None
+        self.label_tables = None
+
+    def __bool__(self):
+        return bool(self.zones or self.lines)
+
+    def resolve(self, width, height):
+        # Pixel geometry for the source frame size; fractions of the frame size are scaled once here
+        def pixels(points):
+            normalized = bool(np.all((points >= 0) & (points <= 1)))
+            return points * [width, height] if normalized else points
+
+        # Cells of `cell` pixels, so that the map stays under MAX_ZONE_MAP_CELLS cells
+        self.cell = max(1, math.ceil(math.sqrt(width * height / MAX_ZONE_MAP_CELLS)))
+        rows, columns = math.ceil(height / self.cell), math.ceil(width / self.cell)
+        self.zone_map = np.zeros((rows, columns, (len(self.zones) + 7) // 8), dtype=np.uint8)
+        mask = np.empty((rows, columns), dtype=np.uint8)
+        for index, (_, points, _) in enumerate(self.zones):
+            mask[:] = 0
+            cv2.fillPoly(mask, [np.round(pixels(points) / self.cell).astype(np.int32)], 1)
+            self.zone_map[..., index // 8] |= mask << (index % 8)
+
+        segments = np.array([pixels(points) for _, points, _ in self.lines], dtype=np.float32).reshape(-1, 2, 2)
+        self.line_start = segments[:, 0]
+        self.line_direction = segments[:, 1] - segments[:, 0]
+        # side(p) = direction_x * (p_y - start_y) - direction_y * (p_x - start_x) = p @ side_weights + side_offsets
+        self.side_weights = np.stack([-self.line_direction[:, 1], self.line_direction[:, 0]])
+        self.side_offsets = self.line_direction[:, 1] * self.line_start[:, 0] - self.line_direction[:, 0] * self.line_start[:, 1]
+        self.frame_size = (width, height)
+
+    def label_masks(self, classes, names):
+        # (label groups x objects) mask of the objects counted by each label group
+        if names is not self.names:
+            # Lookup table from class index to label group membership, built once per model
+            pairs = list(names.items() if isinstance(names, dict) else enumerate(names))
+            self.label_tables = np.zeros((len(self.label_sets), max((code for code, _ in pairs), default=0) + 1), dtype=bool)
+            for group, labels in enumerate(self.label_sets):
+                self.label_tables[group, [code for code, name in pairs if name in labels]] = True
+            self.names = names
+        return self.label_tables[:, classes]
+
+    def anchors(self, boxes):
+        # xywh boxes -> (x, y) anchor points
+        points = boxes[:, :2].astype(np.float32)
+        if self.anchor == "bottom":
+            points[:, 1] += boxes[:, 3] / 2
+        return points
+
+    def inside(self, points):
+        # (points x zones): the zone bits of each point's cell; points outside the frame are in no zone
+        cells = np.floor(points / self.cell).astype(np.intp)
+        rows, columns = self.zone_map.shape[:2]
+        in_frame = (cells[:, 0] >= 0) & (cells[:, 0] < columns) & (cells[:, 1] >= 0) & (cells[:, 1] < rows)
+        bits = self.zone_map[np.clip(cells[:, 1], 0, rows - 1), np.clip(cells[:, 0], 0, columns - 1)]
+        inside = np.unpackbits(bits, axis=1, count=len(self.zones), bitorder="little").astype(bool)
+        inside[~in_frame] = False
+        return inside
+
+    def sides(self, points):
+        # (points x lines): 1 on the right of a line looking from its first point to its second, -1 on its left, 0 on it
+        return np.sign(points @ self.side_weights + self.side_offsets).astype(np.int8)
+
+    def update(self, detection, timestamp):
+        """Updates occupancy and crossings with the objects of one frame (a FrameRecord, or None for an empty scene)."""
+        if detection is None or len(detection) == 0:
+            ids = np.empty(0, dtype=np.int64)
+            points = np.empty((0, 2), dtype=np.float32)
+            masks = np.zeros((len(self.label_sets), 0), dtype=bool)
+        else:
+            ids = detection.ids
+            points = self.anchors(detection.boxes)
+            masks = self.label_masks(detection.classes, detection.names)
+        with self.lock:
+            if self.zones:
+                # Objects inside each zone, per label group: one product, then each zone's own group
+                counts = masks.astype(np.float32) @ self.inside(points).astype(np.float32)
+                self.occupancy = counts[self.zone_groups, np.arange(len(self.zones))].astype(np.int64)
+            if self.lines:
+                tracked = ids != NO_ID
+                self.update_lines(ids[tracked], points[tracked], masks[:, tracked], timestamp)
+            self.timestamp = timestamp
+
+    def update_lines(self, ids, points, masks, timestamp):
+        sides = self.sides(points)
+        # Previous state of the tracks of this frame, found by binary search in the sorted track ids
+        positions = np.searchsorted(self.track_ids, ids)
+        known = positions < len(self.track_ids)
+        known[known] = self.track_ids[positions[known]] == ids[known]
+        # A track back after more than the TTL starts afresh, even if no frame pruned it meanwhile
+        known[known] = self.track_seen[positions[known]] >= timestamp - self.track_ttl_ms
+        previous_sides = np.zeros_like(sides)
+        previous_sides[known] = self.track_sides[positions[known]]
+
+        # Side changes are rare, so the segment test only runs on them: the move from the previous
+        # anchor must cross the segment itself, not the line extending it
+        tracks, lines = np.nonzero(sides * previous_sides < 0)
+        if len(tracks):
+            start = self.track_points[positions[tracks]]
+            move = points[tracks] - start
+            to_start = self.line_start[lines] - start
+            to_end = to_start + self.line_direction[lines]
+            start_side = move[:, 0] * to_start[:, 1] - move[:, 1] * to_start[:, 0]
+            end_side = move[:, 0] * to_end[:, 1] - move[:, 1] * to_end[:, 0]
+            crossed = (start_side * end_side <= 0) & masks[self.line_groups[lines], tracks]
+            tracks, lines = tracks[crossed], lines[crossed]
+            directions = (sides[tracks, lines] < 0).astype(np.int8)
+            np.add.at(self.crossings, (lines, directions), 1)
+            self.record_events(timestamp, lines, directions)
+
+        # A point on a line keeps the side it came from
+        sides = np.where(sides != 0, sides, previous_sides)
+        # Tracks missing from this frame are kept for a while, so a short occlusion does not reset their sides
+        missing = (self.track_seen >= timestamp - self.track_ttl_ms) & ~np.isin(self.track_ids, ids)
+        merged_ids = np.concatenate([self.track_ids[missing], ids])
+        order = np.argsort(merged_ids, kind="stable")
+        self.track_ids = merged_ids[order]
+        self.track_points = np.concatenate([self.track_points[missing], points])[order]
+        self.track_sides = np.concatenate([self.track_sides[missing], sides])[order]
+        self.track_seen = np.concatenate([self.track_seen[missing], np.full(len(ids), timestamp, dtype=np.int64)])[order]
+
+    def record_events(self, timestamp, lines, directions):
+        capacity = len(self.event_times)
+        slots = (self.event_count + np.arange(len(lines))) % capacity
+        self.event_times[slots] = timestamp
+        self.event_lines[slots] = lines
+        self.event_directions[slots] = directions
+        self.event_count += len(lines)
+
+    def count_crossings(self, from_ms, to_ms):
+        # Crossings of each line between from_ms and to_ms, or None when the range starts before the oldest kept event
+        with self.lock:
+            capacity = len(self.event_times)
+            kept = min(self.event_count, capacity)
+            # Once the ring has wrapped, the slot written next holds the oldest event
+            if self.event_count > capacity and from_ms < self.event_times[self.event_count % capacity]:
+                return None
+            times = self.event_times[:kept]
+            selected = (times >= from_ms) & (times <= to_ms)
+            counts = np.bincount(self.event_lines[:kept][selected] * 2 + self.event_directions[:kept][selected], minlength=2 * len(self.lines))
+        return {name: {"in": int(counts[2 * line]), "out": int(counts[2 * line + 1])} for line, name in enumerate(self.line_names)}
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "timestamp": self.timestamp,
+                "zones": dict(zip(self.zone_names, self.occupancy.tolist())),
+                "lines": {name: {"in": int(counts[0]), "out": int(counts[1])} for name, counts in zip(self.line_names, self.crossings)},
+                "tracks": len(self.track_ids),
+            }
@@ -7,9 +7,12 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 import pytest
 from unittest.mock import patch, MagicMock, ANY
 from http.server import BaseHTTPRequestHandler
-from app.api.request_handler import RequestHandler, start_server
+from app.api.request_handler import RequestHandler, start_server, start_shared_server
+from app.api.request_handler import response_cache
 from app.utils.person_counter import PersonCounter
+from app.utils.shared_state import latest_detections, bump_detection_version
 from app.vision.track import track
+import gzip
 import json
 import time
 from io import BytesIO
@@ -101,7 +104,18 @@ def test_handle_cam_collect_no_data(mock_get_counter, mock_handler):
     assert json.loads(mock_handler.wfile.getvalue().decode()) == {"error": "No data available for the specified camera"}
 
 
-@patch("app.api.request_handler.HTTPServer")
+@patch("app.utils.person_counter.PersonCounter.get_counter")
+def test_handle_cam_collect_range_no_longer_kept(mock_get_counter, mock_handler):
+    # Rather than a count of the tracks still in memory
+    mock_get_counter.return_value.get_count.return_value = None
+    mock_handler.path = "/cam/collect?from=1&to=2"
+    mock_handler.handle_cam_collect()
+
+    assert mock_handler.status_code == 404
+    assert json.loads(mock_handler.wfile.getvalue().decode()) == {"error": "Person tracks are no longer kept for this time range"}
+
+
+@patch("app.api.request_handler.TrackerHTTPServer")
 def test_start_server(mock_http_server):
     instance_config = {"name": "test_instance", "camera": os.path.expanduser("~/Downloads/video.mp4"), "api_port": 8000}
     start_server(instance_config)
@@ -110,6 +124,80 @@ def test_start_server(mock_http_server):
     mock_http_server.return_value.serve_forever.assert_called_once()
 
 
+@patch("app.api.request_handler.TrackerHTTPServer")
+def test_start_shared_server(mock_http_server):
+    instance_configs = [{"name": "cam1", "api_port": 8000}, {"name": "cam2", "api_port": 8001}]
+    start_shared_server(instance_configs, 8080)
+    mock_http_server.assert_called_once_with(("", 8080), ANY)
+    assert mock_http_server.call_args[0][1].protocol_version == "HTTP/1.1"
+    mock_http_server.return_value.serve_forever.assert_called_once()
+
+
+def test_shared_listener_routes_by_instance():
+    handler = TestRequestHandler(None)
+    handler.instances = {"cam1": {"name": "cam1", "camera": 0, "api_port": 8000}}
+    handler.path = "/instances/cam1/cam/collect?from=1000"
+
+    assert handler.route_instance()
+    assert handler.instance_config["name"] == "cam1"
+    assert handler.path == "/cam/collect?from=1000"
+
+    handler.path = "/instances/unknown/health"
+    assert not handler.route_instance()
+    assert handler.status_code == 404
+    assert handler.headers["Content-Length"] == str(len(handler.wfile.getvalue()))
+
+
+def test_detections_response_is_cached_per_version():
+    instance_name = "test_cached_detections"
+    latest_detections[instance_name] = [{"timestamp": 1, "tracked_objects": []}]
+    handler = TestRequestHandler({"name": instance_name})
+    handler.path = "/detections"
+    handler.handle_detections()
+    first_etag = handler.headers["ETag"]
+    hits = response_cache.hits
+
+    # Same version: the cached body is served without rebuilding it
+    latest_detections[instance_name] = [{"timestamp": 2, "tracked_objects": []}]
+    handler = TestRequestHandler({"name": instance_name})
+    handler.path = "/detections"
+    handler.handle_detections()
+    assert response_cache.hits == hits + 1
+    assert json.loads(handler.wfile.getvalue()) == [{"timestamp": 1, "tracked_objects": []}]
+
+    bump_detection_version(instance_name)
+    handler = TestRequestHandler({"name": instance_name})
+    handler.path = "/detections"
+    handler.handle_detections()
+    assert json.loads(handler.wfile.getvalue()) == [{"timestamp": 2, "tracked_objects": []}]
+    assert handler.headers["ETag"] != first_etag
+
+
+def test_detections_not_modified_and_gzip():
+    instance_name = "test_etag_detections"
+    latest_detections[instance_name] = [{"timestamp": 1, "tracked_objects": [{"id": i, "label": "person"} for i in range(100)]}]
+    handler = TestRequestHandler({"name": instance_name})
+    handler.path = "/detections"
+    handler.handle_detections()
+    etag = handler.headers["ETag"]
+    body = handler.wfile.getvalue()
+
+    handler = TestRequestHandler({"name": instance_name})
+    handler.headers["If-None-Match"] = etag
+    handler.path = "/detections"
+    handler.handle_detections()
+    assert handler.status_code == 304
+    assert handler.wfile.getvalue() == b""
+
+    handler = TestRequestHandler({"name": instance_name})
+    handler.headers["Accept-Encoding"] = "gzip, deflate"
+    handler.path = "/detections"
+    handler.handle_detections()
+    assert handler.headers["Content-Encoding"] == "gzip"
+    assert handler.headers["Content-Length"] == str(len(handler.wfile.getvalue()))
+    assert gzip.decompress(handler.wfile.getvalue()) == body
+
+
 # This line tells pytest to ignore the TestRequestHandler class when collecting tests
 TestRequestHandler.__test__ = False
 
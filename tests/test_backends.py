@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from unittest.mock import patch
+from app.vision import backends
+from app.vision.backends import select_device, select_backend, export_path, export_model, ONNX, OPENVINO, PYTORCH
+
+
+class FakeExportModel:
+    def __init__(self, directory):
+        self.directory = directory
+        self.exports = []
+
+    def export(self, format, imgsz, int8, dynamic, verbose):
+        self.exports.append((format, imgsz, int8))
+        path = self.directory / "weights.onnx"
+        path.write_bytes(b"exported")
+        return str(path)
+
+
+def test_device_and_backend_selection():
+    assert select_device("cuda:1") == "cuda:1"
+    with patch("app.vision.backends.torch.cuda.is_available", return_value=False), patch(
+        "app.vision.backends.torch.backends.mps.is_available", return_value=False
+    ):
+        assert select_device("auto") == "cpu"
+
+    assert select_backend("onnx", "cuda:0") == ONNX
+    assert select_backend("auto", "cuda:0") == PYTORCH
+    with patch("app.vision.backends.backend_available", side_effect=lambda backend: backend == ONNX):
+        assert select_backend("auto", "cpu") == ONNX
+    with patch("app.vision.backends.backend_available", return_value=False):
+        assert select_backend("auto", "cpu") == PYTORCH
+    with pytest.raises(ValueError):
+        select_backend("tensorrt", "cpu")
+
+
+def test_exports_are_cached_by_weights_and_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(backends, "EXPORT_DIR", tmp_path / "exports")
+    weights = tmp_path / "weights.pt"
+    weights.write_bytes(b"weights v1")
+    model = FakeExportModel(tmp_path)
+
+    first = export_model(model, weights, ONNX, 640)
+    assert first.read_bytes() == b"exported"
+    assert export_model(model, weights, ONNX, 640) == first
+    assert len(model.exports) == 1
+
+    assert export_path(weights, ONNX, 320) != first
+    assert export_path(weights, OPENVINO, 640, int8=True).name.endswith("-640-int8_openvino_model")
+    weights.write_bytes(b"weights v2")
+    assert export_path(weights, ONNX, 640) != first
@@ -0,0 +1,71 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import copy
+
+import cv2
+import numpy as np
+from app.benchmark.runner import apply_settings, scenario_settings
+from app.benchmark.synthetic import generate_video
+from app.utils.person_counter import PersonCounter
+from app.utils.timing import StageTimer
+from app.vision import track as track_module
+
+
+def read_frames(path):
+    vid = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        success, frame = vid.read()
+        if not success:
+            break
+        frames.append(frame)
+    vid.release()
+    return frames
+
+
+def test_synthetic_video_is_deterministic(tmp_path):
+    first = read_frames(generate_video(tmp_path / "a.mp4", width=160, height=120, fps=10, seconds=1, people=3, seed=7))
+    second = read_frames(generate_video(tmp_path / "b.mp4", width=160, height=120, fps=10, seconds=1, people=3, seed=7))
+    other = read_frames(generate_video(tmp_path / "c.mp4", width=160, height=120, fps=10, seconds=1, people=3, seed=8))
+
+    assert len(first) == 10
+    assert first[0].shape == (120, 160, 3)
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+    assert not np.array_equal(first[0], other[0])
+    # The figures move between frames
+    assert not np.array_equal(first[0], first[-1])
+
+
+def test_stage_timer_percentiles():
+    timer = StageTimer()
+    for value in range(1, 101):
+        timer.add("inference", float(value))
+    timer.add("decode", 2.0)
+
+    summary = timer.summary()
+    assert timer.count("inference") == 100
+    assert summary["inference"]["p50"] == 50.5
+    assert summary["inference"]["p99"] == 99.01
+    assert summary["inference"]["max"] == 100.0
+    assert summary["decode"] == {"count": 1, "mean": 2.0, "p50": 2.0, "p90": 2.0, "p95": 2.0, "p99": 2.0, "max": 2.0}
+
+
+def test_scenarios_pin_their_settings_instead_of_the_live_config(monkeypatch):
+    live_config = copy.deepcopy(track_module.config)
+    live_config["motion"] = {"enabled": True}
+    live_config["inference"] = {**live_config.get("inference", {}), "shared_model": False}
+    monkeypatch.setattr(track_module, "config", live_config)
+    monkeypatch.setattr(PersonCounter, "counters", {})
+
+    settings = scenario_settings({"name": "pinned"})
+    apply_settings("benchmark-pinned", settings)
+
+    assert settings == {"motion": False, "shared_model": True, "track_store": False}
+    assert track_module.get_motion_gate("benchmark-pinned") is None
+    assert live_config["inference"]["shared_model"] is True
+    assert PersonCounter.get_counter("benchmark-pinned").store is None
+    assert scenario_settings({"name": "gated", "motion": True})["motion"] is True
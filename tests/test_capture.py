@@ -0,0 +1,72 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+import pytest
+from app.vision.capture import FrameGrabber, DROP_OLDEST, BLOCK
+
+
+class FakeCapture:
+    def __init__(self, frame_count, delay=0.0):
+        self.frame_count = frame_count
+        self.delay = delay
+        self.position = 0
+
+    def read(self):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.position >= self.frame_count:
+            return False, None
+        self.position += 1
+        return True, self.position
+
+    def set(self, prop, value):
+        self.position = int(value)
+
+
+def read_all(grabber, consumer_delay=0.0):
+    frames = []
+    while True:
+        success, frame = grabber.read()
+        if not success:
+            return frames
+        frames.append(frame)
+        if consumer_delay:
+            time.sleep(consumer_delay)
+
+
+def test_block_policy_keeps_every_frame():
+    grabber = FrameGrabber(FakeCapture(50), "video.mp4", "test", drop_policy=BLOCK, queue_size=2).start()
+    frames = read_all(grabber, consumer_delay=0.001)
+
+    assert frames == list(range(1, 51))
+    assert grabber.get_stats()["frames_dropped"] == 0
+    assert grabber.get_stats()["frames_captured"] == 50
+
+
+def test_drop_oldest_policy_serves_freshest_frame():
+    grabber = FrameGrabber(FakeCapture(40, delay=0.001), 0, "test", drop_policy=DROP_OLDEST, queue_size=1).start()
+    frames = read_all(grabber, consumer_delay=0.01)
+    stats = grabber.get_stats()
+
+    assert frames == sorted(frames)
+    assert frames[-1] == 40
+    assert stats["frames_dropped"] > 0
+    assert stats["frames_captured"] == 40
+    assert len(frames) + stats["frames_dropped"] == 40
+
+
+def test_loop_video_rewinds_source():
+    grabber = FrameGrabber(FakeCapture(5), "video.mp4", "test", drop_policy=BLOCK, loop_video=True).start()
+    frames = [grabber.read()[1] for _ in range(12)]
+    grabber.stop()
+
+    assert frames == [1, 2, 3, 4, 5, 1, 2, 3, 4, 5, 1, 2]
+
+
+def test_invalid_drop_policy():
+    with pytest.raises(ValueError):
+        FrameGrabber(FakeCapture(1), 0, "test", drop_policy="newest")
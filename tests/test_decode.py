@@ -0,0 +1,101 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import cv2
+import numpy as np
+import pytest
+
+from app.benchmark.synthetic import generate_video
+from app.utils.frame_record import FrameRecord
+from app.vision.decode import OPENCV, PYAV, OpenCVCapture, open_capture, output_size, pyav_available, select_decode_backend
+from app.vision.roi import RegionOfInterest
+from app.vision.track import get_decode_size
+
+BACKENDS = [OPENCV, pytest.param(PYAV, marks=pytest.mark.skipif(not pyav_available(), reason="PyAV is not installed"))]
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    return str(generate_video(tmp_path_factory.mktemp("decode") / "video.mp4", width=320, height=240, fps=10, seconds=1, people=1))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backends_decode_downscale_and_rewind(video, backend):
+    capture = open_capture(video, backend, threads=2)
+    assert capture.isOpened()
+    assert (capture.get(cv2.CAP_PROP_FRAME_WIDTH), capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) == (320, 240)
+    assert capture.get(cv2.CAP_PROP_FPS) == pytest.approx(10)
+
+    capture.set_output_size((160, 120))
+    frames = []
+    while True:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    assert len(frames) == 10
+    assert frames[0].shape == (120, 160, 3)
+
+    assert capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    assert capture.read()[0]
+    capture.release()
+
+
+def test_missing_source_is_not_opened(tmp_path):
+    assert not OpenCVCapture(str(tmp_path / "missing.mp4")).isOpened()
+
+
+def test_auto_backend_measures_files_only(video):
+    backend, costs = select_decode_backend(video, "auto", probe_frames=5, is_file=True)
+    if pyav_available():
+        assert set(costs) == {OPENCV, PYAV}
+        assert costs[backend] == min(cost for cost in costs.values() if cost is not None)
+    else:
+        assert backend == OPENCV
+
+    assert select_decode_backend("rtsp://camera/stream", "auto", is_file=False) == (OPENCV, {})
+    with pytest.raises(ValueError):
+        select_decode_backend(video, "gstreamer")
+
+
+def test_auto_backend_is_measured_at_the_output_size(video, monkeypatch):
+    sizes = []
+    monkeypatch.setattr(OpenCVCapture, "set_output_size", lambda capture, size: sizes.append(size))
+
+    def size_for(width, height):
+        return output_size(width, height, 160)
+
+    backend, costs = select_decode_backend(video, "auto", probe_frames=5, is_file=True, size_for=size_for)
+    if pyav_available():
+        assert costs[OPENCV] is not None
+        assert sizes == [(160, 120)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_open_capture_decodes_at_the_given_size(video, backend):
+    capture = open_capture(video, backend, size=(160, 120))
+    assert capture.read()[1].shape == (120, 160, 3)
+    capture.release()
+
+
+def test_decode_size_follows_inference_size():
+    assert output_size(1920, 1080, 640) == (640, 360)
+    assert output_size(640, 480, 640) is None
+    assert get_decode_size(3840, 2160, None, 960) == (960, 540)
+    # A region of interest a quarter of the frame wide keeps its own pixels up to the inference size
+    roi = RegionOfInterest(rect=[0.0, 0.0, 0.25, 0.25])
+    assert get_decode_size(3840, 2160, roi, 480) == (1920, 1080)
+
+
+def test_pixel_roi_and_boxes_are_scaled_with_the_frame():
+    roi = RegionOfInterest(rect=[100, 50, 300, 250]).scaled(0.5, 0.5)
+    roi.resolve((540, 960))
+    assert roi.bounds == (50, 25, 150, 125)
+    assert RegionOfInterest(rect=[0.1, 0.1, 0.5, 0.5]).scaled(0.5, 0.5).points.tolist() == RegionOfInterest(rect=[0.1, 0.1, 0.5, 0.5]).points.tolist()
+
+    data = np.array([[0.0, 0.0, 10.0, 20.0, 1.0, 0.9, 0.0]])
+    record = FrameRecord.from_box_data(0, "cam", 10.0, data, {0: "person"}, offset=(50, 25), scale=(2.0, 2.0))
+    assert record.boxes.tolist() == [[110.0, 70.0, 20.0, 40.0]]
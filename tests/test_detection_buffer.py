@@ -0,0 +1,46 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.detection_buffer import DetectionRingBuffer
+
+
+def make_detection(timestamp, objects):
+    return {
+        "timestamp": timestamp,
+        "input_source": "video.mp4",
+        "fps": 12.5,
+        "tracked_objects": [{"id": id, "label": label, "box": [1.5, 2.5, 3.0, 4.0], "confidence": 0.75} for id, label in objects],
+        "processing_time": {"preprocess": 1.0, "inference": 2.0, "postprocess": 3.0},
+    }
+
+
+def test_detections_round_trip():
+    buffer = DetectionRingBuffer(seconds=2, fps=5)
+    detection = make_detection(1000, [(1, "person"), (None, "car")])
+    buffer.append(100.0, detection)
+
+    assert buffer.get_detections(99.0) == [detection]
+    assert buffer.get_detections(100.5) == []
+
+
+def test_frame_ring_keeps_latest_frames():
+    buffer = DetectionRingBuffer(seconds=1, fps=4)
+    for frame in range(20):
+        buffer.append(float(frame), make_detection(frame, [(frame, "person")]))
+
+    assert len(buffer) == buffer.frame_capacity == 5
+    assert [d["timestamp"] for d in buffer.get_detections(0.0)] == [15, 16, 17, 18, 19]
+
+
+def test_object_ring_overflow_drops_oldest_frames():
+    buffer = DetectionRingBuffer(seconds=1, fps=4, objects_per_frame=2)
+    for frame in range(4):
+        buffer.append(float(frame), make_detection(frame, [(i, "person") for i in range(4)]))
+
+    detections = buffer.get_detections(0.0)
+    assert buffer.object_capacity == 10
+    assert [d["timestamp"] for d in detections] == [2, 3]
+    assert all(len(d["tracked_objects"]) == 4 for d in detections)
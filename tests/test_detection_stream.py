@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import threading
+from io import BytesIO
+from app.api.request_handler import RequestHandler
+from app.utils.detection_stream import DetectionBroadcaster, StreamSubscriber, get_broadcaster, LATEST
+
+
+def detection(timestamp):
+    return {"timestamp": timestamp, "tracked_objects": [{"id": 1, "label": "person"}]}
+
+
+def test_subscribers_share_one_encoded_event():
+    broadcaster = DetectionBroadcaster("test_shared_encode", buffer_size=4)
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+    broadcaster.publish(detection(1))
+
+    (message,) = first.get(timeout=1)
+    assert second.get(timeout=1)[0] is message
+    assert message.startswith(b"id: 1\nevent: detection\ndata: ")
+    assert json.loads(message.split(b"data: ", 1)[1]) == detection(1)
+
+
+def test_slow_subscriber_is_bounded_and_coalesced():
+    broadcaster = DetectionBroadcaster("test_bounded", buffer_size=3)
+    subscriber = broadcaster.subscribe()
+    for timestamp in range(10):
+        broadcaster.publish(detection(timestamp))
+
+    messages = subscriber.get(timeout=1)
+    assert [json.loads(m.split(b"data: ", 1)[1])["timestamp"] for m in messages] == [7, 8, 9]
+    assert subscriber.dropped == 7
+
+    latest = StreamSubscriber(buffer_size=8, coalesce=LATEST)
+    for message in (b"a", b"b", b"c"):
+        latest.put(message)
+    assert latest.get(timeout=1) == [b"c"]
+    assert latest.dropped == 2
+
+
+def test_late_subscriber_receives_current_state():
+    broadcaster = DetectionBroadcaster("test_late", buffer_size=4)
+    broadcaster.publish(detection(1))
+    broadcaster.publish(detection(2))
+
+    messages = broadcaster.subscribe().get(timeout=1)
+    assert len(messages) == 1
+    assert messages[0].startswith(b"id: 2\n")
+
+
+class StreamTestHandler(RequestHandler):
+    def __init__(self, instance_config):
+        self.instance_config = instance_config
+        self.headers = {}
+        self.wfile = BytesIO()
+        self.client_address = ("127.0.0.1", 0)
+
+    def send_response(self, code):
+        self.status_code = code
+
+    def send_header(self, name, value):
+        self.headers[name] = value
+
+    def end_headers(self):
+        pass
+
+
+def test_stream_endpoint_writes_events_until_closed():
+    broadcaster = get_broadcaster("test_stream_endpoint")
+    handler = StreamTestHandler({"name": "test_stream_endpoint"})
+    thread = threading.Thread(target=handler.handle_detection_stream)
+    thread.start()
+    while not broadcaster.subscribers:
+        pass
+    broadcaster.publish(detection(1))
+    broadcaster.publish(detection(2))
+    while broadcaster.get_stats()["events"] < 2 or any(s.buffer for s in list(broadcaster.subscribers)):
+        pass
+    broadcaster.close()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert handler.headers["Content-Type"] == "text/event-stream"
+    assert handler.wfile.getvalue().count(b"event: detection") == 2
+    assert not broadcaster.subscribers
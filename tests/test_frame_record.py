@@ -0,0 +1,72 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from app.utils.frame_record import FrameRecord, as_record
+from app.utils.person_counter import PersonCounter
+from app.utils.shared_state import add_detection, detection_history, get_unique_object_counts
+
+NAMES = {0: "person", 2: "car"}
+
+
+def make_record(rows, timestamp=1000):
+    return FrameRecord.from_box_data(timestamp, "cam", 10.0, np.array(rows, dtype=np.float32), NAMES, (1.0, 2.0, 3.0))
+
+
+def test_box_data_matches_ultralytics_boxes():
+    rows = torch.tensor([[10.0, 20.0, 30.0, 60.0, 4.0, 0.75, 0.0], [0.0, 0.0, 8.0, 4.0, 5.0, 0.5, 2.0]])
+    boxes = Results(np.zeros((100, 100, 3), dtype=np.uint8), path="", names=NAMES, boxes=rows).boxes
+
+    record = FrameRecord.from_box_data(1000, "cam", 10.0, boxes.data.numpy(), NAMES)
+
+    assert record.boxes.tolist() == boxes.xywh.tolist()
+    assert record.ids.tolist() == boxes.id.int().tolist()
+    assert record.labels() == ["person", "car"]
+    assert record.to_dict()["tracked_objects"][0] == {"id": 4, "label": "person", "box": [20.0, 40.0, 20.0, 40.0], "confidence": 0.75}
+
+
+def test_untracked_boxes_have_no_id():
+    record = make_record([[0.0, 0.0, 2.0, 2.0, 0.9, 0.0]])
+
+    assert record.track_ids("person") == []
+    assert record.to_dict()["tracked_objects"][0]["id"] is None
+
+
+def test_hot_path_does_not_build_dicts():
+    instance_name = "test_frame_record_hot_path"
+    record = make_record([[0.0, 0.0, 2.0, 2.0, 1.0, 0.9, 0.0], [0.0, 0.0, 2.0, 2.0, 2.0, 0.9, 0.0], [0.0, 0.0, 2.0, 2.0, 3.0, 0.9, 2.0]])
+    counter = PersonCounter(instance_name)
+
+    add_detection(record, instance_name)
+    counter.update_ids(record.track_ids("person"))
+
+    assert record.detection is None
+    assert len(counter) == 2
+    assert get_unique_object_counts(5, instance_name) == {"person": 2, "car": 1}
+    assert detection_history[instance_name].get_detections(0) == [{**record.to_dict(), "timestamp": 1000}]
+
+
+def test_dict_is_built_once_and_shared_by_refreshes():
+    record = make_record([[0.0, 0.0, 2.0, 2.0, 1.0, 0.9, 0.0]])
+    detection = record.to_dict()
+
+    assert record.to_dict() is detection
+    refreshed = record.with_time(2000, 5.0)
+    assert refreshed.ids is record.ids
+    assert refreshed.to_dict() == {**detection, "timestamp": 2000, "fps": 5.0}
+
+
+def test_dicts_convert_to_records():
+    detection = {"timestamp": 5, "fps": 1.0, "tracked_objects": [{"id": None, "label": "car", "box": [1.0, 2.0, 3.0, 4.0], "confidence": 0.5}]}
+
+    record = as_record(detection)
+
+    assert as_record(record) is record
+    assert record.sightings() == [("car", None)]
+    assert record.to_dict() == {**detection, "input_source": None}
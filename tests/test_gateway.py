@@ -0,0 +1,155 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import socket
+import threading
+import time
+import urllib.request
+from urllib.error import HTTPError
+
+import numpy as np
+import pytest
+
+from app.api.gateway import Gateway, GatewayRequestHandler
+from app.api.request_handler import RequestHandler, TrackerHTTPServer
+from app.utils.frame_record import FrameRecord
+from app.utils.person_counter import PersonCounter
+from app.utils.shared_state import add_detection
+
+NAMES = {0: "person", 2: "car"}
+
+
+def serve(handler_class):
+    server = TrackerHTTPServer(("127.0.0.1", 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_instance(instance_config):
+    class InstanceRequestHandler(RequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(instance_config, *args, **kwargs)
+
+    return serve(InstanceRequestHandler)
+
+
+def start_shared(instance_configs):
+    instances = {instance_config["name"]: instance_config for instance_config in instance_configs}
+
+    class SharedRequestHandler(RequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(None, *args, instances=instances, **kwargs)
+
+    return serve(SharedRequestHandler)
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def site():
+    # Instance gw_a on its own port, gw_b and gw_c behind a shared listener, with 1, 2 and 3 persons seen
+    configs = [{"name": f"gw_{letter}", "camera": f"{letter}.mp4", "api_port": 0} for letter in "abc"]
+    for persons, instance_config in enumerate(configs, start=1):
+        name = instance_config["name"]
+        PersonCounter.counters[name] = counter = PersonCounter(name)
+        counter.update_ids(list(range(persons)))
+        rows = [[0.0, 0.0, 2.0, 2.0, float(track_id), 0.9, 0.0] for track_id in range(persons)] + [[0.0, 0.0, 2.0, 2.0, 99.0, 0.8, 2.0]]
+        add_detection(FrameRecord.from_box_data(int(time.time() * 1000), name, 10.0, np.array(rows), NAMES), name)
+    servers = [start_instance(configs[0]), start_shared(configs[1:])]
+    yield {"servers": servers, "ports": [server.server_address[1] for server in servers]}
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    for instance_config in configs:
+        PersonCounter.counters.pop(instance_config["name"], None)
+
+
+@pytest.fixture
+def gateway(site):
+    a_port, shared_port = site["ports"]
+    gateway = Gateway(
+        [{"name": "gw_a", "url": f"http://127.0.0.1:{a_port}"}, {"url": f"http://127.0.0.1:{shared_port}", "shared": True}],
+        cache_ms=0,
+    )
+    yield gateway
+    gateway.close()
+
+
+def collect_range():
+    now = int(time.time() * 1000)
+    return now - 60_000, now
+
+
+def test_site_counts_are_merged_over_keep_alive_connections(gateway):
+    from_ms, to_ms = collect_range()
+
+    for _ in range(3):
+        result = gateway.collect(from_ms, to_ms)
+
+    assert result == {"count": 6, "cameras": {"gw_a": 1, "gw_b": 2, "gw_c": 3}, "errors": {}}
+    # One connection per camera queried at once on each host, reused by the later queries
+    assert sorted(pool.connections_opened for pool in gateway.pools.values()) == [1, 2]
+    assert gateway.detections_from(5) == {
+        "counts": {"person": 6, "car": 3},
+        "cameras": {"gw_a": {"person": 1, "car": 1}, "gw_b": {"person": 2, "car": 1}, "gw_c": {"person": 3, "car": 1}},
+        "errors": {},
+    }
+    assert gateway.collect(from_ms, to_ms, ["gw_c", "gw_x"])["cameras"] == {"gw_c": 3}
+
+
+def test_unreachable_cameras_are_reported_next_to_partial_results(site):
+    gateway = Gateway(
+        [{"name": "gw_a", "url": f"http://127.0.0.1:{site['ports'][0]}"}, {"name": "offline", "url": f"http://127.0.0.1:{unused_port()}"}],
+        timeout=0.5,
+    )
+    try:
+        result = gateway.collect(*collect_range())
+        health = gateway.health()
+    finally:
+        gateway.close()
+
+    assert result["cameras"] == {"gw_a": 1}
+    assert list(result["errors"]) == ["offline"]
+    assert health["status"] == "degraded"
+    assert "gw_a" in health["cameras"]
+
+
+def test_gateway_serves_one_round_trip_per_site_query(gateway):
+    server = serve(lambda *args, **kwargs: GatewayRequestHandler(gateway, *args, **kwargs))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    from_ms, to_ms = collect_range()
+    try:
+        with urllib.request.urlopen(f"{base}/cam/collect?from={from_ms}&to={to_ms}") as response:
+            assert json.load(response)["count"] == 6
+        with urllib.request.urlopen(f"{base}/cameras") as response:
+            assert sorted(json.load(response)) == ["gw_a", "gw_b", "gw_c"]
+        with pytest.raises(HTTPError) as error:
+            urllib.request.urlopen(f"{base}/cam/collect?from={to_ms}&to={from_ms}")
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_identical_queries_share_one_fan_out(gateway):
+    from_ms, to_ms = collect_range()
+    gateway.cache_seconds = 60
+    requests_before = sum(pool.requests for pool in gateway.pools.values())
+
+    threads = [threading.Thread(target=gateway.collect, args=(from_ms, to_ms)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gateway.collect(from_ms, to_ms)
+
+    # One request per camera, plus the listing of the shared listener's instances
+    assert sum(pool.requests for pool in gateway.pools.values()) - requests_before == 4
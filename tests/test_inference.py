@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+from app.vision import inference
+from app.vision.backends import PYTORCH
+from app.vision.inference import InferenceService
+
+
+class FakeModel:
+    names = {0: "person"}
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, frames, classes=None, verbose=False, device=None):
+        self.batch_sizes.append(len(frames))
+        results = []
+        for frame in frames:
+            # One confident person box whose x position is encoded in the frame value
+            x = float(frame[0, 0, 0])
+            boxes = torch.tensor([[x, 10.0, x + 20.0, 50.0, 0.9, 0.0]])
+            results.append(Results(frame, path="", names=self.names, boxes=boxes))
+        return results
+
+
+def make_frame(x):
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    frame[0, 0, 0] = x
+    return frame
+
+
+def test_frames_from_all_instances_are_batched():
+    model = FakeModel()
+    service = InferenceService(model, "fake", max_batch_size=4, max_wait_ms=200, device="cpu").start()
+    instances = [f"cam{i}" for i in range(4)]
+    for name in instances:
+        service.register(name)
+
+    results = {}
+    barrier = threading.Barrier(len(instances))
+
+    def run(name):
+        barrier.wait()
+        results[name] = service.track(name, make_frame(10), [0])
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in instances]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert model.batch_sizes == [4]
+    assert set(results) == set(instances)
+    assert all(len(r) == 1 for r in results.values())
+
+
+def test_tracker_state_is_kept_per_instance():
+    service = InferenceService(FakeModel(), "fake", max_batch_size=2, max_wait_ms=1, device="cpu").start()
+
+    for _ in range(3):
+        first = service.track("cam1", make_frame(10), [0])[0]
+        second = service.track("cam2", make_frame(40), [0])[0]
+
+    # Both instances see a single, stable track; the ids come from independent trackers
+    assert first.boxes.id is not None and second.boxes.id is not None
+    assert first.boxes.id.tolist() == second.boxes.id.tolist() == [1.0]
+    assert first.boxes.xyxy[0, 0].item() != second.boxes.xyxy[0, 0].item()
+
+    service.release("cam1")
+    assert "cam1" not in service.trackers
+
+
+def test_model_copies_of_a_worker_pool_are_timed_once(monkeypatch):
+    class FakeYOLO(FakeModel):
+        def __init__(self, path, task=None):
+            super().__init__()
+            self.overrides = {}
+
+    measured = []
+    monkeypatch.setattr(inference, "YOLO", FakeYOLO)
+    monkeypatch.setattr(inference, "select_device", lambda device: "cpu")
+    monkeypatch.setattr(inference, "select_backend", lambda backend, device: PYTORCH)
+    monkeypatch.setattr(inference, "measure_latency", lambda model, imgsz: measured.append(model) or 1.0)
+    monkeypatch.setattr(InferenceService, "services", {})
+    monkeypatch.setattr(inference, "inference_services", {})
+
+    service = InferenceService.get_service("fake.pt", workers=3)
+
+    assert len(service.threads) == 3
+    assert measured == [service.model]
@@ -0,0 +1,176 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from app.benchmark.synthetic import generate_video
+from app.utils.frame_record import FrameRecord
+from app.vision.capture import FrameGrabber, DROP_OLDEST
+
+
+@pytest.fixture(scope="module")
+def video_frames(tmp_path_factory):
+    path = generate_video(tmp_path_factory.mktemp("live") / "video.mp4", width=160, height=120, fps=10, seconds=1, people=1)
+    capture = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+class FakeLiveStream:
+    """A video file played as a live stream.
+
+    Frame ``n`` becomes available ``n / fps`` seconds after the stream opened.
+    Frames nobody grabbed in time stay buffered and are returned immediately,
+    like the packets an RTSP client has already received. ``retrieve_delay``
+    stands for the BGR conversion, and the connection drops after
+    ``fail_after`` frames.
+    """
+
+    def __init__(self, frames, fps=50, retrieve_delay=0.0, fail_after=None, opened=True):
+        self.source_frames = frames
+        self.fps = fps
+        self.retrieve_delay = retrieve_delay
+        self.fail_after = fail_after
+        self.opened = opened
+        self.started = time.monotonic()
+        self.delivered = 0
+        # Indices of the frames handed out, in order
+        self.retrieved = []
+
+    def live_index(self):
+        return int((time.monotonic() - self.started) * self.fps)
+
+    def grab(self):
+        if not self.opened or (self.fail_after is not None and self.delivered >= self.fail_after):
+            return False
+        wait = self.started + self.delivered / self.fps - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.delivered += 1
+        return True
+
+    def retrieve(self):
+        if self.retrieve_delay:
+            time.sleep(self.retrieve_delay)
+        index = self.delivered - 1
+        self.retrieved.append(index)
+        return True, (index, self.source_frames[index % len(self.source_frames)])
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def set(self, prop, value):
+        return False
+
+    def isOpened(self):
+        return self.opened
+
+    def release(self):
+        self.opened = False
+
+
+def lag_after(grabber, stream, seconds):
+    # How many frames the frame served last is behind the stream
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        success, (index, _) = grabber.read()
+        assert success
+    return stream.live_index() - index
+
+
+@pytest.mark.parametrize("drain_threshold_ms, max_lag", [(5, 5), (None, None)])
+def test_draining_keeps_up_with_a_source_faster_than_conversion(video_frames, drain_threshold_ms, max_lag):
+    # Converting a frame takes longer than the frame interval, so converting every frame falls behind
+    stream = FakeLiveStream(video_frames, fps=50, retrieve_delay=0.03)
+    grabber = FrameGrabber(stream, "rtsp://fake", "test_live", DROP_OLDEST, drain_threshold_ms=drain_threshold_ms).start()
+
+    lag = lag_after(grabber, stream, 1.0)
+    grabber.stop()
+
+    if max_lag is None:
+        assert lag > 10
+        assert grabber.get_stats()["frames_drained"] == 0
+    else:
+        assert lag <= max_lag
+        assert grabber.get_stats()["frames_drained"] > 0
+
+
+def test_live_decode_time_excludes_waiting_for_the_source(video_frames):
+    # A 20 FPS source: each grab waits about 50 ms for the next frame, retrieving it takes 5 ms
+    stream = FakeLiveStream(video_frames, fps=20, retrieve_delay=0.005)
+    grabber = FrameGrabber(stream, "rtsp://fake", "test_live", DROP_OLDEST, live=True).start()
+
+    for _ in range(6):
+        assert grabber.read()[0]
+    stats = grabber.get_stats()
+    grabber.stop()
+
+    assert stats["decode_ms"] < 25
+    assert stats["grab_wait_ms"] > 25
+
+
+def test_reconnects_with_exponential_backoff(video_frames):
+    attempts = []
+
+    def reopen():
+        attempts.append(time.monotonic())
+        # The first two attempts find the source still down
+        return FakeLiveStream(video_frames, opened=len(attempts) > 2)
+
+    stream = FakeLiveStream(video_frames, fail_after=5)
+    grabber = FrameGrabber(stream, "rtsp://fake", "test_live", DROP_OLDEST, reconnect=reopen, backoff_initial=0.05, backoff_max=1.0).start()
+
+    served = [grabber.read()[1][0] for _ in range(8)]
+    stats = grabber.get_stats()
+    grabber.stop()
+
+    assert served[:5] == [0, 1, 2, 3, 4]
+    assert stats["reconnects"] == 1
+    assert stats["connected"]
+    assert stats["frame_age_ms"] is not None
+    assert len(attempts) == 3
+    # Waits of 0.1 s then 0.2 s between attempts
+    assert attempts[2] - attempts[1] > 1.5 * (attempts[1] - attempts[0])
+
+
+def test_gives_up_after_max_reconnect_attempts(video_frames):
+    attempts = []
+
+    def reopen():
+        attempts.append(time.monotonic())
+        return FakeLiveStream(video_frames, opened=False)
+
+    stream = FakeLiveStream(video_frames, fail_after=2)
+    grabber = FrameGrabber(stream, "rtsp://fake", "test_live", DROP_OLDEST, reconnect=reopen, backoff_initial=0.01, max_reconnect_attempts=3).start()
+
+    while grabber.read()[0]:
+        pass
+    stats = grabber.get_stats()
+
+    assert len(attempts) == 3
+    assert stats["reconnects"] == 0
+    assert not stats["connected"]
+
+
+def test_detections_carry_the_capture_time():
+    data = np.array([[0.0, 0.0, 2.0, 2.0, 1.0, 0.9, 0.0]])
+    record = FrameRecord.from_box_data(2000, "rtsp://fake", 10.0, data, {0: "person"}, captured_at=1500)
+
+    assert record.to_dict()["captured_at"] == 1500
+    assert record.with_time(3000, 10.0, 2900).to_dict()["captured_at"] == 2900
+    assert FrameRecord.from_dict(record.to_dict()).captured_at == 1500
@@ -0,0 +1,50 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import logging
+import queue
+from unittest.mock import patch
+from app.utils.logger import CloudCompatibleFormatter, EventRateLimiter, StructuredQueueHandler, create_log_message
+
+
+def make_record(msg, created=1000.0):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, None, None)
+    record.created = created
+    return record
+
+
+def test_structured_message_is_serialized_once():
+    message = create_log_message(event="tracking_info", frame=3, instance="cam1")
+    assert message == {"event": "tracking_info", "frame": 3, "instance": "cam1"}
+
+    with patch("app.utils.logger.json.loads") as loads:
+        line = CloudCompatibleFormatter().format(make_record(message))
+    loads.assert_not_called()
+    assert json.loads(line)["message"] == message
+
+
+def test_rate_limiter_limits_and_samples_per_event():
+    limiter = EventRateLimiter({"http_request": {"max_per_second": 2}, "person_counter_update": {"sample_every": 3}})
+
+    kept = [limiter.filter(make_record({"event": "http_request"}, created=1000.0 + i * 0.1)) for i in range(5)]
+    assert kept == [True, True, False, False, False]
+    record = make_record({"event": "http_request"}, created=1001.5)
+    assert limiter.filter(record)
+    assert record.msg["suppressed"] == 3
+
+    assert [limiter.filter(make_record({"event": "person_counter_update"})) for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert all(limiter.filter(make_record({"event": "other"})) for _ in range(10))
+
+
+def test_queue_handler_never_blocks():
+    handler = StructuredQueueHandler(queue.Queue(2))
+    for _ in range(5):
+        handler.handle(make_record({"event": "tracking_info"}))
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    assert isinstance(handler.queue.get().msg, dict)
@@ -0,0 +1,127 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from io import BytesIO
+
+from app.api.request_handler import RequestHandler
+from app.utils.metrics import Counter, Histogram, InstanceStageMetrics, instance_snapshot, render_metrics
+from app.utils.shared_state import remote_instances
+
+
+class MetricsTestHandler(RequestHandler):
+    def __init__(self, instance_config, instances=None):
+        self.instance_config = instance_config
+        self.instances = instances or {}
+        self.client_address = ("127.0.0.1", 0)
+        self.sent_headers = {}
+        self.wfile = BytesIO()
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+
+    def send_header(self, name, value):
+        self.sent_headers[name] = value
+
+    def end_headers(self):
+        pass
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test histogram.", ("instance",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "cam")
+    histogram.observe(0.5, "cam")
+    histogram.observe(5.0, "cam")
+
+    text = histogram.render()
+
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{instance="cam",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{instance="cam",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{instance="cam",le="+Inf"} 3' in text
+    assert 'test_seconds_count{instance="cam"} 3' in text
+    assert 'test_seconds_sum{instance="cam"} 5.55' in text
+
+
+def test_histogram_merges_snapshots_of_other_processes():
+    worker = Histogram("test_seconds", "Test histogram.", ("instance",), buckets=(0.1,))
+    worker.observe(0.05, "remote")
+    api = Histogram("test_seconds", "Test histogram.", ("instance",), buckets=(0.1,))
+
+    text = api.render(worker.snapshot())
+
+    assert 'test_seconds_count{instance="remote"} 1' in text
+
+
+def test_counter_filters_labels():
+    counter = Counter("test_total", "Test counter.", ("instance", "code"))
+    counter.inc("a", "200")
+    counter.inc("a", "200")
+    counter.inc("b", "404")
+
+    text = counter.render(lambda values: values[0] == "a")
+
+    assert 'test_total{instance="a",code="200"} 2' in text
+    assert "b" not in text.split("# TYPE test_total counter")[1]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("test_escaped_total", "Test counter.", ("instance",))
+    counter.inc('door "A"\\2\nleft')
+
+    text = counter.render(lambda values: True)
+
+    assert 'test_escaped_total{instance="door \\"A\\"\\\\2\\nleft"} 1' in text
+    # One line per sample: a raw line feed would split the sample
+    assert len(text.strip().splitlines()) == 3
+
+
+def test_render_metrics_only_exposes_served_instances():
+    InstanceStageMetrics("metrics_cam_a").add("inference", 12.0)
+    InstanceStageMetrics("metrics_cam_b").add("inference", 30.0)
+    InstanceStageMetrics("metrics_cam_a").add("capture_to_publish", 40.0)
+
+    text = render_metrics(["metrics_cam_a"], {}, {})
+
+    assert 'oatracker_stage_duration_seconds_count{instance="metrics_cam_a",stage="inference"} 1' in text
+    assert 'oatracker_capture_to_publish_seconds_count{instance="metrics_cam_a"} 1' in text
+    assert "metrics_cam_b" not in text
+
+
+def test_render_metrics_includes_worker_histograms():
+    InstanceStageMetrics("metrics_worker").add("inference", 20.0)
+    remote_instances["metrics_worker_remote"] = {"metrics": {"stages": [[["metrics_worker_remote", "inference"], *instance_snapshot("metrics_worker")["stages"][0][1:]]]}}
+    try:
+        text = render_metrics(["metrics_worker_remote"], {}, {})
+    finally:
+        del remote_instances["metrics_worker_remote"]
+
+    assert 'oatracker_stage_duration_seconds_count{instance="metrics_worker_remote",stage="inference"} 1' in text
+
+
+def test_metrics_route_uses_prometheus_text_format():
+    InstanceStageMetrics("metrics_route").add("decode", 1.0)
+    handler = MetricsTestHandler({"name": "metrics_route", "camera": "0"})
+    handler.path = "/metrics"
+
+    handler.route_get()
+
+    assert handler.status_code == 200
+    assert handler.sent_headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert b'oatracker_stage_duration_seconds_count{instance="metrics_route",stage="decode"} 1' in handler.wfile.getvalue()
+
+
+def test_shared_listener_exposes_all_instances():
+    InstanceStageMetrics("metrics_shared_a").add("decode", 1.0)
+    InstanceStageMetrics("metrics_shared_b").add("decode", 1.0)
+    instances = {"metrics_shared_a": {"name": "metrics_shared_a"}, "metrics_shared_b": {"name": "metrics_shared_b"}}
+    handler = MetricsTestHandler(None, instances)
+    handler.path = "/metrics"
+
+    handler.route_get()
+
+    body = handler.wfile.getvalue()
+    assert b'instance="metrics_shared_a"' in body
+    assert b'instance="metrics_shared_b"' in body
@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from app.utils.shared_state import latest_detections, get_latest_detections, get_detection_version
+from app.vision.motion import MotionGate
+from app.vision.track import refresh_detections
+
+
+def corridor(person_x=None):
+    rng = np.random.default_rng(0)
+    frame = np.full((360, 640, 3), 90, dtype=np.uint8)
+    # Sensor noise well below the pixel threshold
+    frame += rng.integers(0, 6, frame.shape, dtype=np.uint8)
+    if person_x is not None:
+        frame[100:300, person_x : person_x + 60] = 220
+    return frame
+
+
+def test_static_frames_are_skipped_until_max_skip():
+    gate = MotionGate(max_skip_seconds=1.0)
+
+    assert gate.should_process(corridor(), now=0.0)
+    assert not gate.should_process(corridor(), now=0.1)
+    assert not gate.should_process(corridor(), now=0.5)
+    # A static scene still goes through inference regularly
+    assert gate.should_process(corridor(), now=1.2)
+
+    assert gate.get_stats()["processed_frames"] == 2
+    assert gate.get_stats()["skipped_frames"] == 2
+    assert gate.get_stats()["skipped_ratio"] == 0.5
+
+
+def test_motion_triggers_inference():
+    gate = MotionGate()
+    assert gate.should_process(corridor(), now=0.0)
+    assert gate.should_process(corridor(person_x=100), now=0.1)
+    assert gate.should_process(corridor(person_x=140), now=0.2)
+    assert not gate.should_process(corridor(person_x=140), now=0.3)
+
+
+PERSON = {"id": 7, "label": "person", "box": [10.0, 10.0, 5.0, 5.0], "confidence": 0.9}
+
+
+def test_skipped_frame_republishes_last_detection():
+    instance_name = "test_motion_refresh"
+    assert refresh_detections(10, instance_name) is None
+
+    latest_detections[instance_name] = [{"timestamp": 1, "fps": 5, "input_source": "cam", "tracked_objects": [PERSON]}]
+    version = get_detection_version(instance_name)
+    detection = refresh_detections(10, instance_name).to_dict()
+
+    assert detection["tracked_objects"] == [PERSON]
+    assert detection["timestamp"] > 1
+    assert get_latest_detections(instance_name) == [detection]
+    assert get_detection_version(instance_name) == version + 1
@@ -0,0 +1,98 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+
+import pytest
+import torch
+from ultralytics.engine.results import Results
+
+from app.benchmark.synthetic import generate_video
+from app.offline.runner import output_names, parse_start_time, process_file
+from app.offline.writers import JSONL, PARQUET, create_writer, pyarrow_available
+
+START_MS = 1_700_000_000_000
+
+
+class FakeModel:
+    names = {0: "person"}
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.frames = 0
+
+    def predict(self, frames, classes=None, verbose=False, **options):
+        self.batch_sizes.append(len(frames))
+        results = []
+        for frame in frames:
+            # One person walking to the right, 2 pixels per frame
+            x = 10.0 + 2 * self.frames
+            self.frames += 1
+            boxes = torch.tensor([[x, 10.0, x + 20.0, 50.0, 0.9, 0.0]])
+            results.append(Results(frame, path="", names=self.names, boxes=boxes))
+        return results
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    return generate_video(tmp_path_factory.mktemp("offline") / "walk.mp4", width=160, height=120, fps=10, seconds=2, people=1)
+
+
+def read_jsonl(path):
+    with open(path) as lines:
+        return [json.loads(line) for line in lines]
+
+
+def test_jsonl_results_are_timestamped_from_the_video(video, tmp_path):
+    model = FakeModel()
+
+    summary = process_file(video, model, tmp_path, JSONL, batch_size=8, start_ms=START_MS)
+
+    assert model.batch_sizes == [8, 8, 4]
+    assert summary["frames"] == 20
+    assert summary["persons"] == 1
+    detections = read_jsonl(tmp_path / "walk.detections.jsonl")
+    # Presentation times at 10 FPS, whatever the processing speed
+    assert [detection["pts_ms"] for detection in detections] == list(range(0, 2000, 100))
+    assert [detection["timestamp"] for detection in detections] == [START_MS + pts for pts in range(0, 2000, 100)]
+    assert detections[0]["tracked_objects"][0]["label"] == "person"
+    # The same (id, first, latest) intervals the person counter keeps in live mode
+    [track] = read_jsonl(tmp_path / "walk.tracks.jsonl")
+    assert (track["first"], track["latest"]) == (START_MS, START_MS + 1900)
+
+
+@pytest.mark.skipif(not pyarrow_available(), reason="pyarrow is not installed")
+def test_parquet_results_have_one_row_per_object(video, tmp_path):
+    import pyarrow.parquet as pq
+
+    summary = process_file(video, FakeModel(), tmp_path, PARQUET, batch_size=16, start_ms=START_MS)
+
+    detections = pq.read_table(tmp_path / "walk.detections.parquet").to_pydict()
+    assert len(detections["timestamp"]) == summary["objects"] == 20
+    assert detections["timestamp"][:2] == [START_MS, START_MS + 100]
+    assert set(detections["label"]) == {"person"}
+    assert detections["w"][0] == pytest.approx(20.0)
+    tracks = pq.read_table(tmp_path / "walk.tracks.parquet").to_pydict()
+    assert (tracks["first"], tracks["latest"]) == ([START_MS], [START_MS + 1900])
+
+
+def test_start_time_formats():
+    assert parse_start_time("1700000000") == START_MS
+    assert parse_start_time("2023-11-14T22:13:20+00:00") == START_MS
+    assert parse_start_time("2023-11-14T22:13:20Z") == START_MS
+    with pytest.raises(ValueError):
+        create_writer("csv", "out")
+
+
+def test_output_names_keep_files_with_the_same_name_apart(tmp_path):
+    files = [tmp_path / "a" / "cam.mp4", tmp_path / "b" / "cam.mp4", tmp_path / "a" / "cam.mkv", tmp_path / "b" / "door.mp4"]
+
+    names = output_names([str(path) for path in files])
+
+    assert names == [os.path.join("a", "cam.mp4"), os.path.join("b", "cam"), os.path.join("a", "cam.mkv"), os.path.join("b", "door")]
+    assert output_names([str(tmp_path / "walk.mp4")]) == ["walk"]
+    with pytest.raises(ValueError):
+        output_names([str(files[0]), str(files[0])])
@@ -0,0 +1,222 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+import time
+from unittest.mock import patch
+from app.utils.count_rollups import CountRollups
+from app.utils.interval_index import IntervalIndex
+from app.utils.person_counter import PersonCounter
+from app.utils.track_store import TrackIntervalStore
+
+
+def brute_force_count(intervals, lo, hi):
+    return sum(1 for start, end in intervals.values() if start <= hi and end >= lo)
+
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(42)
+    index = IntervalIndex()
+    intervals = {}
+    now = 0
+    for step in range(5000):
+        now += rng.randint(0, 50)
+        key = rng.randint(0, 300)
+        if key in intervals and rng.random() < 0.9:
+            intervals[key] = (intervals[key][0], now)
+            index.extend(key, now)
+        else:
+            intervals[key] = (now, now)
+            index.add(key, now)
+        if step % 250 == 0:
+            for _ in range(20):
+                lo = rng.randint(0, now)
+                hi = rng.randint(lo, now + 100)
+                assert index.count_overlapping(lo, hi) == brute_force_count(intervals, lo, hi)
+
+    assert len(index) == len(intervals)
+    assert index.count_overlapping(0, now) == len(intervals)
+
+
+def test_interval_index_handles_out_of_order_endpoints():
+    index = IntervalIndex()
+    index.add("a", 100, 200)
+    index.add("b", 50, 60)
+    index.extend("a", 150)
+
+    assert index.count_overlapping(55, 55) == 1
+    assert index.count_overlapping(100, 150) == 1
+    assert index.count_overlapping(0, 1000) == 2
+
+
+def test_interval_index_removes_expired_intervals():
+    index = IntervalIndex()
+    for key in range(10):
+        index.add(key, key * 10)
+    index.extend(0, 1000)
+
+    assert index.remove_ended_before(55) == 5
+    assert sorted(key for key, _, _ in index.items()) == [0, 6, 7, 8, 9]
+    assert index.count_overlapping(0, 2000) == 5
+
+
+def test_person_counter_keeps_more_than_500_tracks():
+    counter = PersonCounter("test_many_tracks")
+    counter.update([{"id": track_id, "label": "person"} for track_id in range(2000)])
+    counter.update([{"id": 1, "label": "car"}, {"id": None, "label": "person"}])
+    now = time.time()
+
+    assert counter.get_count(now - 10, now) == 2000
+    assert counter.get_count(now + 10, now + 20) == 0
+    assert counter.get_count_since_boot() == 2000
+
+
+def test_person_counter_drops_tracks_after_retention():
+    # On an hour boundary: past the last hour, the rollups only hold minute boundaries
+    start = 997_200.0
+    with patch("app.utils.person_counter.time.time", return_value=start):
+        counter = PersonCounter("test_retention", retention_hours=1)
+        counter.update([{"id": 1, "label": "person"}, {"id": 2, "label": "person"}])
+    with patch("app.utils.person_counter.time.time", return_value=start + 1800):
+        counter.update([{"id": 2, "label": "person"}])
+    with patch("app.utils.person_counter.time.time", return_value=start + 3700):
+        counter.update([{"id": 3, "label": "person"}])
+        # Only the rollups still count track 1
+        assert counter.get_count(start, start + 3700) == 3
+        assert counter.get_count(start + 240, start + 3700) == 2
+        assert counter.get_movement(1) is None
+        assert counter.get_movement(2) == (int(start * 1000), int((start + 1800) * 1000))
+
+
+def simulate_rollups(rng):
+    # 1 s buckets over 2 minutes, 10 s buckets over 20 minutes, 1 min buckets over 3 hours
+    rollups = CountRollups([(1, 120), (10, 120), (60, 180)], since_ms=0)
+    intervals = {}
+    now = 0
+    for _ in range(3000):
+        now += rng.randint(0, 2000)
+        rollups.advance(now)
+        seen = set(rng.sample(range(200), 5))
+        new = 0
+        for key in seen:
+            if key in intervals and now - intervals[key][1] < 60_000:
+                rollups.extend(intervals[key][1], now)
+                intervals[key] = (intervals[key][0], now)
+            else:
+                # A track id seen again after a minute is a new track
+                intervals[(key, now)] = intervals.pop(key, None)
+                intervals[key] = (now, now)
+                new += 1
+        rollups.add(new)
+    tracks = [interval for interval in intervals.values() if interval is not None]
+    return rollups, tracks, now
+
+
+def test_rollups_match_brute_force_on_bucket_boundaries():
+    rng = random.Random(7)
+    rollups, tracks, now = simulate_rollups(rng)
+
+    for resolution, oldest in ((1000, now - 119_000), (10_000, now - 1_190_000), (60_000, 0)):
+        for _ in range(50):
+            lo = rng.randint(max(oldest, 0) // resolution + 1, now // resolution) * resolution
+            hi = rng.randint(lo // resolution, now // resolution + 1) * resolution
+            # Both ends are inclusive
+            assert rollups.count(lo, hi) == sum(1 for start, end in tracks if start <= hi and end >= lo)
+
+
+def test_person_counter_counts_past_retention_from_rollups():
+    # On an hour boundary, so that minute and hour buckets line up with the queries
+    start = 997_200.0
+    with patch("app.utils.person_counter.time.time", return_value=start):
+        counter = PersonCounter("test_rollups", retention_hours=1)
+    for minute in range(180):
+        # Two new persons a minute, each seen for 30 seconds
+        now_ms = int((start + minute * 60) * 1000)
+        counter.update_ids([2 * minute, 2 * minute + 1], now_ms=now_ms)
+        counter.update_ids([2 * minute, 2 * minute + 1], now_ms=now_ms + 30_000)
+    with patch("app.utils.person_counter.time.time", return_value=start + 180 * 60):
+        # Only the tracks of the last hour are retained
+        assert len(counter) <= 2 * 61
+        assert counter.get_count(start, start + 2 * 3600) == 242
+        assert counter.get_count(start + 3600, start + 3 * 3600) == 240
+    assert counter.rollups.nbytes < 600_000
+
+
+def test_rollups_count_edges_inside_buckets_from_the_source():
+    rng = random.Random(11)
+    rollups, tracks, now = simulate_rollups(rng)
+
+    def brute_force(lo, hi):
+        return sum(1 for start, end in tracks if start <= hi and end >= lo)
+
+    def inside_bucket(time_ms):
+        # Whether the finest tier holding time_ms has a bucket boundary there
+        if time_ms >= now - 119_000:
+            return False
+        return time_ms % (10_000 if time_ms >= now - 1_190_000 else 60_000) != 0
+
+    answered = 0
+    for _ in range(300):
+        # Half of the ranges start within the reach of the 1 s tier
+        lo = rng.randint(0, now) if rng.random() < 0.5 else rng.randint(now - 150_000, now)
+        hi = rng.randint(lo, now + 5000)
+        assert rollups.count(lo, hi, brute_force) == brute_force(lo, hi)
+        # Without a source, ends on a second are answered wherever a tier holds that boundary
+        lo, hi = lo // 1000 * 1000, hi // 1000 * 1000
+        count = rollups.count(lo, hi)
+        if count is None:
+            # Ends inside a bucket coarser than the second, where no finer tier reaches, are never rounded to it
+            assert inside_bucket(lo) or inside_bucket(hi)
+            continue
+        answered += 1
+        assert count == brute_force(lo, hi)
+    assert answered > 100
+
+
+def test_person_counter_counts_hour_aligned_ranges_days_back():
+    # Midnight; a frame every 10 s over three days. Person 2m is seen 30 s from minute m, person 2m + 1
+    # from 20 s to 110 s after it, so tracks span bucket boundaries and start exactly on them
+    start = 86_400 * 12
+    with patch("app.utils.person_counter.time.time", return_value=start):
+        counter = PersonCounter("test_rollup_days", retention_hours=1)
+    tracks = {}
+    for frame in range(3 * 8640):
+        offset = frame * 10
+        minute, second = divmod(offset, 60)
+        ids = [2 * minute] if second <= 30 else []
+        ids += [2 * m + 1 for m in (minute - 1, minute) if m >= 0 and 20 <= offset - m * 60 <= 110]
+        now_ms = (start + offset) * 1000
+        counter.update_ids(ids, now_ms=now_ms)
+        for track_id in ids:
+            tracks[track_id] = (tracks.get(track_id, (now_ms,))[0], now_ms)
+    end = start + 3 * 86_400
+    with patch("app.utils.person_counter.time.time", return_value=end):
+        # 09:00 to 17:00 two days back, inclusive of the tracks starting at 17:00
+        lo, hi = start + 9 * 3600, start + 17 * 3600
+        expected = sum(1 for first, latest in tracks.values() if first <= hi * 1000 and latest >= lo * 1000)
+        assert counter.get_count(lo, hi) == expected
+        assert counter.get_count(start + 86_400, end) == sum(1 for _, latest in tracks.values() if latest >= (start + 86_400) * 1000)
+        # Ends inside a minute bucket, past the last hour and without a store, are not counted from evicted tracks
+        assert counter.get_count(lo + 30, hi) is None
+        assert counter.get_count(start - 3600, hi) is None
+
+
+def test_person_counter_counts_edges_inside_coarse_buckets_from_the_store(tmp_path):
+    start = 997_200.0
+    with patch("app.utils.person_counter.time.time", return_value=start):
+        counter = PersonCounter("test_rollup_edges", retention_hours=1, store=TrackIntervalStore(tmp_path))
+    for minute in range(180):
+        now_ms = int((start + minute * 60) * 1000)
+        counter.update_ids([2 * minute, 2 * minute + 1], now_ms=now_ms)
+        counter.update_ids([2 * minute, 2 * minute + 1], now_ms=now_ms + 30_000)
+    with patch("app.utils.person_counter.time.time", return_value=start + 180 * 60):
+        counter.flush()
+        # Starting 45 s into the first minute: the two persons of minute 0 left after 30 s. Rounding the
+        # start down to the minute bucket would count them
+        assert counter.rollups.count(int((start + 45) * 1000), int((start + 2 * 3600 - 1) * 1000)) is None
+        assert counter.get_count(start + 45, start + 2 * 3600 - 1) == 238
+        assert counter.get_count(start + 60, start + 2 * 3600 - 1) == 238
+        assert counter.get_count(start + 60, start + 2 * 3600) == 240
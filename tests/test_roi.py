@@ -0,0 +1,61 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+import torch
+from types import SimpleNamespace
+from ultralytics.engine.results import Results
+from app.vision.roi import RegionOfInterest
+from app.vision.track import update_detections
+
+
+def make_frame():
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    frame[:, :, 0] = np.arange(200, dtype=np.uint8)
+    return frame
+
+
+def test_rect_roi_crops_frame():
+    roi = RegionOfInterest.from_config([50, 20, 150, 80])
+    crop = roi.apply(make_frame())
+
+    assert crop.shape == (60, 100, 3)
+    assert crop[0, 0, 0] == 50
+    assert crop.flags["C_CONTIGUOUS"]
+    assert roi.offset == (50, 20)
+    assert roi.area_fraction() == 0.3
+
+
+def test_normalized_polygon_roi_masks_outside_pixels():
+    roi = RegionOfInterest.from_config({"polygon": [[0.25, 0.0], [0.75, 0.0], [0.75, 1.0]]})
+    crop = roi.apply(make_frame())
+
+    assert roi.offset == (50, 0)
+    assert crop.shape == (100, 100, 3)
+    # Top right corner is inside the triangle, bottom left is outside
+    assert crop[1, 98, 0] == 148
+    assert crop[98, 1, 0] == 0
+
+
+def test_invalid_roi_is_rejected():
+    assert RegionOfInterest.from_config(None) is None
+    with pytest.raises(ValueError):
+        RegionOfInterest.from_config({"polygon": [[0, 0], [1, 1]]})
+
+
+def test_boxes_are_mapped_back_to_full_frame():
+    crop = np.zeros((60, 100, 3), dtype=np.uint8)
+    boxes = torch.tensor([[10.0, 10.0, 30.0, 50.0, 1.0, 0.9, 0.0]])
+    results = [Results(crop, path="", names={0: "person"}, boxes=boxes)]
+    results[0].speed = {"preprocess": 1.0, "inference": 2.0, "postprocess": 3.0}
+    model = SimpleNamespace(names={0: "person"})
+
+    detection = update_detections(results, model, "cam", 10, "test_roi_offset", offset=(50, 20)).to_dict()
+
+    assert detection["tracked_objects"][0]["box"] == [70.0, 50.0, 20.0, 40.0]
+    # The result itself keeps crop coordinates for display
+    assert results[0].boxes.xywh[0, 0].item() == 20.0
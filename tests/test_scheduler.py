@@ -0,0 +1,113 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+from ultralytics.engine.results import Results
+
+from app.vision.inference import InferenceService
+from app.vision.scheduler import FrameScheduler
+
+FRAME = np.zeros((32, 32, 3), dtype=np.uint8)
+
+
+class SlowModel:
+    # Every forward pass costs `cost` seconds whatever the batch size, like a GPU below its saturation point
+    names = {0: "person"}
+
+    def __init__(self, cost):
+        self.cost = cost
+
+    def predict(self, frames, classes=None, verbose=False, device=None):
+        time.sleep(self.cost)
+        return [Results(frame, path="", names=self.names, boxes=torch.zeros((0, 6))) for frame in frames]
+
+
+def run_instances(service, schedules, seconds):
+    # Runs one tracking loop per instance, as track.py does, and returns the frames each one got through
+    frames = {name: 0 for name in schedules}
+    stop = threading.Event()
+
+    def loop(name):
+        while not stop.is_set():
+            service.wait_turn(name)
+            service.track(name, FRAME, [0])
+            frames[name] += 1
+
+    for name, (target_fps, priority) in schedules.items():
+        service.register(name, target_fps, priority)
+    threads = [threading.Thread(target=loop, args=(name,), daemon=True) for name in schedules]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {name: count / seconds for name, count in frames.items()}
+
+
+def test_instances_are_held_to_their_target_fps():
+    service = InferenceService(SlowModel(0.001), "fake", max_batch_size=1, max_wait_ms=1, device="cpu").start()
+
+    rates = run_instances(service, {"slow": (5, 1.0), "fast": (20, 1.0)}, 1.0)
+
+    assert 4 <= rates["slow"] <= 6.5
+    assert 17 <= rates["fast"] <= 22
+    stats = service.scheduler.get_stats("fast")
+    assert stats["target_fps"] == 20
+    assert stats["achieved_fps"] > 15
+    assert not stats["below_target"]
+
+
+def test_overloaded_instances_slow_down_in_proportion_to_their_target():
+    # One frame at a time and 20 ms per frame: 50 frames/s for 90 frames/s of targets
+    service = InferenceService(SlowModel(0.02), "fake", max_batch_size=1, max_wait_ms=1, device="cpu").start()
+
+    rates = run_instances(service, {"a": (30, 1.0), "b": (60, 1.0)}, 1.5)
+
+    assert rates["a"] + rates["b"] <= 52
+    assert rates["b"] / rates["a"] > 1.5
+    assert rates["a"] > 10
+
+
+def test_priority_keeps_an_instance_closer_to_its_target():
+    service = InferenceService(SlowModel(0.02), "fake", max_batch_size=1, max_wait_ms=1, device="cpu").start()
+
+    rates = run_instances(service, {"low": (40, 1.0), "high": (40, 4.0)}, 1.5)
+
+    assert rates["high"] > 1.3 * rates["low"]
+    assert rates["low"] > 5
+
+
+def test_worker_pool_runs_batches_in_parallel():
+    one = InferenceService(SlowModel(0.02), "fake", max_batch_size=1, max_wait_ms=1, device="cpu").start()
+    two = InferenceService(SlowModel(0.02), "fake", max_batch_size=1, max_wait_ms=1, device="cpu", worker_models=[SlowModel(0.02)]).start()
+    schedules = {f"cam{i}": (None, 1.0) for i in range(4)}
+
+    single = sum(run_instances(one, schedules, 1.0).values())
+    pooled = sum(run_instances(two, schedules, 1.0).values())
+
+    assert two.get_stats()["workers"] == 2
+    assert pooled > 1.6 * single
+
+
+def test_invalid_schedules_are_rejected_and_targets_can_be_cleared():
+    scheduler = FrameScheduler()
+    for target_fps, priority in ((0, 1.0), (-5, 1.0), (10, 0), (None, -1)):
+        with pytest.raises(ValueError):
+            scheduler.register("camera", target_fps, priority)
+    assert "camera" not in scheduler.instances
+
+    scheduler.register("camera", 10, 2)
+    assert scheduler.get_stats("camera")["target_fps"] == 10
+    # No target any more: the instance runs as fast as its share allows
+    scheduler.register("camera", None)
+    schedule = scheduler.instances["camera"]
+    assert (schedule.target_fps, schedule.period, schedule.priority) == (None, 0.0, 1.0)
@@ -0,0 +1,172 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from app.utils import shared_state
+from app.utils.frame_record import FrameRecord
+from app.utils.person_counter import PersonCounter
+from app.utils.track_store import TrackIntervalStore
+from app.utils.shared_state import add_detection, get_unique_object_counts, get_unique_object_counts_by_window, get_latest_detections
+from app.utils.shm_publisher import SharedInstanceSegment, InstancePublisher, RemoteInstanceView, RemotePersonCounter
+
+
+def make_detection(objects):
+    return {
+        "timestamp": int(time.time() * 1000),
+        "input_source": "video.mp4",
+        "fps": 30.0,
+        "tracked_objects": [{"id": id, "label": label, "box": [0, 0, 1, 1], "confidence": 0.9} for id, label in objects],
+    }
+
+
+@pytest.fixture
+def segment():
+    segment = SharedInstanceSegment.create(f"oattest{os.getpid()}", snapshot_capacity=64 * 1024, interval_capacity=4)
+    yield segment
+    segment.close()
+
+
+def test_window_counts_cover_every_window():
+    instance = "test_window_counts"
+    add_detection(make_detection([(1, "person"), (None, "car")]), instance)
+    add_detection(make_detection([(1, "person"), (2, "person"), (None, "car")]), instance)
+
+    counts = get_unique_object_counts_by_window(30, instance)
+
+    assert sorted(counts) == list(range(1, 31))
+    for seconds in (1, 10, 30):
+        assert counts[seconds] == get_unique_object_counts(seconds, instance) == {"person": 2, "car": 2}
+
+
+def test_published_state_is_visible_to_reader(segment):
+    instance = "test_shm_instance"
+    counter = PersonCounter(instance)
+    detection = make_detection([(7, "person"), (8, "person")])
+    counter.update(detection["tracked_objects"])
+    shared_state.latest_detections[instance] = [detection]
+    add_detection(detection, instance)
+
+    publisher = InstancePublisher(segment, instance, publish_interval_ms=0)
+    publisher.publish(detection, counter, {"capture": {"frames_dropped": 3}})
+
+    view = RemoteInstanceView(segment, instance)
+    assert view.get_latest_detections() == [detection]
+    assert view.get_unique_object_counts(5) == {"person": 2}
+    assert view.get("capture") == {"frames_dropped": 3}
+
+    remote_counter = RemotePersonCounter(segment, instance)
+    now = time.time()
+    assert remote_counter.get_count(now - 60, now + 1) == 2
+    assert remote_counter.get_count(now - 120, now - 60) == 0
+    assert remote_counter.get_count_since_boot() == 2
+
+    shared_state.remote_instances[instance] = view
+    try:
+        assert get_latest_detections(instance) == [detection]
+    finally:
+        del shared_state.remote_instances[instance]
+
+
+def test_interval_ring_overwrites_oldest_tracks(segment):
+    instance = "test_shm_ring"
+    counter = PersonCounter(instance)
+    publisher = InstancePublisher(segment, instance, publish_interval_ms=60000)
+    for track_id in range(6):
+        detection = make_detection([(track_id, "person")])
+        counter.update(detection["tracked_objects"])
+        publisher.publish(detection, counter)
+
+    assert sorted(segment.intervals["id"].tolist()) == [2, 3, 4, 5]
+    remote_counter = RemotePersonCounter(segment, instance)
+    # Tracks 0 and 1 were overwritten: a range reaching back to them is not answered with a low count
+    assert remote_counter.get_count(0, time.time() + 1) is None
+    assert remote_counter.get_count(time.time() + 0.5, time.time() + 1) == 0
+
+
+def test_interval_reads_retry_while_the_ring_is_written(segment):
+    instance = "test_shm_torn"
+    counter = PersonCounter(instance)
+    publisher = InstancePublisher(segment, instance, publish_interval_ms=60000)
+    detection = make_detection([(1, "person"), (2, "person")])
+    counter.update(detection["tracked_objects"])
+    publisher.publish(detection, counter)
+    reads = []
+
+    def reader(rows, header):
+        # The writer starts updating the ring during the first read
+        if not reads:
+            seq = segment.begin("interval_seq")
+            segment.intervals[0]["latest"] = 0
+            segment.end("interval_seq", seq)
+        reads.append(len(rows))
+        return int(np.count_nonzero(rows["latest"] > 0))
+
+    assert segment.read_intervals(reader) == 1
+    assert len(reads) == 2
+
+
+def test_detections_are_published_as_columns(segment):
+    instance = "test_shm_columns"
+    frame = FrameRecord.from_box_data(
+        1_700_000_000_000,
+        "rtsp://camera",
+        25.0,
+        [[10, 20, 50, 80, 3, 0.75, 0], [0, 0, 4, 4, 9, 0.5, 2]],
+        {0: "person", 1: "bicycle", 2: "car"},
+        speeds=(1.5, 20.25, 0.5),
+        captured_at=1_699_999_999_950,
+    )
+    shared_state.latest_detections[instance] = [frame]
+    shared_state.bump_detection_version(instance)
+    publisher = InstancePublisher(segment, instance, publish_interval_ms=0)
+    publisher.publish(frame, PersonCounter(instance))
+
+    view = RemoteInstanceView(segment, instance)
+    assert view.get_latest_detections() == [frame.to_dict()]
+    version = view.get_version()
+    # The snapshot no longer carries the detections
+    assert "latest" not in view.get_snapshot()
+
+    # Unchanged detections are not published again
+    publisher.publish(None, PersonCounter(instance))
+    assert view.get_version() == version
+    shared_state.latest_detections[instance] = []
+    shared_state.bump_detection_version(instance)
+    publisher.publish(None, PersonCounter(instance))
+    assert view.get_version() == version + 1
+    assert view.get_latest_detections() == []
+
+
+def test_old_ranges_merge_the_store_with_unflushed_tracks(segment, tmp_path):
+    instance = "test_shm_store"
+    start = 997_200.0
+    store = TrackIntervalStore(tmp_path)
+    with patch("app.utils.person_counter.time.time", return_value=start):
+        counter = PersonCounter(instance, retention_hours=1, store=store)
+    counter.flush_ms = 3600 * 1000
+    publisher = InstancePublisher(segment, instance, publish_interval_ms=60000)
+    # Tracks 0 to 5 are flushed, tracks 6 and 7 only live in the ring
+    for track_id in range(8):
+        now_ms = int((start + track_id * 60) * 1000)
+        counter.update_ids([track_id], now_ms=now_ms)
+        if track_id == 5:
+            counter.flush(now_ms)
+        publisher.publish_intervals([track_id], counter)
+
+    remote_counter = RemotePersonCounter(segment, instance, TrackIntervalStore(tmp_path, readonly=True), retention_ms=counter.retention_ms)
+    # Tracks 0 to 3 were overwritten in the ring of 4 rows, but are in the store
+    assert remote_counter.get_count(start, start + 600) == 8
+    assert remote_counter.get_count(start + 90, start + 600) == 6
+    # Once the ring overwrites track 6, which started after the last flush, the range is refused
+    for track_id in (8, 9, 10):
+        counter.update_ids([track_id], now_ms=int((start + track_id * 60) * 1000))
+        publisher.publish_intervals([track_id], counter)
+    assert remote_counter.get_count(start, start + 600) is None
@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import importlib
+import platform
+import subprocess
+import pytest
+from unittest.mock import patch
+from app.utils.shared_state import set_instance_state
+from tests.test_api import TestRequestHandler
+
+# app.utils re-exports the list_cameras function under the module's name
+cameras = importlib.import_module("app.utils.list_cameras")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_cli_modules_do_not_import_torch():
+    code = "import sys, tracker, app; assert 'torch' not in sys.modules and 'ultralytics' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, check=True, capture_output=True)
+
+
+@pytest.mark.skipif(platform.system() == "Darwin", reason="macOS lists cameras through AVFoundation")
+def test_camera_inventory_is_probed_in_parallel_and_cached(tmp_path, monkeypatch):
+    monkeypatch.setitem(cameras.CAMERA_SETTINGS, "cache_file", str(tmp_path / "cameras.json"))
+    probed = []
+
+    def probe(index):
+        probed.append(index)
+        return index != 2
+
+    with patch.object(cameras, "candidate_indices", return_value=[0, 2, 4]), patch.object(cameras, "probe_camera", side_effect=probe):
+        assert [camera["index"] for camera in cameras.list_available_cameras()] == [0, 4]
+        assert [camera["index"] for camera in cameras.list_available_cameras()] == [0, 4]
+        assert sorted(probed) == [0, 2, 4]
+
+        cameras.list_available_cameras(refresh=True)
+        assert len(probed) == 6
+
+    # A new device node invalidates the inventory
+    with patch.object(cameras, "candidate_indices", return_value=[0, 2, 4, 6]), patch.object(cameras, "probe_camera", side_effect=probe):
+        assert [camera["index"] for camera in cameras.list_available_cameras()] == [0, 4, 6]
+
+
+def test_health_reports_starting_until_warmed_up():
+    handler = TestRequestHandler({"name": "test_warm_up"})
+    set_instance_state("test_warm_up", "warming_up", started_at=0)
+    assert handler.build_health_status()["status"] == "starting"
+
+    set_instance_state("test_warm_up", "running", time_to_ready=1.5)
+    health = handler.build_health_status()
+    assert health["state"] == "running"
+    assert health["time_to_ready"] == 1.5
@@ -0,0 +1,157 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+from unittest.mock import patch
+
+import numpy as np
+
+from app.utils.person_counter import PersonCounter
+from app.utils.track_store import RECORD_DTYPE, TrackIntervalStore
+
+HOUR_MS = 3600 * 1000
+
+
+def brute_force_count(tracks, lo, hi):
+    return sum(1 for first, latest in tracks.values() if first <= hi and latest >= lo)
+
+
+def write_random_tracks(store, rng, hours=48):
+    # Tracks are flushed repeatedly while visible, as the person counter does
+    tracks = {}
+    for track_id in range(600):
+        first = rng.randint(0, hours * HOUR_MS)
+        latest = first
+        for _ in range(rng.randint(1, 4)):
+            latest += rng.randint(0, 2 * HOUR_MS if rng.random() < 0.05 else 60_000)
+            store.append([(first, latest, track_id % 50)])
+        tracks[(first, track_id % 50)] = (first, latest)
+    return tracks
+
+
+def test_store_counts_match_brute_force_before_and_after_compaction(tmp_path):
+    rng = random.Random(7)
+    store = TrackIntervalStore(tmp_path, partition_minutes=60)
+    tracks = write_random_tracks(store, rng)
+    queries = [(lo, lo + rng.randint(0, 30 * HOUR_MS)) for lo in (rng.randint(0, 50 * HOUR_MS) for _ in range(50))]
+    queries.append((0, 100 * HOUR_MS))
+
+    for lo, hi in queries:
+        assert store.count(lo, hi) == brute_force_count(tracks, lo, hi)
+
+    compacted, removed = store.compact(now_ms=60 * HOUR_MS)
+    assert compacted > 0 and removed == 0
+    assert not list(tmp_path.glob("*.log"))
+
+    for lo, hi in queries:
+        assert store.count(lo, hi) == brute_force_count(tracks, lo, hi)
+
+
+def test_store_keeps_counting_tracks_reopened_after_compaction(tmp_path):
+    store = TrackIntervalStore(tmp_path, partition_minutes=60)
+    store.append([(1000, 2000, 1), (1500, 1600, 2)])
+    store.compact(now_ms=3 * HOUR_MS)
+    # Track 1 is still visible and flushed again into its compacted partition
+    store.append([(1000, 2 * HOUR_MS, 1)])
+
+    assert store.count(HOUR_MS, 3 * HOUR_MS) == 1
+    assert store.count(0, 3 * HOUR_MS) == 2
+
+
+def test_store_drops_expired_partitions(tmp_path):
+    store = TrackIntervalStore(tmp_path, partition_minutes=60, retention_days=1)
+    store.append([(0, 1000, 1), (30 * HOUR_MS, 30 * HOUR_MS + 1000, 2)])
+
+    compacted, removed = store.compact(now_ms=32 * HOUR_MS)
+
+    assert removed == 1
+    assert store.count(0, 40 * HOUR_MS) == 1
+
+
+def test_store_truncates_partial_rows_on_open(tmp_path):
+    store = TrackIntervalStore(tmp_path, partition_minutes=60)
+    store.append([(1000, 2000, 1)])
+    with open(tmp_path / "0.log", "ab") as log:
+        log.write(b"\x01\x02\x03")
+
+    reopened = TrackIntervalStore(tmp_path, partition_minutes=60)
+    reopened.append([(1500, 2500, 2)])
+
+    assert os.path.getsize(tmp_path / "0.log") == 2 * RECORD_DTYPE.itemsize
+    assert reopened.count(0, 3000) == 2
+
+
+def test_readonly_store_sees_appended_rows(tmp_path):
+    writer = TrackIntervalStore(tmp_path, partition_minutes=60)
+    reader = TrackIntervalStore(tmp_path, partition_minutes=60, readonly=True)
+    assert reader.count(0, HOUR_MS) == 0
+
+    writer.append([(1000, 2000, 1)])
+
+    assert reader.count(0, HOUR_MS) == 1
+
+
+def test_person_counter_restores_tracks_and_counts_old_ranges_from_disk(tmp_path):
+    start = 1_000_000.0
+    with patch("app.utils.person_counter.time.time", return_value=start):
+        counter = PersonCounter("test_store", retention_hours=1, store=TrackIntervalStore(tmp_path))
+        counter.update([{"id": 1, "label": "person"}, {"id": 2, "label": "person"}])
+    with patch("app.utils.person_counter.time.time", return_value=start + 3000):
+        counter.update([{"id": 2, "label": "person"}])
+        counter.flush()
+
+    # After a restart, tracks of the retention window are back in memory
+    with patch("app.utils.person_counter.time.time", return_value=start + 3100):
+        restarted = PersonCounter("test_store", retention_hours=1, store=TrackIntervalStore(tmp_path))
+        assert len(restarted) == 2
+        assert restarted.get_movement((int(start * 1000), 2)) == (int(start * 1000), int((start + 3000) * 1000))
+        restarted.update([{"id": 1, "label": "person"}])
+        assert restarted.get_count(start + 2900, start + 3100) == 2
+
+    # Once track 1 left the retention window, older ranges are still counted from disk
+    with patch("app.utils.person_counter.time.time", return_value=start + 5000):
+        restarted.update([])
+        assert len(restarted) == 2
+        assert restarted.get_count(start, start + 5000) == 3
+
+
+def test_load_keeps_latest_interval_per_track(tmp_path):
+    store = TrackIntervalStore(tmp_path, partition_minutes=60)
+    store.append([(1000, 2000, 1), (1000, 5000, 1), (3000, 3000, 1)])
+
+    rows = store.load(0)
+
+    assert sorted(rows.tolist()) == [(1000, 5000, 1), (3000, 3000, 1)]
+    assert store.load(4000).tolist() == [(1000, 5000, 1)]
+    assert isinstance(rows, np.ndarray)
+
+
+def test_reader_sees_rows_of_a_log_compacted_while_it_reads(tmp_path):
+    writer = TrackIntervalStore(tmp_path, partition_minutes=60)
+    reader = TrackIntervalStore(tmp_path, partition_minutes=60, readonly=True)
+    writer.append([(1000, 2000, 1), (1500, 1600, 2)])
+    (partition,) = reader.scan()
+
+    # The writer compacts between the reader's scan and its read of the partition
+    writer.compact(now_ms=3 * HOUR_MS)
+
+    assert sorted(partition.rows().tolist()) == [(1000, 2000, 1), (1500, 1600, 2)]
+
+
+def test_person_counter_counts_from_disk_without_writing(tmp_path):
+    start = 1_000_000.0
+    store = TrackIntervalStore(tmp_path)
+    with patch("app.utils.person_counter.time.time", return_value=start):
+        counter = PersonCounter("test_store_reads", retention_hours=1, store=store)
+        # Without rollups, old ranges go to the store
+        counter.rollups = None
+        counter.update([{"id": 1, "label": "person"}])
+    with patch("app.utils.person_counter.time.time", return_value=start + 5000), patch.object(store, "append") as append, patch.object(store, "compact") as compact:
+        counter.get_count(start - 10, start + 5000)
+
+    # Flushing and compaction are left to the tracking loop
+    append.assert_not_called()
+    compact.assert_not_called()
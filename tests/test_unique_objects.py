@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import random
+from app.utils.unique_objects import UniqueObjectAggregator
+
+
+def reference_unique_counts(history, now, seconds_ago):
+    # The original algorithm: walk every object of every frame in the window
+    unique_objects = {}
+    for t, tracked_objects in history:
+        if now - t > seconds_ago:
+            continue
+        for obj in tracked_objects:
+            if obj["id"] is not None:
+                unique_objects[(obj["label"], obj["id"])] = obj["label"]
+            else:
+                unique_objects[len(unique_objects), None] = obj["label"]
+    return {label: sum(1 for l in unique_objects.values() if l == label) for label in set(unique_objects.values())}
+
+
+def simulate(frames, fps, seed=3):
+    rng = random.Random(seed)
+    aggregator = UniqueObjectAggregator(30)
+    history = []
+    now = 1000.0
+    for _ in range(frames):
+        now += 1 / fps
+        tracked_objects = [
+            {"id": rng.choice([None, rng.randint(0, 30)]), "label": rng.choice(["person", "car", "dog"])} for _ in range(rng.randint(0, 6))
+        ]
+        aggregator.add(now, tracked_objects)
+        history.append((now, tracked_objects))
+    return aggregator, history, now
+
+
+def test_counts_match_full_scan():
+    aggregator, history, now = simulate(2000, fps=25)
+    for query_time in (now, now + 0.37, now + 4.5):
+        for seconds in range(1, 31):
+            assert aggregator.counts(query_time, seconds) == reference_unique_counts(history, query_time, seconds)
+
+
+def test_counts_by_window_match_single_window_queries():
+    aggregator, history, now = simulate(600, fps=10)
+    counts = aggregator.counts_by_window(now, 30)
+    for seconds in range(1, 31):
+        assert counts[seconds] == aggregator.counts(now, seconds) == reference_unique_counts(history, now, seconds)
+
+
+def test_old_buckets_are_dropped():
+    aggregator, _, now = simulate(3000, fps=20)
+    assert len(aggregator.buckets) <= 31
+    assert aggregator.buckets[0].second >= int(now) - 30
@@ -0,0 +1,147 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import threading
+import time
+import urllib.request
+from urllib.error import HTTPError
+
+import numpy as np
+import pytest
+
+from app.api.request_handler import RequestHandler, TrackerHTTPServer
+from app.utils.frame_record import FrameRecord
+from app.utils.shared_state import zone_engines
+from app.vision.zones import ZoneEngine
+
+NAMES = {0: "person", 2: "car"}
+ZONES = [{"name": "left", "polygon": [[0, 0], [50, 0], [50, 100], [0, 100]]}, {"name": "triangle", "polygon": [[50, 0], [100, 100], [0, 100]]}]
+# A vertical door between y=20 and y=80 at x=50, and a car lane
+LINES = [{"name": "door", "points": [[50, 20], [50, 80]]}, {"name": "lane", "points": [[0, 50], [100, 50]], "labels": ["car"]}]
+
+
+def frame(timestamp, objects):
+    # objects: (track id, class, x, y) anchor points; boxes are 10 px high, standing on their anchor
+    rows = [[x - 5, y - 10, x + 5, y, float(track_id), 0.9, float(cls)] for track_id, cls, x, y in objects]
+    return FrameRecord.from_box_data(timestamp, "test", 10.0, np.array(rows, dtype=np.float32).reshape(-1, 7), NAMES)
+
+
+def create_engine(**options):
+    engine = ZoneEngine(ZONES, LINES, **options)
+    engine.resolve(100, 100)
+    return engine
+
+
+def test_occupancy_counts_the_labels_of_each_zone():
+    engine = create_engine()
+
+    engine.update(frame(0, [(1, 0, 15, 50), (2, 0, 50, 90), (3, 0, 90, 10), (4, 2, 20, 20)]), 0)
+
+    # The car is not counted, and the point at (50, 90) is in both zones
+    assert engine.get_stats()["zones"] == {"left": 2, "triangle": 1}
+    engine.update(None, 100)
+    assert engine.get_stats()["zones"] == {"left": 0, "triangle": 0}
+
+
+def test_crossings_are_counted_by_direction_across_the_segment_only():
+    engine = create_engine()
+    path = [(40, 50), (45, 50), (55, 50), (60, 50), (45, 50)]
+    for step, (x, y) in enumerate(path):
+        # Track 1 walks through the door and back; track 2 passes the line's extension, below the door
+        engine.update(frame(step * 100, [(1, 0, x, y), (2, 0, x, 95)]), step * 100)
+
+    lines = engine.get_stats()["lines"]
+    assert lines["door"]["in"] + lines["door"]["out"] == 2
+    # Left to right looking from (50, 20) down to (50, 80) is from x > 50 to x < 50
+    assert lines["door"] == {"in": 1, "out": 1}
+    assert lines["lane"] == {"in": 0, "out": 0}
+    assert engine.count_crossings(150, 250) == {"door": {"in": 0, "out": 1}, "lane": {"in": 0, "out": 0}}
+    assert engine.count_crossings(0, 1000)["door"] == {"in": 1, "out": 1}
+
+
+def test_track_side_survives_short_occlusions():
+    engine = create_engine(track_ttl_seconds=1)
+    engine.update(frame(0, [(1, 0, 40, 50)]), 0)
+    engine.update(None, 500)
+    engine.update(frame(900, [(1, 0, 60, 50)]), 900)
+    # Gone for longer than the TTL: its side is forgotten, so reappearing across the line is not a crossing
+    engine.update(frame(5000, [(1, 0, 40, 50)]), 5000)
+
+    assert engine.get_stats()["lines"]["door"] == {"in": 0, "out": 1}
+
+
+def test_old_ranges_are_unavailable_once_the_event_ring_wrapped():
+    engine = create_engine(max_events=2)
+    for step in range(4):
+        engine.update(frame(step * 100, [(1, 0, 40 if step % 2 else 60, 50)]), step * 100)
+
+    assert sum(engine.get_stats()["lines"]["door"].values()) == 3
+    assert engine.count_crossings(0, 1000) is None
+    assert engine.count_crossings(200, 1000)["door"] == {"in": 1, "out": 1}
+
+
+def test_invalid_shapes_are_rejected():
+    with pytest.raises(ValueError):
+        ZoneEngine([{"name": "flat", "polygon": [[0, 0], [1, 1]]}])
+    with pytest.raises(ValueError):
+        ZoneEngine(lines=[{"name": "door", "points": [[0, 0], [1, 1], [2, 2]]}])
+    with pytest.raises(ValueError):
+        ZoneEngine(ZONES, anchor="top")
+
+
+def test_hundreds_of_tracks_zones_and_lines_per_frame():
+    rng = np.random.default_rng(0)
+    zones = [{"name": f"zone{i}", "polygon": (rng.random((6, 2)) * 1080).tolist()} for i in range(100)]
+    lines = [{"name": f"line{i}", "points": (rng.random((2, 2)) * 1080).tolist()} for i in range(100)]
+    engine = ZoneEngine(zones, lines)
+    engine.resolve(1920, 1080)
+    positions = rng.random((300, 2)) * 1000
+    durations = []
+    for step in range(50):
+        positions += rng.normal(0, 5, positions.shape)
+        detection = frame(step * 33, [(track_id, 0, x, y) for track_id, (x, y) in enumerate(positions)])
+        start = time.perf_counter()
+        engine.update(detection, step * 33)
+        durations.append(time.perf_counter() - start)
+
+    assert engine.get_stats()["tracks"] == 300
+    # Generous bound for shared test machines; about 1 ms on a laptop core
+    assert np.median(durations) < 0.01
+
+
+@pytest.fixture
+def server():
+    instance_config = {"name": "zones_test", "camera": "zones.mp4", "api_port": 0}
+    zone_engines["zones_test"] = engine = create_engine()
+    engine.update(frame(1000, [(1, 0, 60, 50)]), 1000)
+    engine.update(frame(1100, [(1, 0, 40, 50)]), 1100)
+
+    class InstanceRequestHandler(RequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(instance_config, *args, **kwargs)
+
+    httpd = TrackerHTTPServer(("127.0.0.1", 0), InstanceRequestHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    zone_engines.pop("zones_test", None)
+
+
+def get_json(url):
+    with urllib.request.urlopen(url) as response:
+        return json.load(response)
+
+
+def test_zones_and_lines_routes(server):
+    assert get_json(f"{server}/zones") == {"timestamp": 1100, "zones": {"left": 1, "triangle": 1}}
+    assert get_json(f"{server}/lines")["lines"]["door"] == {"in": 1, "out": 0}
+    assert get_json(f"{server}/lines?from=1050&to=1200")["lines"]["door"] == {"in": 1, "out": 0}
+    assert get_json(f"{server}/lines?from=0&to=1000")["lines"]["door"] == {"in": 0, "out": 0}
+    with pytest.raises(HTTPError) as error:
+        urllib.request.urlopen(f"{server}/lines?from=1200&to=1000")
+    assert error.value.code == 400
@@ -2,13 +2,22 @@
 
 import argparse
 import threading
+import multiprocessing
 import yaml
 import logging
 import os
+import signal
+import sys
 from app.utils.list_cameras import list_available_cameras, list_cameras
-from app.api.request_handler import start_server
-from app.vision.track import track
-from app.utils.shared_state import camera_info, set_input_source
+from app.benchmark import run_benchmark
+from app.offline import run_offline, OUTPUT_FORMATS
+from app.api.request_handler import start_server, start_shared_server
+from app.api.gateway import GATEWAY_SETTINGS, create_gateway, start_gateway
+from app.utils.shared_state import camera_info, set_input_source, remote_instances
+from app.utils.person_counter import PersonCounter
+from app.utils.detection_stream import pump_remote_detections
+from app.utils.shm_publisher import SharedInstanceSegment, InstancePublisher, RemoteInstanceView, RemotePersonCounter
+from app.utils.track_store import TrackIntervalStore
 from app.utils.logger import setup_logger, get_logger, create_log_message
 
 
@@ -23,24 +32,26 @@ def expand_path(path):
     return os.path.abspath(os.path.expanduser(path))
 
 
+def resolve_input_source(instance_config, logger):
+    # Returns (input_source, is_camera), or (None, None) if the configured camera is invalid
+    if isinstance(instance_config["camera"], str):
+        if instance_config["camera"].startswith("rtsp://") or instance_config["camera"].endswith(".mp4"):
+            return expand_path(instance_config["camera"]), False
+        try:
+            return int(instance_config["camera"]), True
+        except ValueError:
+            logger.error(create_log_message(event="invalid_input", source=instance_config["camera"], instance=instance_config["name"]))
+            return None, None
+    return int(instance_config["camera"]), True
+
+
 def run_instance(instance_config, args):
     logger = get_logger(instance_config["name"])
 
     # Determine the input source
-    if isinstance(instance_config["camera"], str):
-        if instance_config["camera"].startswith("rtsp://") or instance_config["camera"].endswith(".mp4"):
-            input_source = expand_path(instance_config["camera"])
-            is_camera = False
-        else:
-            try:
-                input_source = int(instance_config["camera"])
-                is_camera = True
-            except ValueError:
-                logger.error(create_log_message(event="invalid_input", source=instance_config["camera"], instance=instance_config["name"]))
-                return
-    else:
-        input_source = int(instance_config["camera"])
-        is_camera = True
+    input_source, is_camera = resolve_input_source(instance_config, logger)
+    if input_source is None:
+        return
 
     # Set the input source in shared state
     set_input_source(input_source, is_camera, instance_config["name"])
@@ -53,11 +64,104 @@ def run_instance(instance_config, args):
     server_thread.daemon = True
     server_thread.start()
 
+    # Imported here so that commands which do not track (--listCameras) never load torch
+    from app.vision.track import track
+
     # Start tracking with the specified input source and model
     logger.info(create_log_message(event="start_tracking", input_source=input_source, model=args.model, instance=instance_config["name"]))
     track(input_source, args.model, args.show, args.fps, args.trackAll, not args.noLoop, args.verbose, instance_config["name"])
 
 
+def run_instance_process(instance_config, args, segment_name, publish_interval_ms):
+    # Entry point of a worker process in --processes mode: capture and inference only, no HTTP server
+    setup_logger(level=getattr(logging, args.logLevel), file_only=args.fileOnlyLog)
+    logger = get_logger(instance_config["name"])
+
+    input_source, is_camera = resolve_input_source(instance_config, logger)
+    if input_source is None:
+        return
+    set_input_source(input_source, is_camera, instance_config["name"])
+
+    from app.vision.track import track
+
+    segment = SharedInstanceSegment.attach(segment_name)
+    publisher = InstancePublisher(segment, instance_config["name"], publish_interval_ms)
+    try:
+        logger.info(create_log_message(event="start_tracking", input_source=input_source, model=args.model, pid=os.getpid(), instance=instance_config["name"]))
+        track(input_source, args.model, args.show, args.fps, args.trackAll, not args.noLoop, args.verbose, instance_config["name"], publisher)
+    finally:
+        segment.close()
+
+
+def handle_sigterm(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sys.exit(0)
+
+
+def run_processes(instances, args, config):
+    logger = get_logger(__name__)
+    settings = config.get("processes", {})
+    # Spawned workers start from a clean interpreter on every platform
+    context = multiprocessing.get_context("spawn")
+
+    segments = []
+    processes = []
+    # Unwind through the finally block on SIGTERM so worker processes and segments are cleaned up
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    try:
+        for index, instance_config in enumerate(instances):
+            name = instance_config["name"]
+            input_source, is_camera = resolve_input_source(instance_config, logger)
+            if input_source is None:
+                continue
+            set_input_source(input_source, is_camera, name)
+
+            # Short segment name: macOS limits POSIX shared memory names to 31 characters
+            segment = SharedInstanceSegment.create(
+                f"oat{os.getpid()}_{index}",
+                settings.get("snapshot_bytes", 64 * 1024),
+                settings.get("max_intervals", 65536),
+                object_capacity=settings.get("max_objects", 1024),
+            )
+            segments.append(segment)
+            remote_instances[name] = RemoteInstanceView(segment, name)
+            person_counter_settings = config.get("person_counter", {})
+            PersonCounter.counters[name] = RemotePersonCounter(
+                segment,
+                name,
+                TrackIntervalStore.from_config(name, person_counter_settings.get("store"), readonly=True),
+                int(person_counter_settings.get("retention_hours", 24) * 3600 * 1000),
+            )
+            threading.Thread(
+                target=pump_remote_detections,
+                args=(name, remote_instances[name], settings.get("publish_interval_ms", 100) / 1000),
+                daemon=True,
+            ).start()
+
+            logger.info(create_log_message(event="start_http_server", port=instance_config["api_port"], instance=name))
+            server_thread = threading.Thread(target=start_server, args=(instance_config,))
+            server_thread.daemon = True
+            server_thread.start()
+
+            process = context.Process(
+                target=run_instance_process,
+                args=(instance_config, args, segment.name, settings.get("publish_interval_ms", 100)),
+                name=f"tracker-{name}",
+            )
+            process.start()
+            processes.append(process)
+            logger.info(create_log_message(event="instance_process_started", pid=process.pid, segment=segment.name, instance=name))
+
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for segment in segments:
+            segment.close()
+
+
 def main():
     config = load_config()
 
@@ -72,6 +176,15 @@ def main():
     parser.add_argument("--noLoop", action="store_true", help="Do not loop video files")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
     parser.add_argument("--fileOnlyLog", action="store_true", help="Log only to file, not to console")
+    parser.add_argument("--processes", action="store_true", help="Run each instance's capture and inference in its own process")
+    parser.add_argument("--benchmark", action="store_true", help="Run the pipeline benchmark on synthetic videos and exit")
+    parser.add_argument("--benchmarkOutput", help="Path of the benchmark JSON report (default: benchmarks/benchmark-<time>-<commit>.json)")
+    parser.add_argument("--gateway", action="store_true", help="Serve site-wide queries over the tracker endpoints of the gateway section, without tracking")
+    parser.add_argument("--offline", nargs="+", metavar="FILE", help="Process video files faster than real time, write their results to disk and exit")
+    parser.add_argument("--offlineOutput", help="Directory of the offline results (default: offline.output_dir in config.yaml)")
+    parser.add_argument("--offlineFormat", choices=OUTPUT_FORMATS, help="Format of the offline results (default: offline.format in config.yaml)")
+    parser.add_argument("--workers", type=int, help="Files processed in parallel in offline mode (default: one per core, up to the number of files)")
+    parser.add_argument("--startTime", help="Recording start of the offline files, as epoch seconds or ISO 8601 (default: from each file)")
     parser.add_argument("--logLevel", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], default="INFO", help="Set the logging level")
 
     # Parse the arguments
@@ -83,18 +196,64 @@ def main():
     logger.info(create_log_message(event="application_start", description="Starting tracker application"))
     logger.info(create_log_message(event="parsed_arguments", arguments=vars(args)))
 
-    global camera_info
-    # Get camera info for tracking and listing
-    cameras = list_available_cameras()
-    camera_info.update({str(cam["index"]): cam for cam in cameras})
-    logger.info(create_log_message(event="available_cameras", cameras=camera_info))
-
     if args.listCameras:
         list_cameras()
         return
 
+    if args.benchmark:
+        report = run_benchmark(args.model, output=args.benchmarkOutput, log_level=log_level, file_only=args.fileOnlyLog)
+        for result in report["scenarios"]:
+            stages = ", ".join(f"{stage} p50 {timing['p50']:.2f}ms p99 {timing['p99']:.2f}ms" for stage, timing in result["stages_ms"].items())
+            print(f"{result['scenario']['name']}: {result['frames']} frames, {result['fps']} FPS, peak RSS {result['peak_rss_mb']} MB ({stages})")
+        print(f"Report written to {report['output']}")
+        return
+
+    if args.offline:
+        report = run_offline(
+            [expand_path(path) for path in args.offline],
+            args.model,
+            args.offlineOutput,
+            args.offlineFormat,
+            args.workers,
+            track_all=args.trackAll,
+            start_time=args.startTime,
+            log_level=log_level,
+            file_only=args.fileOnlyLog,
+        )
+        for result in report["files"]:
+            if "error" in result:
+                print(f"{result['file']}: failed ({result['error']})")
+            else:
+                print(f"{result['file']}: {result['frames']} frames, {result['persons']} persons, {result['speed']}x real time")
+        print(f"Summary written to {report['output']}")
+        return
+
     instances = config["instances"]
 
+    if args.gateway:
+        gateway = create_gateway(GATEWAY_SETTINGS, instances)
+        start_gateway(gateway, GATEWAY_SETTINGS.get("port", 8100))
+        return
+
+    global camera_info
+    # Cameras are only discovered when an instance uses one; files and RTSP streams need no probing
+    if any(str(instance_config["camera"]).isdigit() for instance_config in instances):
+        cameras = list_available_cameras()
+        camera_info.update({str(cam["index"]): cam for cam in cameras})
+        logger.info(create_log_message(event="available_cameras", cameras=camera_info))
+
+    # Optionally serve every instance from a single port, alongside the per-instance ports
+    shared_port = config.get("api", {}).get("shared_port")
+    if shared_port:
+        logger.info(create_log_message(event="start_shared_http_server", port=shared_port))
+        shared_server_thread = threading.Thread(target=start_shared_server, args=(instances, shared_port))
+        shared_server_thread.daemon = True
+        shared_server_thread.start()
+
+    if args.processes:
+        run_processes(instances, args, config)
+        return
+
     # Run all instances
     threads = []
     for instance_config in instances: